@@ -0,0 +1,150 @@
+"""
+Benchmark: checkout throughput with many buyers of one product, locking vs.
+conditional stock decrement (settings.ORDER_STOCK_STRATEGY).
+
+Runs OrderCreateSerializer (the real checkout path) from --buyers threads,
+each placing --orders single-item orders for the same product, once per
+strategy. ``--hold-ms`` adds work inside the checkout transaction before
+stock is updated (an Order pre_save hook that sleeps), standing in for the
+payment proof upload done while the order is saved: with ``lock`` every
+buyer waits for it behind the product's row lock, with ``conditional``
+the row is only locked by the final UPDATE.
+
+Reports orders/s, latency percentiles and checks that no stock was lost
+or oversold. Needs a database with row locking (PostgreSQL): a test
+database is created from the configured DATABASES and dropped afterwards.
+
+Usage (from backend/):
+    python -m benchmarks.checkout_concurrency --buyers 32 --orders 20 --hold-ms 20
+"""
+import argparse
+import os
+import statistics
+import threading
+import time
+
+
+def setup_django():
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mercatico.settings')
+    django.setup()
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--buyers', type=int, default=32)
+    parser.add_argument('--orders', type=int, default=20, help='Orders per buyer')
+    parser.add_argument('--hold-ms', type=float, default=20)
+    parser.add_argument('--stock', type=int, default=None, help='Initial stock (default: enough for every order)')
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.db import connection, connections
+    from django.db.models.signals import pre_save
+    from django.test import override_settings
+    from django.test.utils import setup_test_environment
+
+    from orders.models import Order
+    from orders.serializers import OrderCreateSerializer
+    from products.models import Category, Product
+    from users.models import User
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        seller = User.objects.create_user(
+            'seller@bench.test', 'bench-password', first_name='S', last_name='B',
+            phone='88888888', user_type=User.UserType.SELLER
+        )
+        buyer = User.objects.create_user(
+            'buyer@bench.test', 'bench-password', first_name='B', last_name='B',
+            phone='77777777', user_type=User.UserType.BUYER
+        )
+        category = Category.objects.create(name='Bench', category_type='FOOD')
+
+        class Request:
+            user = buyer
+
+        def hold(sender, **kwargs):
+            time.sleep(args.hold_ms / 1000)
+
+        if args.hold_ms:
+            pre_save.connect(hold, sender=Order, dispatch_uid='checkout-benchmark-hold')
+
+        total_orders = args.buyers * args.orders
+        initial_stock = args.stock if args.stock is not None else total_orders
+
+        if connection.vendor != 'postgresql':
+            print(f"⚠️  {connection.vendor} has no row locks or concurrent writers; "
+                  f"only PostgreSQL results are meaningful\n")
+        print(f"{args.buyers} buyers x {args.orders} orders on one product, "
+              f"stock {initial_stock}, {args.hold_ms}ms of work per checkout "
+              f"({connection.vendor})\n")
+        print(f"{'strategy':<14}{'orders/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'ok':>7}{'no stock':>10}{'errors':>8}  stock")
+
+        for strategy in ('lock', 'conditional'):
+            product = Product.objects.create(
+                seller=seller, category=category, name=f'Hot {strategy}', price='1000.00',
+                stock=initial_stock
+            )
+            latencies = []
+            counts = {'ok': 0, 'no_stock': 0, 'errors': 0}
+            lock = threading.Lock()
+
+            def buy():
+                data = {
+                    'seller': str(seller.pk),
+                    'delivery_method': 'PICKUP',
+                    'payment_method': 'CASH',
+                    'buyer_phone': '77777777',
+                    'buyer_email': 'buyer@bench.test',
+                    'items': [{'product_id': str(product.pk), 'quantity': 1}],
+                }
+                try:
+                    for _ in range(args.orders):
+                        start = time.perf_counter()
+                        try:
+                            serializer = OrderCreateSerializer(data=data, context={'request': Request()})
+                            serializer.is_valid(raise_exception=True)
+                            serializer.save()
+                            outcome = 'ok'
+                        except Exception as e:
+                            outcome = 'no_stock' if 'Stock insuficiente' in str(e) else 'errors'
+                        with lock:
+                            latencies.append((time.perf_counter() - start) * 1000)
+                            counts[outcome] += 1
+                finally:
+                    connections.close_all()
+
+            with override_settings(ORDER_STOCK_STRATEGY=strategy):
+                threads = [threading.Thread(target=buy) for _ in range(args.buyers)]
+                start = time.perf_counter()
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                elapsed = time.perf_counter() - start
+
+            product.refresh_from_db()
+            sold = sum(
+                item.quantity for item in product.order_items.all()
+            )
+            consistent = product.stock == initial_stock - sold and product.stock >= 0
+            print(f"{strategy:<14}{counts['ok'] / elapsed:>10.1f}{statistics.median(latencies):>9.0f}"
+                  f"{percentile(latencies, 0.99):>9.0f}{counts['ok']:>7}{counts['no_stock']:>10}"
+                  f"{counts['errors']:>8}  {product.stock} ({'ok' if consistent else 'INCONSISTENT'})")
+    finally:
+        pre_save.disconnect(sender=Order, dispatch_uid='checkout-benchmark-hold')
+        connections.close_all()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
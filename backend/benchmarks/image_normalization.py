@@ -0,0 +1,92 @@
+"""
+Benchmark: bytes saved and CPU cost of upload image normalization.
+
+Builds a synthetic phone photo (--width x --height JPEG with a large EXIF
+block) and runs it through ``products.images.normalize_image`` for every
+profile, plus ``generate_variants`` for product uploads. Reports the stored
+size against the original upload and the CPU time per image, and shows how
+much of the decode cost draft mode removes.
+
+Usage (from backend/):
+    python -m benchmarks.image_normalization --width 4000 --height 3000 --runs 5
+"""
+import argparse
+import time
+from io import BytesIO
+
+from PIL import Image, ImageDraw, ImageFilter
+
+from products.images import IMAGE_PROFILES, _open_image, generate_variants, normalize_image
+
+
+class NamedBytesIO(BytesIO):
+    name = 'IMG_0001.jpg'
+
+
+def make_photo(width, height, exif_kb):
+    """A JPEG that compresses like a photo (gradients, edges, noise) with EXIF."""
+    image = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    noise = Image.effect_noise((width, height), 40).convert('RGB')
+    image = Image.blend(image, noise, 0.35)
+    draw = ImageDraw.Draw(image)
+    for i in range(0, width, max(1, width // 40)):
+        draw.line([(i, 0), (width - i, height)], fill=(i % 255, 80, 160), width=6)
+    image = image.filter(ImageFilter.SMOOTH)
+
+    exif = Image.Exif()
+    exif[0x010F] = 'Phone'           # Make
+    exif[0x0110] = 'Phone Pro Max'   # Model
+    exif[0x0112] = 1                 # Orientation
+    exif[0x9286] = 'x' * (exif_kb * 1024)  # UserComment, stands in for maker notes
+
+    buffer = BytesIO()
+    image.save(buffer, format='JPEG', quality=92, exif=exif.tobytes())
+    return buffer.getvalue()
+
+
+def cpu_ms(func, runs):
+    """Average CPU milliseconds per call."""
+    start = time.process_time()
+    for _ in range(runs):
+        result = func()
+    return (time.process_time() - start) * 1000 / runs, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--width', type=int, default=4000)
+    parser.add_argument('--height', type=int, default=3000)
+    parser.add_argument('--exif-kb', type=int, default=48)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    original = make_photo(args.width, args.height, args.exif_kb)
+    print(f"Original: {args.width}x{args.height} JPEG, {len(original) / 1024:.0f} KB "
+          f"(EXIF {args.exif_kb} KB), {args.runs} runs\n")
+
+    def upload():
+        return NamedBytesIO(original)
+
+    print(f"{'decode':<22}{'CPU ms':>10}")
+    for label, max_side in (('full decode', None), ('draft (1600)', 1600), ('draft (512)', 512)):
+        ms, image = cpu_ms(lambda: _open_image(upload(), max_side), args.runs)
+        print(f"{label:<22}{ms:>10.1f}   -> {image.size[0]}x{image.size[1]}")
+
+    print(f"\n{'profile':<22}{'stored KB':>10}{'saved':>9}{'CPU ms':>10}")
+    for profile in IMAGE_PROFILES:
+        ms, normalized = cpu_ms(lambda: normalize_image(upload(), profile), args.runs)
+        size = normalized.size
+        saved = 100 * (1 - size / len(original))
+        with Image.open(normalized) as check:
+            has_exif = bool(check.getexif())
+        print(f"{profile:<22}{size / 1024:>10.0f}{saved:>8.1f}%{ms:>10.1f}   "
+              f"{normalized.name}, EXIF {'kept' if has_exif else 'stripped'}")
+
+    ms, (_ext, variants, placeholder) = cpu_ms(lambda: generate_variants(upload()), args.runs)
+    size = sum(variant.size for variant in variants.values())
+    print(f"{'product variants':<22}{size / 1024:>10.0f}{100 * (1 - size / len(original)):>8.1f}%{ms:>10.1f}   "
+          f"({', '.join(variants)}; placeholder {len(placeholder)} chars)")
+
+
+if __name__ == '__main__':
+    main()
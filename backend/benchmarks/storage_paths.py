@@ -0,0 +1,155 @@
+"""
+Benchmark: image upload, direct-upload verification and delete paths against
+LocalSupabaseStorage with production-like latency.
+
+Runs the real code paths (products.uploads, SupabaseStorage caching and
+naming) on a throwaway in-memory database and a temporary directory:
+- ``upload``: store_product_images for --images new photos per request,
+  sequential (1 worker) vs concurrent (STORAGE_UPLOAD_MAX_WORKERS)
+- ``verify``: signed URL, client upload and open_direct_upload (fresh
+  metadata lookup + download), as done by confirm_uploads
+- ``delete``: --images * 3 variant files removed one by one vs. in one
+  delete_files call
+With --failure-rate, failed upload requests are counted and the files left
+behind (not cleaned up and not queued) are reported.
+
+Usage (from backend/):
+    python -m benchmarks.storage_paths --latency-ms 60 --jitter-ms 20 --images 5
+    python -m benchmarks.storage_paths --latency-ms 60 --failure-rate 0.05
+"""
+import argparse
+import statistics
+import tempfile
+import time
+from io import BytesIO
+
+
+def setup_django(root, latency_ms, jitter_ms, failure_rate):
+    import django
+    from django.conf import settings
+
+    settings.configure(
+        INSTALLED_APPS=['django.contrib.contenttypes', 'django.contrib.auth', 'users', 'products'],
+        AUTH_USER_MODEL='users.User',
+        DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}},
+        USE_TZ=True,
+        SECRET_KEY='benchmark',
+        MEDIA_ROOT=root,
+        SUPABASE_URL='',
+        SUPABASE_BUCKET_NAME='Productos',
+        STORAGE_UPLOAD_MAX_WORKERS=8,
+        STORAGES={
+            'default': {'BACKEND': 'products.storage_backends.LocalSupabaseStorage'},
+            'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+        },
+        LOCAL_STORAGE_ROOT=root,
+        LOCAL_STORAGE_LATENCY_MS=latency_ms,
+        LOCAL_STORAGE_JITTER_MS=jitter_ms,
+        LOCAL_STORAGE_FAILURE_RATE=failure_rate,
+    )
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def timed(func):
+    start = time.perf_counter()
+    try:
+        func()
+        return (time.perf_counter() - start) * 1000, None
+    except Exception as e:
+        return (time.perf_counter() - start) * 1000, e
+
+
+def report(label, samples, failures=0):
+    if not samples:
+        return
+    ok = len(samples) - failures
+    print(f"{label:<34}{statistics.median(samples):>9.0f}{max(samples):>9.0f}{ok:>6}/{len(samples)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--latency-ms', type=float, default=60)
+    parser.add_argument('--jitter-ms', type=float, default=20)
+    parser.add_argument('--failure-rate', type=float, default=0)
+    parser.add_argument('--images', type=int, default=5)
+    parser.add_argument('--requests', type=int, default=5)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='storage-bench-')
+    setup_django(root, args.latency_ms, args.jitter_ms, args.failure_rate)
+
+    from django.core.files.base import ContentFile
+    from django.core.files.storage import default_storage
+    from PIL import Image
+
+    from products.models import PendingStorageDeletion
+    from products.storage_backends import delete_files, iter_files
+    from products.uploads import create_direct_uploads, open_direct_upload, store_product_images
+
+    def photo(seed):
+        """Small unique JPEG (distinct content so nothing is deduplicated)."""
+        image = Image.effect_noise((1200, 900), 30 + seed % 50).convert('RGB')
+        buffer = BytesIO()
+        image.save(buffer, format='JPEG', quality=85)
+        return ContentFile(buffer.getvalue(), name=f'photo-{seed}.jpg')
+
+    counter = iter(range(10 ** 9))
+
+    def upload_request(workers):
+        from django.conf import settings
+        settings.STORAGE_UPLOAD_MAX_WORKERS = workers
+        files = [photo(next(counter)) for _ in range(args.images)]
+        return lambda: store_product_images(files, lambda stored: None)
+
+    print(f"LocalSupabaseStorage: latency {args.latency_ms}ms ± {args.jitter_ms}ms, "
+          f"failure rate {args.failure_rate:.0%}, {args.images} images/request, {args.requests} requests\n")
+    print(f"{'path':<34}{'p50 ms':>9}{'max ms':>9}{'ok':>10}")
+
+    for label, workers in (('upload, sequential', 1), ('upload, concurrent', 8)):
+        results = [timed(upload_request(workers)) for _ in range(args.requests)]
+        report(label, [ms for ms, _ in results], sum(1 for _, error in results if error))
+
+    verify = []
+    failures = 0
+    for _ in range(args.requests):
+        def direct_upload():
+            upload = create_direct_uploads('products', 'bench', 1)[0]
+            default_storage.upload_to_signed_url(upload['upload_url'], photo(next(counter)))
+            open_direct_upload(upload['path'], 'products', 'bench').close()
+        ms, error = timed(direct_upload)
+        verify.append(ms)
+        failures += error is not None
+    report('verify direct upload', verify, failures)
+
+    for label, batched in (('delete, one call per file', False), ('delete, batched', True)):
+        default_storage.failure_rate = 0
+        names = [default_storage.save(f'bench/{next(counter)}.bin', ContentFile(b'x')) for _ in range(args.images * 3)]
+        default_storage.failure_rate = args.failure_rate
+
+        def delete():
+            if batched:
+                delete_files(names)
+            else:
+                for name in names:
+                    default_storage.delete(name)
+        ms, error = timed(delete)
+        report(label, [ms], int(error is not None))
+
+    if args.failure_rate:
+        default_storage.failure_rate = 0
+        stored = {name for name, _size, _modified in iter_files('products/blobs')}
+        referenced = set()
+        from products.models import ImageBlob
+        from products.storage_backends import storage_path_from_url
+        for variants in ImageBlob.objects.values_list('variants', flat=True):
+            referenced.update(storage_path_from_url(url) for url in variants.values())
+        queued = set(PendingStorageDeletion.objects.values_list('path', flat=True))
+        leaked = stored - referenced - queued
+        print(f"\nAfter failures: {len(queued)} files queued for deletion, {len(leaked)} leaked")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+"""
+Minimal local stand-in for the Supabase Storage REST API.
+
+Only the endpoints used by products.storage_backends are implemented. Object
+bodies are counted and discarded, so the server's memory use stays flat,
+unless ``keep_bodies`` is set (needed to download objects back).
+Latency can be injected per request and per new connection (to model the
+TCP/TLS handshake against the real service).
+
+Usage (standalone):
+    python -m benchmarks.stub_storage_server --port 54321 --latency-ms 20
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+PREFIX = '/storage/v1'
+
+
+class StubStorageHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+        if self.server.handshake_delay:
+            time.sleep(self.server.handshake_delay)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self, keep=False):
+        """
+        Read the request body, returning its size and its bytes: the last
+        chunk only, or everything when ``keep`` is set.
+        """
+        parts = []
+
+        def add(data):
+            if keep:
+                parts.append(data)
+            else:
+                parts[:] = [data]
+
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            size = 0
+            while True:
+                length = int(self.rfile.readline().strip().split(b';')[0], 16)
+                if length == 0:
+                    self.rfile.readline()
+                    return size, b''.join(parts)
+                add(self.rfile.read(length))
+                size += length
+                self.rfile.readline()
+
+        remaining = int(self.headers.get('Content-Length') or 0)
+        size = remaining
+        while remaining:
+            data = self.rfile.read(min(remaining, 64 * 1024))
+            add(data)
+            remaining -= len(data)
+        return size, b''.join(parts)
+
+    def _store(self, path, size, data):
+        with self.server.lock:
+            self.server.objects[path] = size
+            self.server.modified[path] = datetime.now(timezone.utc).isoformat()
+            if self.server.keep_bodies:
+                self.server.bodies[path] = data
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _object_path(self, route):
+        """Split '<bucket>/<path>' from a route."""
+        bucket, _, path = route.partition('/')
+        return bucket, unquote(path)
+
+    def _delay(self):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+    def do_GET(self):
+        self._delay()
+        route = self.path.split('?')[0][len(PREFIX):]
+        if route.startswith('/object/'):
+            _bucket, path = self._object_path(route[len('/object/'):])
+            with self.server.lock:
+                size = self.server.objects.get(path)
+                body = self.server.bodies.get(path, b'\0' * (size or 0))
+            if size is None:
+                # Supabase answers 400 for missing objects
+                return self._reply(400, {'statusCode': '404', 'error': 'not_found'})
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        self._reply(404, {'error': 'not_found'})
+
+    def do_PUT(self):
+        self._delay()
+        size, data = self._read_body(keep=self.server.keep_bodies)
+        url = urlsplit(self.path)
+        route = url.path[len(PREFIX):]
+        if route.startswith('/object/upload/sign/'):
+            bucket, path = self._object_path(route[len('/object/upload/sign/'):])
+            token = parse_qs(url.query).get('token', [''])[0]
+            with self.server.lock:
+                valid = self.server.upload_tokens.pop(token, None) == path
+            if not valid:
+                return self._reply(400, {'statusCode': '403', 'error': 'invalid_token'})
+            self._store(path, size, data)
+            return self._reply(200, {'Key': f'{bucket}/{path}'})
+        self._reply(404, {'error': 'not_found'})
+
+    def do_POST(self):
+        self._delay()
+        size, data = self._read_body(keep=self.server.keep_bodies)
+        route = self.path.split('?')[0][len(PREFIX):]
+
+        if route.startswith('/object/upload/sign/'):
+            bucket, path = self._object_path(route[len('/object/upload/sign/'):])
+            token = uuid.uuid4().hex
+            with self.server.lock:
+                self.server.upload_tokens[token] = path
+            return self._reply(200, {'url': f'/object/upload/sign/{bucket}/{quote(path)}?token={token}'})
+
+        if route.startswith('/object/list/'):
+            # Like Supabase: list one folder, names relative to it, optional search
+            options = json.loads(data or b'{}')
+            folder = options.get('prefix', '').strip('/')
+            folder = f'{folder}/' if folder else ''
+            search = options.get('search', '')
+            offset = options.get('offset', 0)
+            limit = options.get('limit', 100)
+            entries = {}
+            with self.server.lock:
+                for path, size in self.server.objects.items():
+                    if not path.startswith(folder):
+                        continue
+                    name, slash, _rest = path[len(folder):].partition('/')
+                    if search not in name:
+                        continue
+                    if slash:
+                        entries.setdefault(name, {'name': name, 'id': None, 'metadata': None})
+                    else:
+                        entries[name] = {
+                            'name': name,
+                            'id': path,
+                            'updated_at': self.server.modified[path],
+                            'metadata': {'size': size},
+                        }
+            page = [entries[name] for name in sorted(entries)][offset:offset + limit]
+            return self._reply(200, page)
+
+        if route.startswith('/object/'):
+            bucket, path = self._object_path(route[len('/object/'):])
+            self._store(path, size, data)
+            return self._reply(200, {'Key': f'{bucket}/{path}'})
+
+        self._reply(404, {'error': 'not_found'})
+
+    def do_DELETE(self):
+        self._delay()
+        _size, data = self._read_body()
+        prefixes = json.loads(data or b'{}').get('prefixes', [])
+        removed = []
+        with self.server.lock:
+            for path in prefixes:
+                self.server.modified.pop(path, None)
+                self.server.bodies.pop(path, None)
+                if self.server.objects.pop(path, None) is not None:
+                    removed.append({'name': path})
+        self._reply(200, removed)
+
+
+class StubStorageServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency_ms=0, handshake_ms=0, keep_bodies=False):
+        super().__init__(address, StubStorageHandler)
+        self.latency = latency_ms / 1000
+        self.handshake_delay = handshake_ms / 1000
+        self.keep_bodies = keep_bodies
+        self.objects = {}
+        self.modified = {}
+        self.bodies = {}
+        self.upload_tokens = {}
+        self.connections = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+
+def start_stub_server(latency_ms=0, handshake_ms=0, port=0, keep_bodies=False):
+    """Start a stub server on a background thread and return it."""
+    server = StubStorageServer(('127.0.0.1', port), latency_ms, handshake_ms, keep_bodies)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--port', type=int, default=54321)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--handshake-ms', type=float, default=0)
+    parser.add_argument('--keep-bodies', action='store_true')
+    args = parser.parse_args()
+
+    server = StubStorageServer(('127.0.0.1', args.port), args.latency_ms, args.handshake_ms, args.keep_bodies)
+    print(f'Stub storage listening on {server.url}')
+    server.serve_forever()
@@ -0,0 +1,134 @@
+"""
+Benchmark: peak RSS of an upload request, full read vs. streamed uploads.
+
+Simulates one upload_images request (five images of --size-mb each, spooled
+to temporary files the way Django does for large uploads) and uploads them
+to a local stand-in server with:
+- ``full read``: the previous SupabaseStorage._save (content.read() and a
+  multipart body built in memory by storage3)
+- ``streaming``: the current SupabaseStorage._save (chunked body)
+
+Each mode runs in a fresh child process so ru_maxrss is per mode.
+
+Usage (from backend/):
+    python -m benchmarks.upload_memory --size-mb 5 --files 5
+"""
+import argparse
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+
+BUCKET = 'Productos'
+FAKE_KEY = 'service-key'
+
+
+def _rss_mb():
+    """Current resident set size in MB (Linux)."""
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+
+def _peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_child(mode, url, size_mb, files):
+    import django
+    from django.conf import settings
+
+    settings.configure(
+        SUPABASE_URL=url,
+        SUPABASE_KEY=FAKE_KEY,
+        SUPABASE_SERVICE_KEY='',
+        SUPABASE_BUCKET_NAME=BUCKET,
+        SUPABASE_STORAGE_POOL_SIZE=10,
+        SUPABASE_STORAGE_TIMEOUT=60.0,
+        SUPABASE_STORAGE_CONNECT_TIMEOUT=5.0,
+        SUPABASE_STORAGE_KEEPALIVE_EXPIRY=30.0,
+    )
+    django.setup()
+
+    from django.core.files.uploadedfile import TemporaryUploadedFile
+    from products.storage_backends import SupabaseStorage, get_storage_client
+
+    storage = SupabaseStorage()
+    # Warm up the client so its setup cost is part of the baseline
+    get_storage_client().session.get('/')
+
+    uploads = []
+    chunk = os.urandom(1024 * 1024)
+    for i in range(files):
+        upload = TemporaryUploadedFile(f'photo{i}.jpg', 'image/jpeg', size_mb * 1024 * 1024, None)
+        for _ in range(size_mb):
+            upload.write(chunk)
+        upload.seek(0)
+        uploads.append(upload)
+    del chunk
+
+    baseline = _rss_mb()
+    start = time.perf_counter()
+    for i, upload in enumerate(uploads):
+        name = f'bench/{mode}/{i}.jpg'
+        if mode == 'full read':
+            file_content = upload.read()
+            storage.bucket.upload(
+                path=name,
+                file=file_content,
+                file_options={'content-type': upload.content_type, 'upsert': 'true'},
+            )
+        else:
+            storage._save(name, upload)
+    elapsed = time.perf_counter() - start
+
+    print(f'{_peak_rss_mb() - baseline:.1f} {elapsed * 1000:.0f}')
+
+
+def _wait_for_port(port, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError('Stub storage server did not start')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Upload memory benchmark')
+    parser.add_argument('--size-mb', type=int, default=5)
+    parser.add_argument('--files', type=int, default=5)
+    parser.add_argument('--port', type=int, default=54329)
+    parser.add_argument('--child', choices=['full read', 'streaming'])
+    parser.add_argument('--url')
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.url, args.size_mb, args.files)
+        return
+
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'benchmarks.stub_storage_server', '--port', str(args.port)],
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        _wait_for_port(args.port)
+        url = f'http://127.0.0.1:{args.port}'
+        print(f'{args.files} files x {args.size_mb} MB per request')
+        print(f"{'mode':<12} {'peak RSS over baseline (MB)':>28} {'time (ms)':>10}")
+        for mode in ('full read', 'streaming'):
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.upload_memory', '--child', mode, '--url', url,
+                 '--size-mb', str(args.size_mb), '--files', str(args.files)],
+                capture_output=True, text=True, check=True,
+            ).stdout.split('\n')[-2].split()
+            print(f'{mode:<12} {float(output[0]):>28.1f} {int(output[1]):>10}')
+    finally:
+        server.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -39,16 +39,16 @@ print("\n" + "=" * 60)
 if settings.SUPABASE_URL and settings.SUPABASE_KEY:
     print("\n🔌 Probando conexión a Supabase...")
     try:
-        from supabase import create_client
-        client = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+        from products.storage_backends import get_storage_client
+        client = get_storage_client()
 
         # Listar buckets
-        buckets = client.storage.list_buckets()
+        buckets = client.list_buckets()
         print(f"✅ Conexión exitosa!")
         print(f"📦 Buckets disponibles: {len(buckets)}")
         for bucket in buckets:
-            print(f"   - {bucket.get('name', 'Unknown')}")
-            if bucket.get('name') == settings.SUPABASE_BUCKET_NAME:
+            print(f"   - {bucket.name}")
+            if bucket.name == settings.SUPABASE_BUCKET_NAME:
                 print(f"     ✅ Bucket '{settings.SUPABASE_BUCKET_NAME}' encontrado!")
     except Exception as e:
         print(f"❌ Error conectando a Supabase: {e}")
@@ -4,12 +4,20 @@ Custom exception handlers for MercaTico.
 from rest_framework.views import exception_handler
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import APIException
 from django.db import OperationalError, DatabaseError
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+class StorageUnavailable(APIException):
+    """The file storage failed while handling the request."""
+    status_code = status.HTTP_502_BAD_GATEWAY
+    default_detail = 'No se pudo acceder al almacenamiento, intenta de nuevo'
+    default_code = 'storage_unavailable'
+
+
 def custom_exception_handler(exc, context):
     """
     Custom exception handler for DRF that provides consistent error responses.
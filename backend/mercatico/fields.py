@@ -0,0 +1,45 @@
+"""
+Model fields shared across MercaTico apps.
+"""
+import logging
+
+from django.db import models
+
+from products.images import IMAGE_PROFILES, InvalidImageError, normalize_image
+
+logger = logging.getLogger(__name__)
+
+
+class NormalizedImageField(models.ImageField):
+    """
+    ImageField that normalizes new uploads before they are stored.
+
+    Images are downscaled to the profile's size limit (see
+    ``products.images.IMAGE_PROFILES``), stripped of EXIF metadata and
+    re-encoded, so phone photos are never stored or served at full size.
+    Files already in storage are left untouched.
+    """
+
+    def __init__(self, *args, profile='product', **kwargs):
+        if profile not in IMAGE_PROFILES:
+            raise ValueError(f'Unknown image profile: {profile}')
+        self.profile = profile
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.profile != 'product':
+            kwargs['profile'] = self.profile
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        file = getattr(model_instance, self.attname)
+        if file and not file._committed:
+            try:
+                normalized = normalize_image(file.file, self.profile)
+            except InvalidImageError:
+                # Upload validation already decoded it; keep the original
+                logger.warning('Could not normalize %s, storing it unchanged', file.name)
+            else:
+                file.save(normalized.name, normalized, save=False)
+        return super().pre_save(model_instance, add)
@@ -6,4 +6,5 @@ from mercatico import views
 
 urlpatterns = [
     path('', views.health_check, name='health_check'),
+    path('storage/', views.storage_metrics, name='storage_metrics'),
 ]
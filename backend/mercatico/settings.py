@@ -217,6 +217,12 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'idempotency-key',
+]
+
+# Response headers readable by browser clients
+CORS_EXPOSE_HEADERS = [
+    'idempotent-replayed',
 ]
 
 # Security Settings
@@ -248,13 +254,44 @@ SUPABASE_KEY = config('SUPABASE_KEY', default='')
 SUPABASE_SERVICE_KEY = config('SUPABASE_SERVICE_KEY', default='')
 SUPABASE_BUCKET_NAME = config('SUPABASE_BUCKET_NAME', default='Productos')
 
+# Shared Supabase Storage HTTP client (one per worker process)
+SUPABASE_STORAGE_POOL_SIZE = config('SUPABASE_STORAGE_POOL_SIZE', default=10, cast=int)
+SUPABASE_STORAGE_TIMEOUT = config('SUPABASE_STORAGE_TIMEOUT', default=20.0, cast=float)
+SUPABASE_STORAGE_CONNECT_TIMEOUT = config('SUPABASE_STORAGE_CONNECT_TIMEOUT', default=5.0, cast=float)
+SUPABASE_STORAGE_KEEPALIVE_EXPIRY = config('SUPABASE_STORAGE_KEEPALIVE_EXPIRY', default=30.0, cast=float)
+
+# Seconds SupabaseStorage caches file metadata used by exists()/size()
+SUPABASE_STORAGE_METADATA_TTL = config('SUPABASE_STORAGE_METADATA_TTL', default=300, cast=int)
+
+# Maximum number of concurrent uploads per request (products.uploads.save_files)
+STORAGE_UPLOAD_MAX_WORKERS = config('STORAGE_UPLOAD_MAX_WORKERS', default=8, cast=int)
+
+# Storage operations slower than this are logged as warnings (products.storage_metrics)
+STORAGE_SLOW_OPERATION_MS = config('STORAGE_SLOW_OPERATION_MS', default=1000, cast=float)
+
+# Token for /health/storage/ (sent as "Authorization: Bearer <token>");
+# without it only staff users logged into the admin can read the metrics
+STORAGE_METRICS_TOKEN = config('STORAGE_METRICS_TOKEN', default='')
+
 # Storage backend - usar Supabase Storage en producción
 print(f"🔍 DEBUG={DEBUG}")
 print(f"🔍 SUPABASE_URL={'[SET]' if SUPABASE_URL else '[NOT SET]'}")
 print(f"🔍 SUPABASE_KEY={'[SET]' if SUPABASE_KEY else '[NOT SET]'}")
 print(f"🔍 SUPABASE_BUCKET_NAME={SUPABASE_BUCKET_NAME}")
 
-if not DEBUG and SUPABASE_URL and SUPABASE_KEY:
+# Local stand-in for Supabase Storage (benchmarks / offline development)
+LOCAL_SUPABASE_STORAGE = config('LOCAL_SUPABASE_STORAGE', default=False, cast=bool)
+LOCAL_STORAGE_ROOT = config('LOCAL_STORAGE_ROOT', default=str(MEDIA_ROOT / 'supabase'))
+LOCAL_STORAGE_LATENCY_MS = config('LOCAL_STORAGE_LATENCY_MS', default=0, cast=float)
+LOCAL_STORAGE_JITTER_MS = config('LOCAL_STORAGE_JITTER_MS', default=0, cast=float)
+LOCAL_STORAGE_FAILURE_RATE = config('LOCAL_STORAGE_FAILURE_RATE', default=0, cast=float)
+
+if LOCAL_SUPABASE_STORAGE:
+    DEFAULT_FILE_STORAGE = 'products.storage_backends.LocalSupabaseStorage'
+    print(f"✅ STORAGE: Using LocalSupabaseStorage at {LOCAL_STORAGE_ROOT} "
+          f"(latency={LOCAL_STORAGE_LATENCY_MS}ms, jitter={LOCAL_STORAGE_JITTER_MS}ms, "
+          f"failure_rate={LOCAL_STORAGE_FAILURE_RATE})")
+elif not DEBUG and SUPABASE_URL and SUPABASE_KEY:
     DEFAULT_FILE_STORAGE = 'products.storage_backends.SupabaseStorage'
     print(f"✅ STORAGE: Using SupabaseStorage with bucket: {SUPABASE_BUCKET_NAME}")
 else:
@@ -277,6 +314,24 @@ ENCRYPTION_KEY = config('ENCRYPTION_KEY', default='')
 RECEIPT_VERIFICATION_TIMEOUT = config('RECEIPT_VERIFICATION_TIMEOUT', default=3600, cast=int)
 RECEIPT_STORAGE_DAYS = config('RECEIPT_STORAGE_DAYS', default=7, cast=int)
 
+# Order Settings
+# How checkout reserves stock (orders.services):
+# - 'lock': SELECT ... FOR UPDATE on every product of the cart, then one UPDATE
+# - 'conditional': no row locks up front; one UPDATE ... WHERE stock >= quantity
+#   decides whether the order goes through (better for very popular products)
+ORDER_STOCK_STRATEGY = config('ORDER_STOCK_STRATEGY', default='lock')
+
+# Minutes a buyer's stock reservation (cart / checkout hold) lasts
+STOCK_RESERVATION_MINUTES = config('STOCK_RESERVATION_MINUTES', default=15, cast=int)
+
+# Hours after which unpaid orders (Pending / Payment pending) are cancelled
+# and their stock returned by the expire_stale_orders command
+ORDER_EXPIRY_HOURS = config('ORDER_EXPIRY_HOURS', default=72, cast=int)
+
+# Hours a stored Idempotency-Key response is replayed to retries
+# (order creation, payment receipt upload)
+IDEMPOTENCY_KEY_TTL_HOURS = config('IDEMPOTENCY_KEY_TTL_HOURS', default=24, cast=int)
+
 # App URLs
 FRONTEND_URL = config('FRONTEND_URL', default='http://localhost:3000')
 BACKEND_URL = config('BACKEND_URL', default='http://localhost:8000')
@@ -317,6 +372,11 @@ LOGGING = {
             'level': 'DEBUG',
             'propagate': False,
         },
+        'products': {
+            'handlers': ['console', 'file'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
 
@@ -1,6 +1,9 @@
 """
 General views for MercaTico.
 """
+import hmac
+
+from django.conf import settings
 from django.http import JsonResponse
 from django.db import connection
 from django.views.decorators.http import require_http_methods
@@ -29,6 +32,37 @@ def health_check(request):
         }, status=503)
 
 
+def _can_read_metrics(request):
+    """Staff users (admin session) or requests with STORAGE_METRICS_TOKEN."""
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+
+    token = getattr(settings, 'STORAGE_METRICS_TOKEN', '')
+    scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+    return bool(token) and scheme.lower() == 'bearer' and hmac.compare_digest(credentials.encode(), token.encode())
+
+
+@require_http_methods(["GET"])
+def storage_metrics(request):
+    """
+    Storage operation counters (count, errors, bytes, latency) per
+    operation and folder.
+
+    Counters live in each process: with several gunicorn workers every
+    request reports the worker that served it (see ``pid``), so a
+    collector has to aggregate samples by pid.
+    """
+    from django.core.files.storage import default_storage
+    from products.storage_metrics import metrics
+
+    if not _can_read_metrics(request):
+        return JsonResponse({'error': 'No autorizado'}, status=403)
+
+    data = metrics.snapshot()
+    data['backend'] = default_storage.__class__.__name__
+    return JsonResponse(data)
+
+
 @require_http_methods(["GET"])
 def api_root(request):
     """
@@ -0,0 +1,76 @@
+"""
+Admin configuration for Orders app.
+"""
+from django.contrib import admin, messages
+
+from orders.models import Order, OrderItem, OrderStatusHistory
+
+
+class OrderItemInline(admin.TabularInline):
+    """Items of an order, as they were snapshotted at checkout."""
+
+    model = OrderItem
+    extra = 0
+    can_delete = False
+    fields = ['product', 'product_name', 'product_price', 'quantity', 'subtotal']
+    readonly_fields = fields
+
+
+class OrderStatusHistoryInline(admin.TabularInline):
+    """Status history of an order."""
+
+    model = OrderStatusHistory
+    extra = 0
+    can_delete = False
+    fields = ['status', 'notes', 'changed_by', 'created_at']
+    readonly_fields = fields
+
+
+@admin.register(Order)
+class OrderAdmin(admin.ModelAdmin):
+    """Admin for Order model. Status changes go through the actions."""
+
+    list_display = ['order_number', 'buyer', 'seller', 'status', 'payment_method', 'total', 'created_at']
+    list_filter = ['status', 'payment_method', 'delivery_method', 'created_at']
+    search_fields = ['order_number', 'buyer__email', 'seller__email', 'seller__seller_profile__business_name']
+    readonly_fields = [
+        'order_number', 'buyer', 'seller', 'status', 'subtotal', 'delivery_fee', 'total',
+        'payment_verified', 'payment_verified_at', 'created_at', 'updated_at',
+        'confirmed_at', 'shipped_at', 'delivered_at',
+    ]
+    inlines = [OrderItemInline, OrderStatusHistoryInline]
+    actions = ['cancel_orders']
+
+    def get_queryset(self, request):
+        """Optimize queryset with select_related."""
+        qs = super().get_queryset(request)
+        return qs.select_related('buyer', 'seller')
+
+    @admin.action(description='Cancelar órdenes seleccionadas (devuelve el stock)')
+    def cancel_orders(self, request, queryset):
+        """
+        Cancel the selected orders that can still be cancelled, restoring
+        their stock with one UPDATE; the others are left as they are.
+        """
+        from orders.transitions import transition_orders
+
+        cancellable = [
+            status for status, targets in Order.TRANSITIONS.items()
+            if Order.OrderStatus.CANCELLED in targets
+        ]
+        selected = queryset.count()
+        cancelled = transition_orders(
+            queryset.filter(status__in=cancellable),
+            Order.OrderStatus.CANCELLED,
+            request.user,
+            'Orden cancelada por un administrador'
+        )
+
+        self.message_user(request, f'{len(cancelled)} órdenes canceladas.', messages.SUCCESS)
+        skipped = selected - len(cancelled)
+        if skipped:
+            self.message_user(
+                request,
+                f'{skipped} órdenes no se cancelaron porque ya estaban canceladas o en un estado que no lo permite.',
+                messages.WARNING
+            )
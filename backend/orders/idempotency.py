@@ -0,0 +1,161 @@
+"""
+``Idempotency-Key`` support for endpoints with side effects.
+
+Clients that may retry a request (mobile apps on flaky connections) send a
+unique ``Idempotency-Key`` header. The first request with a key runs
+normally and its successful response is stored with the key and a
+fingerprint of the request; a retry with the same key and the same content
+gets the stored response back (with ``Idempotent-Replayed: true``) without
+running the request again.
+
+The key is claimed and the response stored in the same transaction as the
+request's work, so a retry that arrives while the first request is still
+running waits on the key's unique index and then replays its response
+(or, if that request failed and freed the key, runs in its place).
+Error responses are not stored: nothing was changed, the client may retry
+with the same key. Keys expire after IDEMPOTENCY_KEY_TTL_HOURS and are
+deleted by the purge_idempotency_keys command.
+"""
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from orders.models import IdempotencyKey
+
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+
+def key_ttl():
+    return timedelta(hours=getattr(settings, 'IDEMPOTENCY_KEY_TTL_HOURS', 24))
+
+
+def _file_digest(upload):
+    digest = hashlib.sha256()
+    for chunk in upload.chunks():
+        digest.update(chunk)
+    upload.seek(0)
+    return {'name': upload.name, 'size': upload.size, 'sha256': digest.hexdigest()}
+
+
+def request_fingerprint(scope, request):
+    """
+    SHA-256 of the endpoint and the request content.
+
+    Uploaded files are represented by their name, size and content hash.
+    """
+    if hasattr(request.data, 'lists'):
+        data = {key: values for key, values in request.data.lists()}
+    else:
+        data = request.data
+
+    def default(value):
+        if isinstance(value, UploadedFile):
+            return _file_digest(value)
+        return JSONEncoder().default(value)
+
+    payload = json.dumps([scope, data], sort_keys=True, default=default)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def replay(record):
+    return Response(record.response_body, status=record.status_code, headers={REPLAYED_HEADER: 'true'})
+
+
+def _claim(record):
+    """Insert the key in a savepoint; False if the (user, key) pair exists."""
+    try:
+        with transaction.atomic():
+            record.save(force_insert=True)
+    except IntegrityError:
+        return False
+    return True
+
+
+def run_idempotent(request, scope, key, handler):
+    """
+    Run ``handler`` once per (user, key) and return its response.
+
+    Returns:
+        Response: the handler's response, the stored response of a
+        previous request with the same key, or an error if the key was
+        used for a different request
+    """
+    if len(key) > MAX_KEY_LENGTH:
+        return Response(
+            {'detail': f'{IDEMPOTENCY_HEADER} no puede tener más de {MAX_KEY_LENGTH} caracteres'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    fingerprint = request_fingerprint(scope, request)
+    now = timezone.now()
+
+    with transaction.atomic():
+        record = IdempotencyKey(
+            user=request.user,
+            key=key,
+            scope=scope,
+            fingerprint=fingerprint,
+            status_code=0,
+            expires_at=now + key_ttl(),
+        )
+        if not _claim(record):
+            # Blocks until a concurrent request with the same key commits
+            existing = IdempotencyKey.objects.select_for_update().filter(user=request.user, key=key).first()
+            if existing is not None and existing.expires_at > now:
+                if existing.fingerprint != fingerprint:
+                    return Response(
+                        {'detail': f'{IDEMPOTENCY_HEADER} ya fue usada para una solicitud diferente'},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                    )
+                return replay(existing)
+
+            # Expired, or freed by a concurrent request that failed: claim it again
+            if existing is not None:
+                existing.delete()
+            if not _claim(record):
+                return Response(
+                    {'detail': f'Otra solicitud con el mismo {IDEMPOTENCY_HEADER} está en curso'},
+                    status=status.HTTP_409_CONFLICT
+                )
+
+        response = handler()
+
+        if not status.is_success(response.status_code):
+            # Frees the key (and undoes any partial work) so the client can retry
+            transaction.set_rollback(True)
+            return response
+
+        record.status_code = response.status_code
+        record.response_body = response.data
+        record.save(update_fields=['status_code', 'response_body'])
+        return response
+
+
+def idempotent(scope):
+    """
+    Make a view method idempotent for requests with an Idempotency-Key.
+
+    Requests without the header run as usual.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if not key:
+                return view_method(self, request, *args, **kwargs)
+            return run_idempotent(request, scope, key, lambda: view_method(self, request, *args, **kwargs))
+        return wrapper
+    return decorator
+
@@ -0,0 +1,137 @@
+"""
+Cancel orders that were never paid, giving their stock back.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from orders.models import Order
+from orders.transitions import transition_orders
+from payments.models import PaymentReceipt
+
+
+EXPIRABLE_STATUSES = (
+    Order.OrderStatus.PENDING,
+    Order.OrderStatus.PAYMENT_PENDING,
+)
+
+# Receipts the buyer uploaded that are still being checked
+AWAITING_VERIFICATION = (
+    PaymentReceipt.VerificationStatus.PENDING,
+    PaymentReceipt.VerificationStatus.VERIFYING,
+    PaymentReceipt.VerificationStatus.MANUAL_REVIEW,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Cancela las órdenes Pendientes o con Pago pendiente más antiguas que '
+        'ORDER_EXPIRY_HOURS y devuelve su stock, en lotes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours',
+            type=float,
+            default=None,
+            help='Antigüedad mínima en horas (default: settings.ORDER_EXPIRY_HOURS)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Órdenes canceladas por transacción (default: 100)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Solo contar las órdenes vencidas, sin cancelar nada'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Seguir buscando órdenes vencidas indefinidamente (modo worker)'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=300,
+            help='Segundos de espera entre búsquedas en modo --loop (default: 300)'
+        )
+
+    def handle(self, *args, **options):
+        hours = options['hours']
+        if hours is None:
+            hours = getattr(settings, 'ORDER_EXPIRY_HOURS', 72)
+        age = timedelta(hours=hours)
+
+        if options['dry_run']:
+            count = self.stale(timezone.now() - age).count()
+            self.stdout.write(self.style.WARNING(f"Modo --dry-run: {count} órdenes vencidas por cancelar"))
+            return
+
+        while True:
+            cancelled = 0
+            while True:
+                expired = self.expire_batch(timezone.now() - age, hours, options['batch_size'])
+                if not expired:
+                    break
+                cancelled += expired
+
+            if cancelled or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f"✓ {cancelled} órdenes vencidas canceladas"))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def stale(self, cutoff):
+        """
+        Unpaid orders created before ``cutoff``; served by the
+        (status, -created_at) index.
+
+        Orders whose buyer already sent a payment (a proof at checkout, a
+        receipt waiting for verification, or a verified payment) are never
+        expired: they wait for the seller.
+        """
+        return (
+            Order.objects
+            .filter(status__in=EXPIRABLE_STATUSES, created_at__lt=cutoff, payment_verified=False)
+            .filter(Q(payment_proof='') | Q(payment_proof__isnull=True))
+            .exclude(Exists(PaymentReceipt.objects.filter(
+                order=OuterRef('pk'), verification_status__in=AWAITING_VERIFICATION
+            )))
+        )
+
+    def expire_batch(self, cutoff, hours, batch_size):
+        """
+        Cancel one batch of stale orders and return how many were cancelled.
+
+        Rows are locked with SKIP LOCKED, oldest first, so several workers
+        can run at once without waiting on each other or on a checkout
+        that is confirming one of these orders. Stock is restored, history
+        written and rollups updated for the whole batch by the transition
+        (see orders.transitions).
+        """
+        with transaction.atomic():
+            ids = list(
+                self.stale(cutoff)
+                .select_for_update(skip_locked=True)
+                .order_by('created_at')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                return 0
+
+            # The rows are locked: a receipt upload or a payment
+            # confirmation locks the order too, so none can have happened since
+            cancelled = transition_orders(
+                Order.objects.filter(pk__in=ids, status__in=EXPIRABLE_STATUSES),
+                Order.OrderStatus.CANCELLED,
+                notes=f'Orden cancelada automáticamente: sin pago después de {hours:g} horas'
+            )
+            return len(cancelled)
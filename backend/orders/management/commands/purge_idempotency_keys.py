@@ -0,0 +1,34 @@
+"""
+Delete expired idempotency keys in batches.
+"""
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from orders.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Elimina las claves de idempotencia expiradas, en lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Claves eliminadas por consulta (default: 1000)'
+        )
+
+    def handle(self, *args, **options):
+        # Expired keys are already treated as unused; deleting them only
+        # keeps the table small.
+        now = timezone.now()
+        expired = IdempotencyKey.objects.filter(expires_at__lte=now).order_by('expires_at')
+
+        deleted = 0
+        while True:
+            ids = list(expired.values_list('pk', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            deleted += IdempotencyKey.objects.filter(pk__in=ids).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(f"✓ {deleted} claves de idempotencia expiradas eliminadas"))
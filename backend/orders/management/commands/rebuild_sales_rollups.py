@@ -0,0 +1,98 @@
+"""
+Rebuild the daily sales rollups and sales counters from the orders.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+
+from orders.models import Order, OrderItem, ProductDailySales, SellerDailySales
+from orders.rollups import CANCELLED_STATUSES, SOLD_STATUSES, empty_delta
+from products.models import Product
+from users.models import SellerProfile
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula las ventas diarias por vendedor y producto, Product.sales_count y '
+        'SellerProfile.total_sales a partir de las órdenes. Para datos anteriores a los '
+        'rollups o para corregirlos; las ventas se asignan a la fecha de confirmación '
+        '(o de creación) y las cancelaciones a la última actualización de la orden.'
+    )
+
+    def handle(self, *args, **options):
+        sellers = defaultdict(empty_delta)
+        products = defaultdict(empty_delta)
+        product_sellers = {}
+
+        sold_day = TruncDate(Coalesce('confirmed_at', 'created_at'))
+        sold = Order.objects.filter(status__in=SOLD_STATUSES)
+        for row in (
+            sold.annotate(day=sold_day).values('seller_id', 'day')
+            .annotate(orders=Count('id'), revenue=Sum('total')).order_by()
+        ):
+            delta = sellers[(row['seller_id'], row['day'])]
+            delta['orders'] = row['orders']
+            delta['revenue'] = row['revenue']
+
+        cancelled = Order.objects.filter(status__in=CANCELLED_STATUSES)
+        for row in (
+            cancelled.annotate(day=TruncDate('updated_at')).values('seller_id', 'day')
+            .annotate(cancellations=Count('id')).order_by()
+        ):
+            sellers[(row['seller_id'], row['day'])]['cancellations'] = row['cancellations']
+
+        item_sold_day = TruncDate(Coalesce('order__confirmed_at', 'order__created_at'))
+        for row in (
+            OrderItem.objects.filter(order__in=sold).annotate(day=item_sold_day)
+            .values('product_id', 'order__seller_id', 'day')
+            .annotate(orders=Count('order_id', distinct=True), units=Sum('quantity'), revenue=Sum('subtotal'))
+            .order_by()
+        ):
+            delta = products[(row['product_id'], row['day'])]
+            delta.update(orders=row['orders'], units=row['units'], revenue=row['revenue'])
+            sellers[(row['order__seller_id'], row['day'])]['units'] += row['units']
+            product_sellers[row['product_id']] = row['order__seller_id']
+
+        for row in (
+            OrderItem.objects.filter(order__in=cancelled).annotate(day=TruncDate('order__updated_at'))
+            .values('product_id', 'order__seller_id', 'day')
+            .annotate(cancellations=Count('order_id', distinct=True))
+            .order_by()
+        ):
+            products[(row['product_id'], row['day'])]['cancellations'] = row['cancellations']
+            product_sellers[row['product_id']] = row['order__seller_id']
+
+        with transaction.atomic():
+            SellerDailySales.objects.all().delete()
+            ProductDailySales.objects.all().delete()
+            SellerDailySales.objects.bulk_create(
+                [SellerDailySales(seller_id=seller_id, date=day, **delta) for (seller_id, day), delta in sellers.items()],
+                batch_size=1000,
+            )
+            ProductDailySales.objects.bulk_create(
+                [
+                    ProductDailySales(product_id=product_id, seller_id=product_sellers[product_id], date=day, **delta)
+                    for (product_id, day), delta in products.items()
+                ],
+                batch_size=1000,
+            )
+
+            units = (
+                ProductDailySales.objects.filter(product=OuterRef('pk'))
+                .order_by().values('product').annotate(total=Sum('units')).values('total')
+            )
+            Product.objects.update(sales_count=Coalesce(Subquery(units), Value(0)))
+
+            revenue = (
+                SellerDailySales.objects.filter(seller=OuterRef('user_id'))
+                .order_by().values('seller').annotate(total=Sum('revenue')).values('total')
+            )
+            SellerProfile.objects.update(total_sales=Coalesce(Subquery(revenue), Value(Decimal('0.00'))))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Rollups recalculados: {len(sellers)} filas de vendedores, {len(products)} filas de productos"
+        ))
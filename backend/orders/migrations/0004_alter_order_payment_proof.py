@@ -0,0 +1,26 @@
+# Generated by Django 5.0.1 on 2026-10-19 16:16
+
+import mercatico.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0003_order_payment_proof"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="order",
+            name="payment_proof",
+            field=mercatico.fields.NormalizedImageField(
+                blank=True,
+                help_text="Screenshot del comprobante de pago SINPE",
+                null=True,
+                profile="receipt",
+                upload_to="payment_proofs/",
+                verbose_name="comprobante de pago",
+            ),
+        ),
+    ]
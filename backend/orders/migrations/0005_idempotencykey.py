@@ -0,0 +1,94 @@
+# Generated by Django 5.0.1 on 2026-10-19 16:42
+
+import django.db.models.deletion
+import rest_framework.utils.encoders
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0004_alter_order_payment_proof"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IdempotencyKey",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("key", models.CharField(max_length=255, verbose_name="clave")),
+                (
+                    "scope",
+                    models.CharField(
+                        help_text="Endpoint que procesó la solicitud (ej. orders.create)",
+                        max_length=50,
+                        verbose_name="operación",
+                    ),
+                ),
+                (
+                    "fingerprint",
+                    models.CharField(
+                        help_text="SHA-256 del contenido de la solicitud",
+                        max_length=64,
+                        verbose_name="huella",
+                    ),
+                ),
+                (
+                    "status_code",
+                    models.PositiveSmallIntegerField(
+                        verbose_name="código de respuesta"
+                    ),
+                ),
+                (
+                    "response_body",
+                    models.JSONField(
+                        blank=True,
+                        encoder=rest_framework.utils.encoders.JSONEncoder,
+                        null=True,
+                        verbose_name="respuesta",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="fecha de creación"
+                    ),
+                ),
+                ("expires_at", models.DateTimeField(verbose_name="expira")),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="idempotency_keys",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "clave de idempotencia",
+                "verbose_name_plural": "claves de idempotencia",
+                "indexes": [
+                    models.Index(
+                        fields=["expires_at"], name="orders_idem_expires_681ecb_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="idempotencykey",
+            constraint=models.UniqueConstraint(
+                fields=("user", "key"), name="unique_idempotency_key_per_user"
+            ),
+        ),
+    ]
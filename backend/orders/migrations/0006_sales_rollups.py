@@ -0,0 +1,155 @@
+# Generated by Django 5.0.1 on 2026-10-19 16:48
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0005_idempotencykey"),
+        ("products", "0015_stockreservation"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SellerDailySales",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("date", models.DateField(verbose_name="fecha")),
+                (
+                    "orders",
+                    models.IntegerField(default=0, verbose_name="órdenes vendidas"),
+                ),
+                (
+                    "units",
+                    models.IntegerField(default=0, verbose_name="unidades vendidas"),
+                ),
+                (
+                    "revenue",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        help_text="Total de las órdenes vendidas, incluye el costo de envío",
+                        max_digits=12,
+                        verbose_name="ingresos",
+                    ),
+                ),
+                (
+                    "cancellations",
+                    models.IntegerField(default=0, verbose_name="cancelaciones"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(
+                        auto_now=True, verbose_name="última actualización"
+                    ),
+                ),
+                (
+                    "seller",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_sales",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "ventas diarias del vendedor",
+                "verbose_name_plural": "ventas diarias de vendedores",
+                "ordering": ["seller", "-date"],
+            },
+        ),
+        migrations.CreateModel(
+            name="ProductDailySales",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("date", models.DateField(verbose_name="fecha")),
+                (
+                    "orders",
+                    models.IntegerField(default=0, verbose_name="órdenes vendidas"),
+                ),
+                (
+                    "units",
+                    models.IntegerField(default=0, verbose_name="unidades vendidas"),
+                ),
+                (
+                    "revenue",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        help_text="Subtotal de los items vendidos",
+                        max_digits=12,
+                        verbose_name="ingresos",
+                    ),
+                ),
+                (
+                    "cancellations",
+                    models.IntegerField(default=0, verbose_name="cancelaciones"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(
+                        auto_now=True, verbose_name="última actualización"
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_sales",
+                        to="products.product",
+                    ),
+                ),
+                (
+                    "seller",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="product_daily_sales",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "ventas diarias del producto",
+                "verbose_name_plural": "ventas diarias de productos",
+                "ordering": ["product", "-date"],
+                "indexes": [
+                    models.Index(
+                        fields=["seller", "date"], name="orders_prod_seller__073ede_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="productdailysales",
+            constraint=models.UniqueConstraint(
+                fields=("product", "date"), name="unique_product_daily_sales"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="sellerdailysales",
+            constraint=models.UniqueConstraint(
+                fields=("seller", "date"), name="unique_seller_daily_sales"
+            ),
+        ),
+    ]
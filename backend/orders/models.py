@@ -4,8 +4,10 @@ Order models for MercaTico.
 import uuid
 from django.db import models
 from django.core.validators import MinValueValidator
+from rest_framework.utils.encoders import JSONEncoder
 from users.models import User
 from products.models import Product
+from mercatico.fields import NormalizedImageField
 
 
 class Order(models.Model):
@@ -31,6 +33,30 @@ class Order(models.Model):
         SINPE = 'SINPE', 'SINPE Móvil'
         CASH = 'CASH', 'Efectivo contra entrega'
 
+    # Status changes allowed from each status (see orders.transitions)
+    TRANSITIONS = {
+        OrderStatus.PENDING: {OrderStatus.PAYMENT_PENDING, OrderStatus.CONFIRMED, OrderStatus.CANCELLED},
+        OrderStatus.PAYMENT_PENDING: {OrderStatus.CONFIRMED, OrderStatus.CANCELLED},
+        OrderStatus.CONFIRMED: {OrderStatus.PROCESSING, OrderStatus.SHIPPED, OrderStatus.CANCELLED},
+        OrderStatus.PROCESSING: {OrderStatus.SHIPPED, OrderStatus.CANCELLED},
+        OrderStatus.SHIPPED: {OrderStatus.DELIVERED},
+        OrderStatus.DELIVERED: {OrderStatus.REFUNDED},
+        OrderStatus.CANCELLED: set(),
+        OrderStatus.REFUNDED: set(),
+    }
+
+    # Timestamp set the first time an order reaches a status
+    STATUS_TIMESTAMPS = {
+        OrderStatus.CONFIRMED: 'confirmed_at',
+        OrderStatus.SHIPPED: 'shipped_at',
+        OrderStatus.DELIVERED: 'delivered_at',
+    }
+
+    # Side effects run when orders reach a status (orders.transitions.SIDE_EFFECTS)
+    STATUS_SIDE_EFFECTS = {
+        OrderStatus.CANCELLED: ('restore_stock',),
+    }
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
 
     # User relationships
@@ -102,9 +128,10 @@ class Order(models.Model):
         choices=PaymentMethod.choices,
         default=PaymentMethod.SINPE
     )
-    payment_proof = models.ImageField(
+    payment_proof = NormalizedImageField(
         'comprobante de pago',
         upload_to='payment_proofs/',
+        profile='receipt',
         null=True,
         blank=True,
         help_text='Screenshot del comprobante de pago SINPE'
@@ -144,13 +171,21 @@ class Order(models.Model):
     def save(self, *args, **kwargs):
         """Generate order number if not exists."""
         if not self.order_number:
-            # Generate order number: YYYYMMDD-UUID[:6] (max 20 chars: 8 + 1 + 6 + 5 = 20)
-            from django.utils import timezone
-            date_str = timezone.now().strftime('%Y%m%d')
-            uuid_str = str(self.id)[:6].upper()
-            self.order_number = f"{date_str}-{uuid_str}"
+            self.order_number = self.generate_order_number()
         super().save(*args, **kwargs)
 
+    def generate_order_number(self):
+        """
+        Order number: YYYYMMDD-UUID[:6] (max 20 chars: 8 + 1 + 6 + 5 = 20).
+
+        Set it explicitly on orders inserted with ``bulk_create``, which
+        skips ``save``.
+        """
+        from django.utils import timezone
+        date_str = timezone.now().strftime('%Y%m%d')
+        uuid_str = str(self.id)[:6].upper()
+        return f"{date_str}-{uuid_str}"
+
     def calculate_total(self):
         """Calculate order total from items."""
         items_total = sum(item.subtotal for item in self.items.all())
@@ -158,15 +193,17 @@ class Order(models.Model):
         self.total = self.subtotal + self.delivery_fee
         self.save(update_fields=['subtotal', 'total'])
 
-    def confirm_payment(self):
-        """Mark payment as verified and update status."""
-        from django.utils import timezone
-        self.payment_verified = True
-        self.payment_verified_at = timezone.now()
-        if self.status == self.OrderStatus.PAYMENT_PENDING:
-            self.status = self.OrderStatus.CONFIRMED
-            self.confirmed_at = timezone.now()
-        self.save(update_fields=['payment_verified', 'payment_verified_at', 'status', 'confirmed_at'])
+    def confirm_payment(self, changed_by=None, notes=''):
+        """
+        Mark payment as verified and update status (see
+        orders.transitions.confirm_payment).
+        """
+        from orders.transitions import confirm_payment
+        return confirm_payment(self, changed_by, notes)
+
+    def can_transition_to(self, status):
+        """Check if the order can move from its current status to ``status``."""
+        return status in self.TRANSITIONS.get(self.status, ())
 
     def can_be_reviewed(self):
         """Check if order can be reviewed (delivered and not yet reviewed)."""
@@ -261,3 +298,129 @@ class OrderStatusHistory(models.Model):
 
     def __str__(self):
         return f"{self.order.order_number} - {self.get_status_display()} - {self.created_at}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Stored response of a request sent with an ``Idempotency-Key`` header.
+
+    A retry with the same key gets this response back instead of running
+    the request again (see orders.idempotency).
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='idempotency_keys'
+    )
+    key = models.CharField('clave', max_length=255)
+    scope = models.CharField(
+        'operación',
+        max_length=50,
+        help_text='Endpoint que procesó la solicitud (ej. orders.create)'
+    )
+    fingerprint = models.CharField(
+        'huella',
+        max_length=64,
+        help_text='SHA-256 del contenido de la solicitud'
+    )
+    status_code = models.PositiveSmallIntegerField('código de respuesta')
+    response_body = models.JSONField('respuesta', encoder=JSONEncoder, null=True, blank=True)
+    created_at = models.DateTimeField('fecha de creación', auto_now_add=True)
+    expires_at = models.DateTimeField('expira')
+
+    class Meta:
+        verbose_name = 'clave de idempotencia'
+        verbose_name_plural = 'claves de idempotencia'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key_per_user'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.scope} - {self.key}"
+
+
+class SellerDailySales(models.Model):
+    """
+    Sales of a seller per day, maintained on order status changes
+    (see orders.rollups).
+
+    An order counts as sold on the day it reaches a sold status
+    (confirmed onwards); if it later leaves those statuses (cancelled,
+    refunded) it is subtracted on that day, so values are net per day.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    seller = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='daily_sales'
+    )
+    date = models.DateField('fecha')
+    orders = models.IntegerField('órdenes vendidas', default=0)
+    units = models.IntegerField('unidades vendidas', default=0)
+    revenue = models.DecimalField(
+        'ingresos',
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        help_text='Total de las órdenes vendidas, incluye el costo de envío'
+    )
+    cancellations = models.IntegerField('cancelaciones', default=0)
+    updated_at = models.DateTimeField('última actualización', auto_now=True)
+
+    class Meta:
+        verbose_name = 'ventas diarias del vendedor'
+        verbose_name_plural = 'ventas diarias de vendedores'
+        ordering = ['seller', '-date']
+        constraints = [
+            models.UniqueConstraint(fields=['seller', 'date'], name='unique_seller_daily_sales'),
+        ]
+
+    def __str__(self):
+        return f"{self.seller} - {self.date}"
+
+
+class ProductDailySales(models.Model):
+    """
+    Sales of a product per day, maintained with SellerDailySales.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='daily_sales'
+    )
+    seller = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='product_daily_sales'
+    )
+    date = models.DateField('fecha')
+    orders = models.IntegerField('órdenes vendidas', default=0)
+    units = models.IntegerField('unidades vendidas', default=0)
+    revenue = models.DecimalField(
+        'ingresos',
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        help_text='Subtotal de los items vendidos'
+    )
+    cancellations = models.IntegerField('cancelaciones', default=0)
+    updated_at = models.DateTimeField('última actualización', auto_now=True)
+
+    class Meta:
+        verbose_name = 'ventas diarias del producto'
+        verbose_name_plural = 'ventas diarias de productos'
+        ordering = ['product', '-date']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'date'], name='unique_product_daily_sales'),
+        ]
+        indexes = [
+            models.Index(fields=['seller', 'date']),
+        ]
+
+    def __str__(self):
+        return f"{self.product} - {self.date}"
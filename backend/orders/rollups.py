@@ -0,0 +1,157 @@
+"""
+Daily sales rollups per seller and per product.
+
+``SellerDailySales`` and ``ProductDailySales`` are updated by
+``record_status_changes`` in the transaction that changes the orders'
+status, together with ``Product.sales_count`` (units) and
+``SellerProfile.total_sales`` (revenue). Analytics read the rollups only.
+
+An order is sold while its status is in SOLD_STATUSES. Entering them adds
+the order to the day's rollups; leaving them (cancelled, refunded)
+subtracts it on the day it happens. Reaching a cancelled status counts a
+cancellation.
+
+Every call runs a fixed number of queries whatever the number of orders:
+one for the orders' items, then insert / lock / update for each rollup
+table and one UPDATE per counter.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from orders.models import Order, OrderItem, ProductDailySales, SellerDailySales
+from products.models import Product
+from users.models import SellerProfile
+
+
+SOLD_STATUSES = frozenset({
+    Order.OrderStatus.CONFIRMED,
+    Order.OrderStatus.PROCESSING,
+    Order.OrderStatus.SHIPPED,
+    Order.OrderStatus.DELIVERED,
+})
+
+CANCELLED_STATUSES = frozenset({
+    Order.OrderStatus.CANCELLED,
+    Order.OrderStatus.REFUNDED,
+})
+
+ROLLUP_FIELDS = ('orders', 'units', 'revenue', 'cancellations')
+
+
+def empty_delta():
+    return {'orders': 0, 'units': 0, 'revenue': Decimal('0.00'), 'cancellations': 0}
+
+
+def record_status_change(order, old_status, when=None):
+    """Record the change of one order; ``order.status`` is the new status."""
+    record_status_changes([(order, old_status)], when)
+
+
+def record_status_changes(changes, when=None):
+    """
+    Update rollups and counters for orders whose status changed.
+
+    Must run inside the transaction that saves the new statuses.
+
+    Args:
+        changes (iterable): (order, old_status) pairs; ``order.status`` is
+            the new status
+        when (datetime): time of the change (default: now)
+    """
+    relevant = {}
+    for order, old_status in changes:
+        sign = int(order.status in SOLD_STATUSES) - int(old_status in SOLD_STATUSES)
+        cancelled = order.status in CANCELLED_STATUSES and old_status not in CANCELLED_STATUSES
+        if sign or cancelled:
+            relevant[order.pk] = (order, sign, int(cancelled))
+    if not relevant:
+        return
+
+    seller_deltas = defaultdict(empty_delta)
+    product_deltas = defaultdict(empty_delta)
+    product_sellers = {}
+
+    for order, sign, cancelled in relevant.values():
+        delta = seller_deltas[order.seller_id]
+        delta['orders'] += sign
+        delta['revenue'] += sign * order.total
+        delta['cancellations'] += cancelled
+
+    items = OrderItem.objects.filter(order_id__in=relevant).values_list(
+        'order_id', 'product_id', 'quantity', 'subtotal'
+    )
+    seen = set()
+    for order_id, product_id, quantity, subtotal in items:
+        order, sign, cancelled = relevant[order_id]
+        seller_deltas[order.seller_id]['units'] += sign * quantity
+        delta = product_deltas[product_id]
+        delta['units'] += sign * quantity
+        delta['revenue'] += sign * subtotal
+        # An order counts once per product, even with several lines of it
+        if (order_id, product_id) not in seen:
+            seen.add((order_id, product_id))
+            delta['orders'] += sign
+            delta['cancellations'] += cancelled
+        product_sellers[product_id] = order.seller_id
+
+    day = timezone.localdate(when)
+    _apply_deltas(SellerDailySales, 'seller_id', seller_deltas, day)
+    _apply_deltas(ProductDailySales, 'product_id', product_deltas, day, {
+        product_id: {'seller_id': seller_id} for product_id, seller_id in product_sellers.items()
+    })
+
+    _add_to_counter(Product.objects, 'pk', 'sales_count', {
+        product_id: delta['units'] for product_id, delta in product_deltas.items()
+    })
+    _add_to_counter(SellerProfile.objects, 'user_id', 'total_sales', {
+        seller_id: delta['revenue'] for seller_id, delta in seller_deltas.items()
+    })
+
+
+def _apply_deltas(model, key_field, deltas, day, defaults=None):
+    """
+    Add ``deltas`` (key -> {field: delta}) to the day's rows of ``model``.
+
+    Missing rows are inserted first (concurrent inserts of the same row are
+    ignored), then every row is locked in primary key order, so concurrent
+    updates cannot deadlock, and incremented with one UPDATE.
+    """
+    defaults = defaults or {}
+    model.objects.bulk_create(
+        [model(**{key_field: key, 'date': day, **defaults.get(key, {})}) for key in deltas],
+        ignore_conflicts=True,
+    )
+    rows = dict(
+        model.objects.select_for_update()
+        .filter(**{f'{key_field}__in': list(deltas)}, date=day)
+        .order_by('pk')
+        .values_list(key_field, 'pk')
+    )
+
+    updates = {}
+    for field in ROLLUP_FIELDS:
+        whens = [
+            When(pk=rows[key], then=F(field) + Value(delta[field]))
+            for key, delta in deltas.items()
+            if delta[field]
+        ]
+        if whens:
+            updates[field] = Case(*whens, default=F(field))
+    if updates:
+        model.objects.filter(pk__in=rows.values()).update(**updates)
+
+
+def _add_to_counter(manager, key_field, field, deltas):
+    """Add per-row deltas to a counter column in one UPDATE."""
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    manager.filter(**{f'{key_field}__in': list(deltas)}).update(**{
+        field: Case(
+            *[When(**{key_field: key}, then=F(field) + Value(delta)) for key, delta in deltas.items()],
+            default=F(field),
+        )
+    })
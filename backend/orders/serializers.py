@@ -1,6 +1,7 @@
 """
 Serializers for orders app.
 """
+import uuid
 from rest_framework import serializers
 from orders.models import Order, OrderItem, OrderStatusHistory
 from products.serializers import ProductSerializer
@@ -118,6 +119,79 @@ class OrderSerializer(serializers.ModelSerializer):
         ]
 
 
+class OrderItemSummarySerializer(serializers.ModelSerializer):
+    """Order item for listings: the snapshot taken when the order was placed."""
+
+    class Meta:
+        model = OrderItem
+        fields = [
+            'id',
+            'product',
+            'product_name',
+            'product_price',
+            'quantity',
+            'subtotal',
+        ]
+        read_only_fields = fields
+
+
+class OrderListSerializer(serializers.ModelSerializer):
+    """
+    Simplified serializer for order listings.
+
+    Expects the queryset of OrderViewSet for list actions: buyer and seller
+    (with seller profile) joined, items prefetched and the latest status
+    change annotated as ``last_status_at`` / ``last_status_notes``.
+    """
+    items = OrderItemSummarySerializer(many=True, read_only=True)
+    item_count = serializers.SerializerMethodField()
+    buyer_name = serializers.CharField(source='buyer.get_full_name', read_only=True)
+    seller_name = serializers.SerializerMethodField()
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    delivery_method_display = serializers.CharField(source='get_delivery_method_display', read_only=True)
+    payment_method_display = serializers.CharField(source='get_payment_method_display', read_only=True)
+    last_status_at = serializers.DateTimeField(read_only=True)
+    last_status_notes = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = Order
+        fields = [
+            'id',
+            'order_number',
+            'buyer',
+            'buyer_name',
+            'seller',
+            'seller_name',
+            'status',
+            'status_display',
+            'last_status_at',
+            'last_status_notes',
+            'subtotal',
+            'delivery_fee',
+            'total',
+            'delivery_method',
+            'delivery_method_display',
+            'payment_method',
+            'payment_method_display',
+            'payment_verified',
+            'items',
+            'item_count',
+            'created_at',
+            'updated_at',
+        ]
+        read_only_fields = fields
+
+    def get_item_count(self, obj):
+        """Total units in the order."""
+        return sum(item.quantity for item in obj.items.all())
+
+    def get_seller_name(self, obj):
+        """Business name, or the seller's name if they have no profile."""
+        if hasattr(obj.seller, 'seller_profile'):
+            return obj.seller.seller_profile.business_name
+        return obj.seller.get_full_name()
+
+
 class OrderCreateSerializer(serializers.ModelSerializer):
     """Serializer for creating orders."""
     items = serializers.JSONField(
@@ -164,6 +238,7 @@ class OrderCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Debe incluir al menos un producto")
 
         # Validate each item is a dict with required fields
+        cleaned = []
         for idx, item in enumerate(items):
             if not isinstance(item, dict):
                 raise serializers.ValidationError(f"El item en posición {idx} debe ser un diccionario")
@@ -171,7 +246,20 @@ class OrderCreateSerializer(serializers.ModelSerializer):
             if 'product_id' not in item or 'quantity' not in item:
                 raise serializers.ValidationError(f"El item en posición {idx} debe tener 'product_id' y 'quantity'")
 
-        return items
+            try:
+                product_id = uuid.UUID(str(item['product_id']))
+            except ValueError:
+                raise serializers.ValidationError(f"El item en posición {idx} tiene un 'product_id' inválido")
+
+            quantity = item['quantity']
+            if isinstance(quantity, str) and quantity.isdigit():
+                quantity = int(quantity)
+            if isinstance(quantity, bool) or not isinstance(quantity, int) or quantity < 1:
+                raise serializers.ValidationError(f"El item en posición {idx} debe tener una cantidad entera mayor a 0")
+
+            cleaned.append({**item, 'product_id': product_id, 'quantity': quantity})
+
+        return cleaned
 
     def validate(self, data):
         """Validate that payment proof is provided for SINPE payments."""
@@ -186,21 +274,50 @@ class OrderCreateSerializer(serializers.ModelSerializer):
         return data
 
     def create(self, validated_data):
-        """Create order with items."""
+        """
+        Create order with items.
+
+        Runs a fixed number of queries for any cart size: one SELECT for
+        all products, one for other buyers' reservations, one INSERT for
+        the order, one for the items, one UPDATE for the stock and one
+        DELETE for the buyer's reservations, which become the order items.
+        With ORDER_STOCK_STRATEGY='lock' the SELECT locks the products;
+        with 'conditional' nothing is locked until the final
+        ``UPDATE ... WHERE stock >= quantity`` (see orders.services).
+        """
         from django.db import transaction
         from products.models import Product
         from decimal import Decimal
+        from orders.services import (
+            InsufficientStockError,
+            aggregate_quantities,
+            apply_stock,
+            check_stock,
+            create_order_items,
+            get_products,
+            get_stock_strategy,
+            items_subtotal,
+        )
+        from products.reservations import consume_reservations, reserved_quantities
 
         items_data = validated_data.pop('items')
         buyer = self.context['request'].user
+        quantities = aggregate_quantities(items_data)
+        strategy = get_stock_strategy()
 
         # Use transaction to ensure atomicity
         with transaction.atomic():
-            # Pre-calculate subtotal from items before creating order
-            subtotal = Decimal('0.00')
-            for item_data in items_data:
-                product = Product.objects.get(id=item_data['product_id'])
-                subtotal += product.price * item_data['quantity']
+            # 'lock' locks every product up front (in pk order, so carts never deadlock)
+            try:
+                products = get_products(list(quantities), strategy)
+                reserved = reserved_quantities(list(quantities), exclude_buyer=buyer)
+                check_stock(products, quantities, reserved)
+            except Product.DoesNotExist as e:
+                raise serializers.ValidationError({'items': str(e)})
+            except InsufficientStockError as e:
+                raise serializers.ValidationError({'items': str(e)})
+
+            subtotal = items_subtotal(items_data, products)
 
             # Calculate total (subtotal + delivery fee)
             delivery_fee = validated_data.get('delivery_fee', Decimal('0.00'))
@@ -220,64 +337,167 @@ class OrderCreateSerializer(serializers.ModelSerializer):
             )
 
             # Create order items and update stock
-            for item_data in items_data:
-                # Lock the product row for update to prevent race conditions
-                product = Product.objects.select_for_update().get(id=item_data['product_id'])
-
-                # Check stock
-                if product.stock < item_data['quantity']:
-                    raise serializers.ValidationError(
-                        f"Stock insuficiente para {product.name}. Disponible: {product.stock}"
-                    )
-
-                # Create item
-                OrderItem.objects.create(
-                    order=order,
-                    product=product,
-                    product_name=product.name,
-                    product_price=product.price,
-                    quantity=item_data['quantity']
-                )
-
-                # Reduce stock
-                product.stock -= item_data['quantity']
-                product.save(update_fields=['stock'])
+            create_order_items(order, items_data, products)
+            try:
+                apply_stock(products, quantities, strategy, buyer)
+            except InsufficientStockError as e:
+                raise serializers.ValidationError({'items': str(e)})
+            consume_reservations(buyer, list(quantities))
 
         return order
 
 
+class CartCheckoutSerializer(OrderCreateSerializer):
+    """
+    Serializer for checking out a cart with products of several sellers.
+
+    Creates one order per seller in a single transaction. SINPE orders
+    start as pending: the buyer pays each seller and uploads one receipt
+    per order (payments upload).
+    """
+    payment_proof = None
+    delivery_fee = None
+    delivery_fees = serializers.DictField(
+        child=serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0),
+        required=False,
+        help_text='Delivery fee per seller calculated by frontend: {"seller_id": "1500.00"}'
+    )
+
+    class Meta:
+        model = Order
+        fields = [
+            'delivery_method',
+            'delivery_address',
+            'delivery_province',
+            'delivery_canton',
+            'delivery_district',
+            'delivery_notes',
+            'delivery_fees',
+            'payment_method',
+            'buyer_phone',
+            'buyer_email',
+            'buyer_notes',
+            'items',
+        ]
+
+    def validate_delivery_fees(self, value):
+        """Validate that keys are seller ids."""
+        fees = {}
+        for seller_id, fee in value.items():
+            try:
+                fees[uuid.UUID(str(seller_id))] = fee
+            except ValueError:
+                raise serializers.ValidationError(f"'{seller_id}' no es un id de vendedor válido")
+        return fees
+
+    def validate(self, data):
+        """No payment proof here: SINPE receipts are uploaded per order."""
+        return data
+
+    def create(self, validated_data):
+        """
+        Create one order per seller of the cart.
+
+        Same stock handling and fixed query count as a single order
+        (see OrderCreateSerializer.create): the orders and their items
+        are inserted with one query each, whatever the number of sellers.
+        A product short of stock fails the whole cart.
+        """
+        from django.db import transaction
+        from products.models import Product
+        from orders.services import (
+            InsufficientStockError,
+            aggregate_quantities,
+            apply_stock,
+            check_stock,
+            create_seller_orders,
+            get_products,
+            get_stock_strategy,
+        )
+        from products.reservations import consume_reservations, reserved_quantities
+
+        items_data = validated_data.pop('items')
+        delivery_fees = validated_data.pop('delivery_fees', {})
+        buyer = self.context['request'].user
+        quantities = aggregate_quantities(items_data)
+        strategy = get_stock_strategy()
+
+        with transaction.atomic():
+            try:
+                products = get_products(list(quantities), strategy)
+                reserved = reserved_quantities(list(quantities), exclude_buyer=buyer)
+                check_stock(products, quantities, reserved)
+            except Product.DoesNotExist as e:
+                raise serializers.ValidationError({'items': str(e)})
+            except InsufficientStockError as e:
+                raise serializers.ValidationError({'items': str(e)})
+
+            sellers = {product.seller_id for product in products.values()}
+            unknown = set(delivery_fees) - sellers
+            if unknown:
+                raise serializers.ValidationError({
+                    'delivery_fees': f"Vendedores sin productos en el carrito: {', '.join(map(str, unknown))}"
+                })
+
+            orders = create_seller_orders(
+                buyer,
+                items_data,
+                products,
+                delivery_fees,
+                status=Order.OrderStatus.PENDING,
+                **validated_data
+            )
+            try:
+                apply_stock(products, quantities, strategy, buyer)
+            except InsufficientStockError as e:
+                raise serializers.ValidationError({'items': str(e)})
+            consume_reservations(buyer, list(quantities))
+
+        return orders
+
+
 class OrderUpdateStatusSerializer(serializers.Serializer):
-    """Serializer for updating order status."""
+    """Serializer for updating order status (see Order.TRANSITIONS)."""
     status = serializers.ChoiceField(choices=Order.OrderStatus.choices)
     notes = serializers.CharField(required=False, allow_blank=True)
 
+    def validate_status(self, value):
+        """Validate that the order can move to the new status."""
+        order = self.instance
+        if order is not None and order.status != value and not order.can_transition_to(value):
+            raise serializers.ValidationError(
+                f"No se puede pasar de {order.get_status_display()} a {Order.OrderStatus(value).label}"
+            )
+        return value
+
     def update(self, instance, validated_data):
-        """Update order status and create history entry."""
-        old_status = instance.status
-        new_status = validated_data['status']
-
-        # Update status
-        instance.status = new_status
-
-        # Update timestamp fields based on status
-        if new_status == Order.OrderStatus.CONFIRMED and not instance.confirmed_at:
-            from django.utils import timezone
-            instance.confirmed_at = timezone.now()
-        elif new_status == Order.OrderStatus.SHIPPED and not instance.shipped_at:
-            from django.utils import timezone
-            instance.shipped_at = timezone.now()
-        elif new_status == Order.OrderStatus.DELIVERED and not instance.delivered_at:
-            from django.utils import timezone
-            instance.delivered_at = timezone.now()
-
-        instance.save()
-
-        # Create status history entry
-        OrderStatusHistory.objects.create(
-            order=instance,
-            status=new_status,
-            notes=validated_data.get('notes', f'Estado cambiado de {old_status} a {new_status}'),
-            changed_by=self.context['request'].user
-        )
+        """
+        Apply the transition: status, timestamp, history entry, side effects
+        and sales rollups (see orders.transitions).
+        """
+        from orders.transitions import InvalidTransitionError, transition_order
+
+        try:
+            transition_order(
+                instance,
+                validated_data['status'],
+                self.context['request'].user,
+                validated_data.get('notes', '')
+            )
+        except InvalidTransitionError as e:
+            # The order changed status since it was loaded
+            raise serializers.ValidationError({'status': str(e)})
 
         return instance
+
+
+class OrderBulkStatusSerializer(serializers.Serializer):
+    """Serializer for applying one status change to many orders."""
+    order_ids = serializers.ListField(
+        child=serializers.UUIDField(),
+        min_length=1,
+        max_length=200,
+        help_text='IDs de las órdenes (máximo 200)'
+    )
+    status = serializers.ChoiceField(choices=Order.OrderStatus.choices)
+    notes = serializers.CharField(required=False, allow_blank=True)
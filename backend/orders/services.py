@@ -0,0 +1,340 @@
+"""
+Stock handling for order creation.
+
+Every helper runs a fixed number of queries, whatever the number of items,
+so checkout cost and lock time do not grow with the cart size.
+
+Two strategies are available (settings.ORDER_STOCK_STRATEGY):
+- ``lock``: the cart's products are locked with SELECT ... FOR UPDATE
+  before the order is created, then stock is decremented.
+- ``conditional``: products are read without locks and stock is
+  decremented last with ``UPDATE ... WHERE stock >= quantity``; the
+  number of updated rows decides whether the order goes through. Row
+  locks are only held from that UPDATE to the commit, so buyers of a
+  popular product are not serialized behind each other's checkout.
+
+Units held by other buyers' active reservations (products.reservations)
+are not available to the checkout; the buyer's own holds are converted
+into the order and deleted.
+
+A cart with products of several sellers is checked out at once with
+``create_seller_orders``: one order per seller, all inserted together.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+
+from orders.models import Order, OrderItem
+from products.models import Product
+from products.reservations import reserved_subquery
+
+
+STOCK_STRATEGIES = ('lock', 'conditional')
+
+
+class InsufficientStockError(Exception):
+    """A product does not have enough stock for the requested quantity."""
+
+    def __init__(self, product, requested, available=None):
+        self.product = product
+        self.requested = requested
+        self.available = product.stock if available is None else max(0, available)
+        super().__init__(
+            f"Stock insuficiente para {product.name}. Disponible: {self.available}"
+        )
+
+
+def aggregate_quantities(items):
+    """
+    Total quantity per product id; a product may appear in several lines.
+
+    Args:
+        items (list): [{'product_id': UUID, 'quantity': int}, ...]
+
+    Returns:
+        dict: product_id -> total quantity
+    """
+    quantities = defaultdict(int)
+    for item in items:
+        quantities[item['product_id']] += item['quantity']
+    return dict(quantities)
+
+
+def get_stock_strategy():
+    strategy = getattr(settings, 'ORDER_STOCK_STRATEGY', 'lock')
+    if strategy not in STOCK_STRATEGIES:
+        raise ImproperlyConfigured(
+            f"ORDER_STOCK_STRATEGY debe ser uno de: {', '.join(STOCK_STRATEGIES)}"
+        )
+    return strategy
+
+
+def get_products(product_ids, strategy='lock'):
+    """
+    Load the cart's products: locked with the ``lock`` strategy, a plain
+    SELECT with ``conditional``.
+
+    Returns:
+        dict: product_id -> Product
+
+    Raises:
+        Product.DoesNotExist: if any product does not exist
+    """
+    if strategy == 'lock':
+        return lock_products(product_ids)
+    products = {product.pk: product for product in Product.objects.filter(pk__in=product_ids)}
+    _check_missing(product_ids, products)
+    return products
+
+
+def lock_products(product_ids):
+    """
+    Lock the given products with one SELECT ... FOR UPDATE.
+
+    Rows are locked in primary key order, so two checkouts that share
+    products always take their locks in the same order and cannot deadlock.
+
+    Returns:
+        dict: product_id -> Product
+
+    Raises:
+        Product.DoesNotExist: if any product does not exist
+    """
+    products = Product.objects.select_for_update().filter(pk__in=product_ids).order_by('pk')
+    locked = {product.pk: product for product in products}
+    _check_missing(product_ids, locked)
+    return locked
+
+
+def _check_missing(product_ids, products):
+    missing = set(product_ids) - set(products)
+    if missing:
+        raise Product.DoesNotExist(f"Productos no encontrados: {', '.join(map(str, missing))}")
+
+
+def check_stock(products, quantities, reserved=None):
+    """
+    Raise InsufficientStockError for the first product short of stock.
+
+    Args:
+        reserved (dict): product_id -> units held by other buyers
+    """
+    reserved = reserved or {}
+    for product_id, quantity in quantities.items():
+        product = products[product_id]
+        available = product.stock - reserved.get(product_id, 0)
+        if available < quantity:
+            raise InsufficientStockError(product, quantity, available)
+
+
+def _sold_out(items):
+    """CASE that marks as not available the products whose stock reaches zero."""
+    # CASE sees the stock before the update: stock <= q means it reaches zero
+    return Case(
+        *[When(pk=product_id, stock__lte=quantity, then=Value(False)) for product_id, quantity in items],
+        default=F('is_available'),
+    )
+
+
+def decrement_stock(quantities):
+    """
+    Subtract the quantities from the products' stock in one UPDATE.
+
+    Products that reach zero are marked as not available, as with
+    ``decrement_stock_if_available``.
+
+    Args:
+        quantities (dict): product_id -> quantity to subtract
+    """
+    if not quantities:
+        return 0
+    items = list(quantities.items())
+    return Product.objects.filter(pk__in=quantities).update(
+        stock=Case(
+            *[When(pk=product_id, then=F('stock') - quantity) for product_id, quantity in items],
+            default=F('stock'),
+        ),
+        is_available=_sold_out(items),
+    )
+
+
+def restore_stock(order_ids):
+    """
+    Give the items of the given orders back to stock, in one UPDATE.
+
+    ``UPDATE product SET stock = stock + (SELECT SUM(quantity) FROM items
+    WHERE product_id = product.id AND order_id IN (...))`` for the products
+    of those items only. ``is_available`` is left as it is: a product that
+    sold out cannot be told apart from one its seller disabled, so the
+    seller makes it available again.
+
+    Args:
+        order_ids (list): ids of the orders being cancelled
+    """
+    items = OrderItem.objects.filter(order_id__in=order_ids)
+    returned = (
+        items.filter(product=OuterRef('pk')).order_by()
+        .values('product').annotate(quantity=Sum('quantity')).values('quantity')
+    )
+    return Product.objects.filter(pk__in=items.values('product_id')).update(
+        stock=F('stock') + Subquery(returned, output_field=IntegerField()),
+    )
+
+
+def decrement_stock_if_available(quantities, buyer=None):
+    """
+    Subtract the quantities only where there is enough stock, in one UPDATE.
+
+    ``UPDATE ... SET stock = stock - q WHERE id = ? AND stock >= q + held``
+    for every product at once, where ``held`` is the units of active
+    reservations of other buyers than ``buyer``; products that reach zero
+    are marked as not available. The caller must roll back when this
+    returns False (some product was short, the others were already
+    decremented).
+
+    Returns:
+        bool: True if every product was decremented
+    """
+    if not quantities:
+        return True
+    items = list(quantities.items())
+    updated = Product.objects.filter(
+        pk__in=quantities,
+        stock__gte=Case(
+            *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in items],
+            output_field=IntegerField(),
+        ) + reserved_subquery(exclude_buyer=buyer),
+    ).update(
+        stock=Case(
+            *[When(pk=product_id, then=F('stock') - quantity) for product_id, quantity in items],
+            default=F('stock'),
+        ),
+        is_available=_sold_out(items),
+    )
+    return updated == len(items)
+
+
+class _PartialUpdate(Exception):
+    """Rolls back the savepoint of a conditional update that missed a product."""
+
+
+def apply_stock(products, quantities, strategy='lock', buyer=None):
+    """
+    Decrement stock for a checkout with the given strategy.
+
+    With 'lock' availability (including reservations) has already been
+    checked by ``check_stock`` under the row locks.
+
+    Raises:
+        InsufficientStockError: if a product does not have enough stock
+    """
+    if strategy == 'lock':
+        decrement_stock(quantities)
+        return
+
+    try:
+        # Savepoint: a partial update is undone before looking for the short product
+        with transaction.atomic():
+            if not decrement_stock_if_available(quantities, buyer):
+                raise _PartialUpdate
+    except _PartialUpdate:
+        available = dict(
+            Product.objects.filter(pk__in=quantities)
+            .annotate(available=F('stock') - reserved_subquery(exclude_buyer=buyer))
+            .values_list('pk', 'available')
+        )
+        short = next(
+            (product_id for product_id, quantity in quantities.items() if available.get(product_id, 0) < quantity),
+            next(iter(quantities))
+        )
+        raise InsufficientStockError(products[short], quantities[short], available.get(short, 0))
+
+
+def build_order_items(order, items, products):
+    """
+    Unsaved items of an order, snapshotting product name and price.
+
+    ``bulk_create`` skips ``OrderItem.save``, so the subtotal is set here.
+    """
+    order_items = []
+    for item in items:
+        product = products[item['product_id']]
+        order_items.append(OrderItem(
+            order=order,
+            product=product,
+            product_name=product.name,
+            product_price=product.price,
+            quantity=item['quantity'],
+            subtotal=product.price * item['quantity'],
+        ))
+    return order_items
+
+
+def create_order_items(order, items, products):
+    """Insert the order's items in one query."""
+    return OrderItem.objects.bulk_create(build_order_items(order, items, products))
+
+
+def items_subtotal(items, products):
+    return sum(
+        (products[item['product_id']].price * item['quantity'] for item in items),
+        Decimal('0.00')
+    )
+
+
+def group_items_by_seller(items, products):
+    """
+    Split a cart by the seller of each product.
+
+    Returns:
+        dict: seller_id -> items, in order of first appearance in the cart
+    """
+    by_seller = defaultdict(list)
+    for item in items:
+        by_seller[products[item['product_id']].seller_id].append(item)
+    return dict(by_seller)
+
+
+def create_seller_orders(buyer, items, products, delivery_fees=None, **order_fields):
+    """
+    Create one order per seller of the cart, with their items, in two
+    INSERTs (orders, then items) whatever the number of sellers.
+
+    ``bulk_create`` skips ``Order.save``, so order numbers are set here.
+
+    Args:
+        delivery_fees (dict): seller_id -> delivery fee (default 0)
+        order_fields: shared order data (delivery, payment, contact...)
+
+    Returns:
+        list: the created orders, in the cart's seller order
+    """
+    delivery_fees = delivery_fees or {}
+    by_seller = group_items_by_seller(items, products)
+
+    orders = []
+    for seller_id, seller_items in by_seller.items():
+        subtotal = items_subtotal(seller_items, products)
+        delivery_fee = delivery_fees.get(seller_id, Decimal('0.00'))
+        order = Order(
+            buyer=buyer,
+            seller_id=seller_id,
+            subtotal=subtotal,
+            delivery_fee=delivery_fee,
+            total=subtotal + delivery_fee,
+            **order_fields
+        )
+        order.order_number = order.generate_order_number()
+        orders.append(order)
+    Order.objects.bulk_create(orders)
+
+    OrderItem.objects.bulk_create([
+        order_item
+        for order in orders
+        for order_item in build_order_items(order, by_seller[order.seller_id], products)
+    ])
+    return orders
@@ -0,0 +1,550 @@
+"""
+Tests for Orders app.
+"""
+import io
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from orders import idempotency
+from orders.models import IdempotencyKey, Order, OrderItem, OrderStatusHistory, SellerDailySales
+from orders.transitions import InvalidTransitionError
+from payments.models import PaymentReceipt
+from products.models import Category, Product
+from users.models import BuyerProfile, SellerProfile, User
+
+
+class OrderTestCase(TestCase):
+    """A seller with products and a buyer with an authenticated client."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(
+            'vendedor@example.com', 'pw12345678',
+            first_name='Ana', last_name='Mora', phone='88888888', user_type='SELLER'
+        )
+        SellerProfile.objects.create(user=cls.seller, business_name='Quesos Ana', sinpe_number='88888888')
+        cls.buyer = User.objects.create_user(
+            'comprador@example.com', 'pw12345678',
+            first_name='Luis', last_name='Solís', phone='77777777', user_type='BUYER'
+        )
+        BuyerProfile.objects.create(user=cls.buyer)
+        category = Category.objects.create(name='Comida', category_type='FOOD')
+        cls.products = [
+            Product.objects.create(
+                seller=cls.seller, category=category, name=f'Producto {i}', price=Decimal('100.00'), stock=100
+            )
+            for i in range(10)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+
+    def order_data(self, products, quantity=1, **fields):
+        return {
+            'seller': str(self.seller.id),
+            'delivery_method': 'PICKUP',
+            'payment_method': 'CASH',
+            'buyer_phone': '77777777',
+            'buyer_email': 'comprador@example.com',
+            'items': [{'product_id': str(product.id), 'quantity': quantity} for product in products],
+            **fields,
+        }
+
+    def make_order(self, status=Order.OrderStatus.PAYMENT_PENDING, quantity=2, **fields):
+        """An order of the first product, created directly with its stock taken."""
+        product = self.products[0]
+        order = Order.objects.create(
+            buyer=self.buyer, seller=self.seller, status=status, subtotal='200.00', total='200.00',
+            delivery_method='PICKUP', payment_method='SINPE', buyer_phone='77777777',
+            buyer_email='comprador@example.com', **fields
+        )
+        OrderItem.objects.create(
+            order=order, product=product, product_name=product.name, product_price=product.price, quantity=quantity
+        )
+        Product.objects.filter(pk=product.pk).update(stock=F('stock') - quantity)
+        return order
+
+    def place_order(self, products, quantity=1, **fields):
+        response = self.client.post('/api/orders/', self.order_data(products, quantity, **fields), format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return Order.objects.latest('created_at')
+
+
+class OrderCreateQueryCountTests(OrderTestCase):
+    """Creating an order runs the same queries whatever the cart size."""
+
+    # Queries of POST /api/orders/ per stock strategy
+    EXPECTED_QUERIES = {
+        'lock': 9,
+        'conditional': 11,
+    }
+
+    def assertCreateQueries(self, strategy, item_count):
+        with override_settings(ORDER_STOCK_STRATEGY=strategy):
+            with self.assertNumQueries(self.EXPECTED_QUERIES[strategy]):
+                response = self.client.post(
+                    '/api/orders/', self.order_data(self.products[:item_count]), format='json'
+                )
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(Order.objects.latest('created_at').items.count(), item_count)
+
+    def test_lock_one_item(self):
+        self.assertCreateQueries('lock', 1)
+
+    def test_lock_ten_items(self):
+        self.assertCreateQueries('lock', 10)
+
+    def test_conditional_one_item(self):
+        self.assertCreateQueries('conditional', 1)
+
+    def test_conditional_ten_items(self):
+        self.assertCreateQueries('conditional', 10)
+
+    def test_stock_is_decremented(self):
+        for strategy in self.EXPECTED_QUERIES:
+            with override_settings(ORDER_STOCK_STRATEGY=strategy):
+                self.place_order(self.products[:10], quantity=3)
+        for product in self.products:
+            product.refresh_from_db()
+            self.assertEqual(product.stock, 94)
+
+    def test_sold_out_products_become_unavailable(self):
+        remaining = self.products[9]
+        for strategy, sold_out in zip(self.EXPECTED_QUERIES, self.products):
+            with override_settings(ORDER_STOCK_STRATEGY=strategy):
+                self.place_order([], items=[
+                    {'product_id': str(sold_out.id), 'quantity': 100},
+                    {'product_id': str(remaining.id), 'quantity': 1},
+                ])
+            sold_out.refresh_from_db()
+            self.assertEqual((sold_out.stock, sold_out.is_available), (0, False), strategy)
+
+        remaining.refresh_from_db()
+        self.assertEqual((remaining.stock, remaining.is_available), (98, True))
+
+
+class IdempotencyTests(OrderTestCase):
+    """Requests with an Idempotency-Key run once."""
+
+    def post(self, key='clave-1'):
+        return self.client.post(
+            '/api/orders/', self.order_data(self.products[:1]), format='json', HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def test_retry_replays_the_response(self):
+        first = self.post()
+        retry = self.post()
+
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry[idempotency.REPLAYED_HEADER], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_key_freed_by_a_failed_request_is_claimed_again(self):
+        real_claim = idempotency._claim
+        attempts = []
+
+        def claim(record):
+            # The first insert collides with a request that then rolls back
+            attempts.append(record)
+            return len(attempts) > 1 and real_claim(record)
+
+        with mock.patch('orders.idempotency._claim', side_effect=claim):
+            response = self.post()
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertTrue(IdempotencyKey.objects.filter(key='clave-1', status_code=201).exists())
+
+    def test_key_taken_again_meanwhile_is_a_conflict(self):
+        with mock.patch('orders.idempotency._claim', return_value=False):
+            response = self.post()
+
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Order.objects.exists())
+
+
+class ReservationTests(OrderTestCase):
+    """Units held by other buyers cannot be ordered."""
+
+    def setUp(self):
+        super().setUp()
+        other = User.objects.create_user(
+            'otro@example.com', 'pw12345678',
+            first_name='Eva', last_name='Rojas', phone='66666666', user_type='BUYER'
+        )
+        self.other_client = APIClient()
+        self.other_client.force_authenticate(other)
+
+    def reserve(self, client, product, quantity):
+        response = client.post(f'/api/products/{product.id}/reserve/', {'quantity': quantity}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+    def test_another_buyers_reservation_blocks_the_order(self):
+        product = self.products[0]
+        self.reserve(self.other_client, product, 99)
+
+        for strategy in OrderCreateQueryCountTests.EXPECTED_QUERIES:
+            with override_settings(ORDER_STOCK_STRATEGY=strategy):
+                response = self.client.post('/api/orders/', self.order_data([product], 2), format='json')
+            self.assertEqual(response.status_code, 400, strategy)
+
+        self.assertFalse(Order.objects.exists())
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 100)
+
+        self.place_order([product], 1)
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 99)
+
+    def test_own_reservation_is_converted_into_the_order(self):
+        product = self.products[0]
+        self.reserve(self.client, product, 100)
+
+        self.place_order([product], 100)
+
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 0)
+        self.assertFalse(product.reservations.exists())
+
+
+class CartCheckoutTests(OrderTestCase):
+    """A cart with products of several sellers becomes one order per seller."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other_seller = User.objects.create_user(
+            'panaderia@example.com', 'pw12345678',
+            first_name='Rosa', last_name='Vargas', phone='99999999', user_type='SELLER'
+        )
+        SellerProfile.objects.create(user=cls.other_seller, business_name='Pan Rosa', sinpe_number='99999999')
+        cls.bread = Product.objects.create(
+            seller=cls.other_seller, category=cls.products[0].category, name='Pan', price=Decimal('50.00'), stock=5
+        )
+
+    def checkout(self, items, **fields):
+        data = self.order_data([], items=items, payment_method='SINPE', **fields)
+        del data['seller']
+        return self.client.post('/api/orders/checkout/', data, format='json')
+
+    def test_one_order_per_seller(self):
+        response = self.checkout(
+            [
+                {'product_id': str(self.products[0].id), 'quantity': 2},
+                {'product_id': str(self.bread.id), 'quantity': 3},
+            ],
+            delivery_fees={str(self.other_seller.id): '1500.00'},
+        )
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['total'], '1850.00')
+        orders = {order.seller_id: order for order in Order.objects.filter(buyer=self.buyer)}
+        self.assertEqual(set(orders), {self.seller.id, self.other_seller.id})
+
+        cheese, bread = orders[self.seller.id], orders[self.other_seller.id]
+        self.assertEqual((cheese.subtotal, cheese.delivery_fee, cheese.total), (200, 0, 200))
+        self.assertEqual((bread.subtotal, bread.delivery_fee, bread.total), (150, 1500, 1650))
+        self.assertEqual(cheese.status, Order.OrderStatus.PENDING)
+        self.assertEqual(list(bread.items.values_list('product_id', 'quantity')), [(self.bread.id, 3)])
+
+        self.bread.refresh_from_db()
+        self.assertEqual(self.bread.stock, 2)
+
+    def test_a_short_product_fails_the_whole_cart(self):
+        response = self.checkout([
+            {'product_id': str(self.products[0].id), 'quantity': 2},
+            {'product_id': str(self.bread.id), 'quantity': 6},
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].stock, 100)
+
+    def test_fee_for_a_seller_not_in_the_cart_is_rejected(self):
+        response = self.checkout(
+            [{'product_id': str(self.products[0].id), 'quantity': 1}],
+            delivery_fees={str(self.other_seller.id): '1500.00'},
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('delivery_fees', response.data)
+        self.assertFalse(Order.objects.exists())
+
+
+class ConfirmPaymentTests(OrderTestCase):
+    """Payment confirmation goes through the state machine with the row locked."""
+
+    def setUp(self):
+        super().setUp()
+        self.seller_client = APIClient()
+        self.seller_client.force_authenticate(self.seller)
+
+    def confirm(self, order):
+        return self.seller_client.post(f'/api/orders/{order.id}/confirm_payment/')
+
+    def test_payment_pending_order_is_confirmed(self):
+        order = self.make_order()
+
+        response = self.confirm(order)
+
+        self.assertEqual(response.status_code, 200, response.data)
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.OrderStatus.CONFIRMED)
+        self.assertTrue(order.payment_verified)
+        self.assertIsNotNone(order.confirmed_at)
+        self.assertEqual(
+            list(OrderStatusHistory.objects.filter(order=order).values_list('status', flat=True)),
+            [Order.OrderStatus.CONFIRMED]
+        )
+        self.assertEqual(SellerDailySales.objects.get(seller=self.seller).orders, 1)
+
+    def test_second_confirmation_is_rejected(self):
+        order = self.make_order()
+        self.confirm(order)
+
+        response = self.confirm(order)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(OrderStatusHistory.objects.filter(order=order).count(), 1)
+
+    def test_order_cancelled_after_loading_stays_cancelled(self):
+        order = self.make_order()
+        Order.objects.filter(pk=order.pk).update(status=Order.OrderStatus.CANCELLED)
+
+        with self.assertRaises(InvalidTransitionError):
+            order.confirm_payment(self.seller)
+
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.OrderStatus.CANCELLED)
+        self.assertFalse(order.payment_verified)
+
+    def test_cancelled_order_cannot_be_confirmed(self):
+        order = self.make_order(status=Order.OrderStatus.CANCELLED)
+
+        response = self.confirm(order)
+
+        self.assertEqual(response.status_code, 400)
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.OrderStatus.CANCELLED)
+
+
+class BulkUpdateStatusTests(OrderTestCase):
+    """bulk_update_status changes every order or none."""
+
+    def setUp(self):
+        super().setUp()
+        self.seller_client = APIClient()
+        self.seller_client.force_authenticate(self.seller)
+
+    def bulk_update(self, orders, status):
+        return self.seller_client.post('/api/orders/bulk_update_status/', {
+            'order_ids': [str(order.id) for order in orders],
+            'status': status,
+        }, format='json')
+
+    def test_orders_are_moved_together(self):
+        orders = [self.make_order(Order.OrderStatus.CONFIRMED) for _ in range(2)]
+        shipped = self.make_order(Order.OrderStatus.SHIPPED)
+
+        response = self.bulk_update(orders + [shipped], Order.OrderStatus.SHIPPED)
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual((response.data['updated'], response.data['unchanged']), (2, 1))
+        for order in orders:
+            order.refresh_from_db()
+            self.assertEqual(order.status, Order.OrderStatus.SHIPPED)
+            self.assertIsNotNone(order.shipped_at)
+        self.assertEqual(OrderStatusHistory.objects.count(), 2)
+
+    def test_one_order_that_cannot_move_rejects_the_batch(self):
+        orders = [self.make_order(Order.OrderStatus.CONFIRMED) for _ in range(2)]
+        pending = self.make_order(Order.OrderStatus.PAYMENT_PENDING)
+
+        response = self.bulk_update(orders + [pending], Order.OrderStatus.SHIPPED)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['order_ids'], [str(pending.id)])
+        for order in orders:
+            order.refresh_from_db()
+            self.assertEqual(order.status, Order.OrderStatus.CONFIRMED)
+        self.assertFalse(OrderStatusHistory.objects.exists())
+
+    def test_cancelling_restores_stock_of_every_order(self):
+        orders = [self.make_order(Order.OrderStatus.CONFIRMED) for _ in range(3)]
+
+        response = self.bulk_update(orders, Order.OrderStatus.CANCELLED)
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].stock, 100)
+
+
+class ExpireStaleOrdersTests(OrderTestCase):
+    """expire_stale_orders cancels unpaid orders only."""
+
+    def make_stale_order(self, status=Order.OrderStatus.PENDING, **fields):
+        order = self.make_order(status=status)
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(hours=100), **fields)
+        return order
+
+    def add_receipt(self, order, verification_status):
+        return PaymentReceipt.objects.create(
+            order=order, receipt_image='receipts/recibo.jpg', verification_status=verification_status
+        )
+
+    def expire(self, *args):
+        out = io.StringIO()
+        call_command('expire_stale_orders', '--hours', '72', *args, stdout=out)
+        return out.getvalue()
+
+    def assertStatus(self, order, status):
+        order.refresh_from_db()
+        self.assertEqual(order.status, status)
+
+    def test_unpaid_orders_are_cancelled_and_stock_restored(self):
+        pending = self.make_stale_order()
+        payment_pending = self.make_stale_order(Order.OrderStatus.PAYMENT_PENDING)
+        rejected = self.make_stale_order(Order.OrderStatus.PAYMENT_PENDING)
+        self.add_receipt(rejected, PaymentReceipt.VerificationStatus.REJECTED)
+
+        self.expire('--batch-size', '2')
+
+        for order in (pending, payment_pending, rejected):
+            self.assertStatus(order, Order.OrderStatus.CANCELLED)
+            self.assertTrue(OrderStatusHistory.objects.filter(order=order, status=Order.OrderStatus.CANCELLED).exists())
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].stock, 100)
+
+    def test_availability_is_left_to_the_seller(self):
+        order = self.make_stale_order()
+        Product.objects.filter(pk=self.products[0].pk).update(stock=0, is_available=False)
+
+        self.expire()
+
+        self.assertStatus(order, Order.OrderStatus.CANCELLED)
+        self.products[0].refresh_from_db()
+        self.assertEqual((self.products[0].stock, self.products[0].is_available), (2, False))
+
+    def test_orders_with_a_payment_are_kept(self):
+        with_proof = self.make_stale_order(Order.OrderStatus.PAYMENT_PENDING, payment_proof='payment_proofs/sinpe.jpg')
+        verified = self.make_stale_order(Order.OrderStatus.PAYMENT_PENDING, payment_verified=True)
+        kept = [with_proof, verified]
+        for verification_status in (
+            PaymentReceipt.VerificationStatus.PENDING,
+            PaymentReceipt.VerificationStatus.VERIFYING,
+            PaymentReceipt.VerificationStatus.MANUAL_REVIEW,
+        ):
+            order = self.make_stale_order(Order.OrderStatus.PAYMENT_PENDING)
+            self.add_receipt(order, verification_status)
+            kept.append(order)
+
+        self.assertIn(': 0 órdenes', self.expire('--dry-run'))
+        self.expire()
+
+        for order in kept:
+            self.assertStatus(order, Order.OrderStatus.PAYMENT_PENDING)
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].stock, 100 - 2 * len(kept))
+
+    def test_recent_and_confirmed_orders_are_kept(self):
+        recent = self.make_order(status=Order.OrderStatus.PENDING)
+        confirmed = self.make_stale_order(Order.OrderStatus.CONFIRMED)
+
+        self.expire()
+
+        self.assertStatus(recent, Order.OrderStatus.PENDING)
+        self.assertStatus(confirmed, Order.OrderStatus.CONFIRMED)
+
+
+class ReceiptUploadTests(OrderTestCase):
+    """Receipt uploads lock the order and follow the state machine."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media_settings = override_settings(MEDIA_ROOT=media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+    def upload(self, order):
+        buffer = io.BytesIO()
+        Image.new('RGB', (32, 32), 'green').save(buffer, format='PNG')
+        return self.client.post('/api/payments/receipts/upload/', {
+            'order_id': str(order.id),
+            'receipt_image': SimpleUploadedFile('recibo.png', buffer.getvalue(), content_type='image/png'),
+        }, format='multipart')
+
+    def test_pending_order_moves_to_payment_pending(self):
+        order = self.make_order(status=Order.OrderStatus.PENDING)
+
+        response = self.upload(order)
+
+        self.assertEqual(response.status_code, 201, response.data)
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.OrderStatus.PAYMENT_PENDING)
+        self.assertTrue(OrderStatusHistory.objects.filter(
+            order=order, status=Order.OrderStatus.PAYMENT_PENDING, changed_by=self.buyer
+        ).exists())
+
+    def test_stale_order_with_an_uploaded_receipt_is_not_expired(self):
+        order = self.make_order(status=Order.OrderStatus.PENDING)
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(hours=100))
+        self.assertEqual(self.upload(order).status_code, 201)
+
+        call_command('expire_stale_orders', '--hours', '72', stdout=io.StringIO())
+
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.OrderStatus.PAYMENT_PENDING)
+        self.assertEqual(order.payment_receipt.verification_status, PaymentReceipt.VerificationStatus.PENDING)
+
+    def test_cancelled_order_is_rejected(self):
+        order = self.make_order(status=Order.OrderStatus.CANCELLED)
+
+        response = self.upload(order)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(PaymentReceipt.objects.filter(order=order).exists())
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.OrderStatus.CANCELLED)
+
+    def confirm_upload(self, order, name='recibo.png'):
+        from products.uploads import direct_upload_prefix
+
+        return self.client.post('/api/payments/receipts/confirm_upload/', {
+            'order_id': str(order.id),
+            'path': direct_upload_prefix('receipts', order.id) + name,
+        }, format='json')
+
+    def test_confirm_upload_needs_direct_uploads(self):
+        order = self.make_order(status=Order.OrderStatus.PENDING)
+
+        response = self.confirm_upload(order)
+
+        self.assertEqual(response.status_code, 501)
+
+    def test_confirm_upload_storage_failure(self):
+        order = self.make_order(status=Order.OrderStatus.PENDING)
+
+        with override_settings(
+            STORAGES={'default': {'BACKEND': 'products.storage_backends.LocalSupabaseStorage'}},
+            LOCAL_STORAGE_FAILURE_RATE=1,
+        ):
+            response = self.confirm_upload(order)
+
+        self.assertEqual(response.status_code, 502)
+        self.assertFalse(PaymentReceipt.objects.filter(order=order).exists())
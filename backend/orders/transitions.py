@@ -0,0 +1,158 @@
+"""
+Order status transitions.
+
+The allowed changes, the timestamp each status sets and its side effects
+are declared on Order (TRANSITIONS, STATUS_TIMESTAMPS,
+STATUS_SIDE_EFFECTS). ``transition_orders`` applies one transition to any
+number of orders with a fixed number of queries: one SELECT ... FOR UPDATE,
+one UPDATE of the changed columns, one INSERT of history rows, the side
+effects and the sales rollups (orders.rollups).
+"""
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from orders.models import Order, OrderStatusHistory
+from orders.rollups import CANCELLED_STATUSES, record_status_changes
+from orders.services import restore_stock
+
+
+class InvalidTransitionError(Exception):
+    """Some orders cannot move to the requested status."""
+
+    def __init__(self, orders, status):
+        self.orders = orders
+        self.status = status
+        numbers = ', '.join(order.order_number for order in orders)
+        super().__init__(
+            f"No se puede cambiar a {Order.OrderStatus(status).label} el estado de: {numbers}"
+        )
+
+
+# Names used in Order.STATUS_SIDE_EFFECTS; each receives the changed orders' ids
+SIDE_EFFECTS = {
+    'restore_stock': restore_stock,
+}
+
+
+def transition_orders(queryset, status, changed_by=None, notes=''):
+    """
+    Move every order of ``queryset`` to ``status``.
+
+    Orders already in ``status`` are left untouched, so a retried request
+    does not fail. If any other order cannot make the change, nothing is
+    changed.
+
+    Returns:
+        list: the orders that changed, with the new values set
+
+    Raises:
+        InvalidTransitionError: if the transition is not allowed for some
+            order
+    """
+    timestamp_field = Order.STATUS_TIMESTAMPS.get(status)
+    fields = ['id', 'order_number', 'status', 'seller_id', 'total']
+    if timestamp_field:
+        fields.append(timestamp_field)
+
+    with transaction.atomic():
+        orders = [
+            order for order in queryset.select_for_update().order_by('pk').only(*fields)
+            if order.status != status
+        ]
+        invalid = [order for order in orders if not order.can_transition_to(status)]
+        if invalid:
+            raise InvalidTransitionError(invalid, status)
+        if not orders:
+            return []
+
+        now = timezone.now()
+        order_ids = [order.pk for order in orders]
+        changes = [(order, order.status) for order in orders]
+
+        updates = {'status': status, 'updated_at': now}
+        if timestamp_field:
+            # Keep the first time the status was reached
+            updates[timestamp_field] = Coalesce(F(timestamp_field), Value(now))
+        Order.objects.filter(pk__in=order_ids).update(**updates)
+
+        OrderStatusHistory.objects.bulk_create([
+            OrderStatusHistory(
+                order=order,
+                status=status,
+                notes=notes or f'Estado cambiado de {old_status} a {status}',
+                changed_by=changed_by,
+            )
+            for order, old_status in changes
+        ])
+
+        for order in orders:
+            order.status = status
+            order.updated_at = now
+            if timestamp_field and getattr(order, timestamp_field) is None:
+                setattr(order, timestamp_field, now)
+
+        for side_effect in Order.STATUS_SIDE_EFFECTS.get(status, ()):
+            SIDE_EFFECTS[side_effect](order_ids)
+
+        record_status_changes(changes, now)
+
+    return orders
+
+
+def transition_order(order, status, changed_by=None, notes=''):
+    """
+    Move one order to ``status`` and update the instance.
+
+    Raises:
+        InvalidTransitionError: if the transition is not allowed
+    """
+    changed = transition_orders(Order.objects.filter(pk=order.pk), status, changed_by, notes)
+    for updated in changed:
+        order.status = updated.status
+        order.updated_at = updated.updated_at
+        timestamp_field = Order.STATUS_TIMESTAMPS.get(status)
+        if timestamp_field:
+            setattr(order, timestamp_field, getattr(updated, timestamp_field))
+    return bool(changed)
+
+
+def confirm_payment(order, changed_by=None, notes=''):
+    """
+    Mark the payment of ``order`` as verified and confirm the order if it
+    was waiting for payment, with the row locked.
+
+    The status and payment fields are checked on the locked row, not on
+    ``order``, so a concurrent change (e.g. the order expired and was
+    cancelled) is never overwritten. The instance is updated.
+
+    Returns:
+        bool: False if the payment was already verified
+
+    Raises:
+        InvalidTransitionError: if the order was cancelled or refunded
+    """
+    with transaction.atomic():
+        locked = (
+            Order.objects.select_for_update()
+            .only('id', 'order_number', 'status', 'payment_verified')
+            .get(pk=order.pk)
+        )
+        if locked.payment_verified:
+            order.payment_verified = True
+            return False
+        if locked.status in CANCELLED_STATUSES:
+            raise InvalidTransitionError([locked], Order.OrderStatus.CONFIRMED)
+
+        now = timezone.now()
+        Order.objects.filter(pk=order.pk).update(payment_verified=True, payment_verified_at=now, updated_at=now)
+        order.payment_verified = True
+        order.payment_verified_at = now
+
+        if locked.status == Order.OrderStatus.PAYMENT_PENDING:
+            transition_order(order, Order.OrderStatus.CONFIRMED, changed_by, notes)
+        elif notes:
+            OrderStatusHistory.objects.create(order=order, status=locked.status, notes=notes, changed_by=changed_by)
+
+    return True
@@ -1,20 +1,30 @@
 """
 Views for orders app.
 """
+from decimal import Decimal
+
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.exceptions import PermissionDenied
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import OrderingFilter, SearchFilter
+from django.db.models import OuterRef, Prefetch, Subquery
 
-from orders.models import Order, OrderItem
+from orders.idempotency import idempotent
+from orders.models import Order, OrderItem, OrderStatusHistory
 from orders.serializers import (
     OrderSerializer,
+    OrderListSerializer,
     OrderCreateSerializer,
+    CartCheckoutSerializer,
     OrderUpdateStatusSerializer,
+    OrderBulkStatusSerializer,
     OrderItemSerializer,
 )
 from orders.utils import calculate_distance, calculate_delivery_fee
+from products.models import Product
+from products.reservations import annotate_available_stock
 from users.models import User
 
 
@@ -44,25 +54,30 @@ class OrderViewSet(viewsets.ModelViewSet):
     """
     ViewSet for managing orders.
 
-    list: Get all orders (filtered by user role)
-    create: Create a new order (buyers only)
-    retrieve: Get order details
+    list: Get all orders (filtered by user role, compact representation)
+    create: Create a new order (buyers only, accepts an Idempotency-Key header)
+    retrieve: Get order details (full representation)
     update: Update order (limited fields)
     partial_update: Partially update order
     destroy: Cancel order
 
     Custom actions:
+    - checkout: Create one order per seller from a multi-seller cart (buyers only)
     - update_status: Update order status (sellers only)
+    - bulk_update_status: Apply one status change to many orders (sellers only)
     - my_purchases: Get current user's purchases (buyers)
     - my_sales: Get current user's sales (sellers)
+    - analytics: Daily sales, totals and top products (sellers)
     """
+    # UserSerializer reads both profiles of every user before dropping the
+    # one that does not apply
     queryset = Order.objects.all().select_related(
         'buyer',
+        'buyer__buyer_profile',
+        'buyer__seller_profile',
         'seller',
+        'seller__buyer_profile',
         'seller__seller_profile'
-    ).prefetch_related(
-        'items__product',
-        'status_history'
     )
     permission_classes = [permissions.IsAuthenticated, IsOrderParticipant]
     filter_backends = [DjangoFilterBackend, OrderingFilter, SearchFilter]
@@ -71,18 +86,27 @@ class OrderViewSet(viewsets.ModelViewSet):
     ordering = ['-created_at']
     search_fields = ['order_number', 'buyer__email', 'seller__email']
 
+    # Actions that return pages of orders (OrderListSerializer)
+    list_actions = ('list', 'my_purchases', 'my_sales')
+
     def get_serializer_class(self):
         """Return appropriate serializer class."""
-        if self.action == 'create':
+        if self.action in self.list_actions:
+            return OrderListSerializer
+        elif self.action == 'create':
             return OrderCreateSerializer
+        elif self.action == 'checkout':
+            return CartCheckoutSerializer
         elif self.action == 'update_status':
             return OrderUpdateStatusSerializer
+        elif self.action == 'bulk_update_status':
+            return OrderBulkStatusSerializer
         return OrderSerializer
 
     def get_queryset(self):
         """Filter queryset based on user type."""
         user = self.request.user
-        queryset = super().get_queryset()
+        queryset = self.optimize_queryset(super().get_queryset())
 
         # Admins see everything
         if user.is_staff:
@@ -98,46 +122,124 @@ class OrderViewSet(viewsets.ModelViewSet):
 
         return queryset.none()
 
+    def optimize_queryset(self, queryset):
+        """
+        Load what the action's serializer reads in a fixed number of queries.
+
+        Lists (OrderListSerializer): one query for the page of orders with
+        buyer, seller and latest status change, one for their items.
+        Details (OrderSerializer): items with their products, annotated
+        with available stock, and the status history with its authors.
+        """
+        if self.action in self.list_actions:
+            latest_change = OrderStatusHistory.objects.filter(order=OuterRef('pk')).order_by('-created_at')
+            return queryset.prefetch_related('items').annotate(
+                last_status_at=Subquery(latest_change.values('created_at')[:1]),
+                last_status_notes=Subquery(latest_change.values('notes')[:1]),
+            )
+
+        products = annotate_available_stock(
+            Product.objects.select_related('seller', 'seller__seller_profile', 'category')
+        )
+        return queryset.prefetch_related(
+            Prefetch('items__product', queryset=products),
+            Prefetch('status_history', queryset=OrderStatusHistory.objects.select_related('changed_by')),
+        )
+
+    @idempotent('orders.create')
+    def create(self, request, *args, **kwargs):
+        """Create an order; retries with the same Idempotency-Key get the first response."""
+        return super().create(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         """Create order as buyer."""
         if self.request.user.user_type != User.UserType.BUYER:
-            raise permissions.PermissionDenied("Solo los compradores pueden crear órdenes")
+            raise PermissionDenied("Solo los compradores pueden crear órdenes")
         serializer.save()
 
     def perform_destroy(self, instance):
-        """Cancel order instead of deleting."""
-        from django.db import transaction
+        """
+        Cancel order instead of deleting.
+
+        Stock is restored with one UPDATE for all items and the history
+        entry written by the status transition (see orders.transitions).
+        """
+        from orders.transitions import transition_orders
 
-        if instance.status not in [Order.OrderStatus.PENDING, Order.OrderStatus.PAYMENT_PENDING]:
-            raise permissions.PermissionDenied(
+        cancellable = [Order.OrderStatus.PENDING, Order.OrderStatus.PAYMENT_PENDING]
+        if instance.status not in cancellable:
+            raise PermissionDenied(
                 "Solo se pueden cancelar órdenes en estado Pendiente o Pago Pendiente"
             )
 
-        # Use transaction to ensure atomicity
-        with transaction.atomic():
-            # Restore stock for all items in the order
-            for item in instance.items.all():
-                product = item.product
-                product.stock += item.quantity
-                product.save(update_fields=['stock'])
-
-            instance.status = Order.OrderStatus.CANCELLED
-            instance.save()
-
-            # Create status history
-            from orders.models import OrderStatusHistory
-            OrderStatusHistory.objects.create(
-                order=instance,
-                status=Order.OrderStatus.CANCELLED,
-                notes="Orden cancelada por el usuario",
-                changed_by=self.request.user
+        # Filtering on status again: the row is locked before cancelling, so
+        # an order confirmed in the meantime is not cancelled
+        cancelled = transition_orders(
+            Order.objects.filter(pk=instance.pk, status__in=cancellable),
+            Order.OrderStatus.CANCELLED,
+            self.request.user,
+            "Orden cancelada por el usuario"
+        )
+        if not cancelled:
+            raise PermissionDenied(
+                "Solo se pueden cancelar órdenes en estado Pendiente o Pago Pendiente"
+            )
+
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    @idempotent('orders.checkout')
+    def checkout(self, request):
+        """
+        Check out a cart with products of several sellers.
+
+        Creates one order per seller in a single transaction: either every
+        order is created or none is.
+
+        Expected request data: the fields of an order without ``seller``
+        and ``payment_proof``, plus optional ``delivery_fees``:
+        {
+            "items": [{"product_id": "uuid", "quantity": 1}, ...],
+            "delivery_fees": {"seller_id": "1500.00"},
+            "delivery_method": "DELIVERY",
+            "payment_method": "SINPE",
+            ...
+        }
+
+        Returns:
+        {
+            "orders": [...],
+            "total": "12500.00"
+        }
+        """
+        if request.user.user_type != User.UserType.BUYER:
+            return Response(
+                {'detail': 'Solo los compradores pueden crear órdenes'},
+                status=status.HTTP_403_FORBIDDEN
             )
 
+        serializer = CartCheckoutSerializer(
+            data=request.data,
+            context={'request': request}
+        )
+        serializer.is_valid(raise_exception=True)
+        created = serializer.save()
+
+        ids = [order.pk for order in created]
+        orders = sorted(self.get_queryset().filter(pk__in=ids), key=lambda order: ids.index(order.pk))
+        total = sum((order.total for order in created), Decimal('0.00'))
+
+        return Response(
+            {
+                'orders': OrderSerializer(orders, many=True).data,
+                'total': str(total),
+            },
+            status=status.HTTP_201_CREATED
+        )
+
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def update_status(self, request, pk=None):
         """
         Update order status.
-        Only sellers can update their sales status.
+        Only sellers can update their sales status, following Order.TRANSITIONS.
         """
         order = self.get_object()
 
@@ -156,7 +258,78 @@ class OrderViewSet(viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
         serializer.save()
 
-        return Response(OrderSerializer(order).data)
+        # Reload so the response includes the new history entry and stock
+        return Response(OrderSerializer(self.get_object()).data)
+
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    def bulk_update_status(self, request):
+        """
+        Apply one status change to many orders at once.
+        Only sellers can update their sales status; all orders change or none.
+
+        Expected request data:
+        {
+            "order_ids": ["uuid", ...],
+            "status": "SHIPPED",
+            "notes": "Enviado por correo"
+        }
+
+        Returns:
+        {
+            "status": "SHIPPED",
+            "updated": 48,
+            "unchanged": 2
+        }
+        Orders already in the requested status are counted as unchanged.
+        """
+        from orders.transitions import InvalidTransitionError, transition_orders
+
+        if request.user.user_type != User.UserType.SELLER and not request.user.is_staff:
+            return Response(
+                {'detail': 'Solo el vendedor puede actualizar el estado de la orden'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        serializer = OrderBulkStatusSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        order_ids = set(serializer.validated_data['order_ids'])
+        new_status = serializer.validated_data['status']
+
+        orders = Order.objects.filter(pk__in=order_ids)
+        if not request.user.is_staff:
+            orders = orders.filter(seller=request.user)
+
+        missing = order_ids - set(orders.values_list('pk', flat=True))
+        if missing:
+            return Response(
+                {
+                    'detail': 'Algunas órdenes no existen o no son ventas tuyas',
+                    'order_ids': sorted(str(order_id) for order_id in missing),
+                },
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        try:
+            changed = transition_orders(
+                orders,
+                new_status,
+                request.user,
+                serializer.validated_data.get('notes', '')
+            )
+        except InvalidTransitionError as e:
+            return Response(
+                {
+                    'detail': str(e),
+                    'order_ids': [str(order.pk) for order in e.orders],
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response({
+            'status': new_status,
+            'updated': len(changed),
+            'unchanged': len(order_ids) - len(changed),
+        })
 
     @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def calculate_delivery_cost(self, request):
@@ -247,6 +420,81 @@ class OrderViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(orders, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
+    def analytics(self, request):
+        """
+        Sales analytics for the current seller, read from the daily rollups.
+
+        Query params:
+        - days: number of days including today (default: 30, max: 366)
+
+        Returns totals for the period, one entry per day with activity and
+        the top 10 products by revenue. Amounts are strings, like the
+        DecimalField serializers.
+        """
+        from datetime import timedelta
+        from django.db.models import Sum
+        from django.utils import timezone
+        from orders.models import ProductDailySales, SellerDailySales
+        from orders.rollups import ROLLUP_FIELDS
+
+        if request.user.user_type != User.UserType.SELLER:
+            return Response(
+                {'detail': 'Solo los vendedores pueden ver sus estadísticas de ventas'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        try:
+            days = int(request.query_params.get('days', 30))
+        except ValueError:
+            days = 0
+        if not 1 <= days <= 366:
+            return Response(
+                {'detail': 'days debe ser un número entero entre 1 y 366'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        date_to = timezone.localdate()
+        date_from = date_to - timedelta(days=days - 1)
+
+        daily = list(
+            SellerDailySales.objects.filter(seller=request.user, date__range=(date_from, date_to))
+            .order_by('date')
+            .values('date', *ROLLUP_FIELDS)
+        )
+
+        def money(value):
+            return str(Decimal(value).quantize(Decimal('0.01')))
+
+        totals = {field: sum(day[field] for day in daily) for field in ROLLUP_FIELDS}
+        totals['revenue'] = money(totals['revenue'])
+        for day in daily:
+            day['revenue'] = money(day['revenue'])
+
+        top_products = list(
+            ProductDailySales.objects.filter(seller=request.user, date__range=(date_from, date_to))
+            .values('product_id', 'product__name')
+            .annotate(orders=Sum('orders'), units=Sum('units'), revenue=Sum('revenue'))
+            .order_by('-revenue')[:10]
+        )
+
+        return Response({
+            'date_from': date_from,
+            'date_to': date_to,
+            'totals': totals,
+            'daily': daily,
+            'top_products': [
+                {
+                    'id': product['product_id'],
+                    'name': product['product__name'],
+                    'orders': product['orders'],
+                    'units': product['units'],
+                    'revenue': money(product['revenue']),
+                }
+                for product in top_products
+            ],
+        })
+
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def confirm_payment(self, request, pk=None):
         """
@@ -276,25 +524,23 @@ class OrderViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Mark payment as verified
-        from django.utils import timezone
-        order.payment_verified = True
-        order.payment_verified_at = timezone.now()
-
-        # If order is in PAYMENT_PENDING, move it to CONFIRMED
-        if order.status == Order.OrderStatus.PAYMENT_PENDING:
-            order.status = Order.OrderStatus.CONFIRMED
-            order.confirmed_at = timezone.now()
-
-        order.save()
-
-        # Create status history
-        from orders.models import OrderStatusHistory
-        OrderStatusHistory.objects.create(
-            order=order,
-            status=order.status,
-            notes='Pago SINPE Móvil verificado y confirmado por el vendedor',
-            changed_by=request.user
-        )
+        # Mark payment as verified; PAYMENT_PENDING orders become CONFIRMED
+        from orders.transitions import InvalidTransitionError
+        try:
+            confirmed = order.confirm_payment(
+                request.user,
+                'Pago SINPE Móvil verificado y confirmado por el vendedor'
+            )
+        except InvalidTransitionError as e:
+            # The order was cancelled since it was loaded
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+        if not confirmed:
+            return Response(
+                {'detail': 'El pago ya ha sido verificado'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Reload so the response includes the new history entry
+        order = self.get_object()
         return Response(OrderSerializer(order).data)
@@ -0,0 +1,114 @@
+"""
+Delete the images of expired payment receipts.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from payments.models import PaymentReceipt
+from products.models import PendingStorageDeletion
+from products.storage_backends import delete_files
+
+
+# Receipts still waiting for a decision keep their image for the reviewer
+PURGEABLE_STATUSES = (
+    PaymentReceipt.VerificationStatus.APPROVED,
+    PaymentReceipt.VerificationStatus.REJECTED,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Elimina las imágenes de los comprobantes expirados (aprobados o rechazados). '
+        'Los datos extraídos y los logs de verificación se conservan para auditoría.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Comprobantes procesados por lote (default: 100)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Solo contar los comprobantes expirados, sin eliminar nada'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Seguir purgando comprobantes expirados indefinidamente (modo worker)'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=3600,
+            help='Segundos de espera entre búsquedas en modo --loop (default: 3600)'
+        )
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            count = self.expired(timezone.now()).count()
+            self.stdout.write(self.style.WARNING(f"Modo --dry-run: {count} comprobantes expirados por purgar"))
+            return
+
+        while True:
+            now = timezone.now()
+            purged = files = 0
+            while True:
+                receipts, deleted = self.purge_batch(now, options['batch_size'])
+                if not receipts:
+                    break
+                purged += receipts
+                files += deleted
+
+            if purged or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"✓ {purged} comprobantes purgados, {files} imágenes eliminadas del storage"
+                ))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def expired(self, now):
+        """Expired receipts whose image has not been purged yet."""
+        return PaymentReceipt.objects.filter(
+            purged_at__isnull=True,
+            expires_at__lte=now,
+            verification_status__in=PURGEABLE_STATUSES,
+        )
+
+    def purge_batch(self, now, batch_size):
+        """
+        Purge one batch of receipts and return (receipts, files deleted).
+
+        Rows are locked with SKIP LOCKED and marked as purged in the same
+        transaction that queues their images, so a failed storage call never
+        loses a file: it stays in the queue for process_storage_deletions.
+        """
+        with transaction.atomic():
+            batch = list(
+                self.expired(now)
+                .select_for_update(skip_locked=True)
+                .order_by('expires_at')
+                .values_list('pk', 'receipt_image')[:batch_size]
+            )
+            if not batch:
+                return 0, 0
+
+            ids = [pk for pk, _name in batch]
+            names = [name for _pk, name in batch if name]
+            PaymentReceipt.objects.filter(pk__in=ids).update(receipt_image='', purged_at=timezone.now())
+            PendingStorageDeletion.enqueue(names)
+
+        try:
+            delete_files(names)
+        except Exception as e:
+            self.stderr.write(self.style.ERROR(f"✗ Error eliminando {len(names)} imágenes, quedan encoladas: {e}"))
+            return len(ids), 0
+
+        PendingStorageDeletion.objects.filter(path__in=names).delete()
+        return len(ids), len(names)
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.1 on 2026-10-19 16:16
+
+import mercatico.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payments", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="paymentreceipt",
+            name="receipt_image",
+            field=mercatico.fields.NormalizedImageField(
+                help_text="Captura de pantalla del comprobante SINPE Móvil",
+                profile="receipt",
+                upload_to="receipts/%Y/%m/%d/",
+                verbose_name="comprobante",
+            ),
+        ),
+    ]
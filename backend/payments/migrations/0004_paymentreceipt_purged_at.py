@@ -0,0 +1,30 @@
+# Generated by Django 5.0.1 on 2026-10-19 16:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payments", "0003_alter_paymentreceipt_receipt_image"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="paymentreceipt",
+            name="purged_at",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="Fecha en que se eliminó la imagen del comprobante (los datos extraídos se conservan)",
+                null=True,
+                verbose_name="fecha de purga",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="paymentreceipt",
+            index=models.Index(
+                fields=["purged_at", "expires_at"],
+                name="payments_pa_purged__7ad42d_idx",
+            ),
+        ),
+    ]
@@ -8,6 +8,7 @@ from django.utils import timezone
 from datetime import timedelta
 from django.conf import settings
 from orders.models import Order
+from mercatico.fields import NormalizedImageField
 
 
 class PaymentReceipt(models.Model):
@@ -32,9 +33,10 @@ class PaymentReceipt(models.Model):
     )
 
     # Receipt image (encrypted URL or base64)
-    receipt_image = models.ImageField(
+    receipt_image = NormalizedImageField(
         'comprobante',
         upload_to='receipts/%Y/%m/%d/',
+        profile='receipt',
         help_text='Captura de pantalla del comprobante SINPE Móvil'
     )
 
@@ -92,6 +94,12 @@ class PaymentReceipt(models.Model):
     created_at = models.DateTimeField('fecha de subida', auto_now_add=True)
     verified_at = models.DateTimeField('fecha de verificación', null=True, blank=True)
     expires_at = models.DateTimeField('fecha de expiración', null=True, blank=True)
+    purged_at = models.DateTimeField(
+        'fecha de purga',
+        null=True,
+        blank=True,
+        help_text='Fecha en que se eliminó la imagen del comprobante (los datos extraídos se conservan)'
+    )
 
     class Meta:
         verbose_name = 'comprobante de pago'
@@ -101,6 +109,7 @@ class PaymentReceipt(models.Model):
             models.Index(fields=['order']),
             models.Index(fields=['verification_status', '-created_at']),
             models.Index(fields=['-expires_at']),
+            models.Index(fields=['purged_at', 'expires_at']),
         ]
 
     def __str__(self):
@@ -117,15 +126,28 @@ class PaymentReceipt(models.Model):
         """Check if receipt has expired."""
         return timezone.now() > self.expires_at
 
+    def is_purged(self):
+        """Check if the receipt image has already been deleted."""
+        return self.purged_at is not None
+
     def approve(self, notes=''):
-        """Approve the payment receipt."""
-        self.verification_status = self.VerificationStatus.APPROVED
-        self.verified_at = timezone.now()
-        self.verification_notes = notes
-        self.save(update_fields=['verification_status', 'verified_at', 'verification_notes'])
+        """
+        Approve the payment receipt.
+
+        Raises:
+            InvalidTransitionError: if the order was cancelled; the receipt
+                is left unchanged
+        """
+        from django.db import transaction
+
+        with transaction.atomic():
+            self.verification_status = self.VerificationStatus.APPROVED
+            self.verified_at = timezone.now()
+            self.verification_notes = notes
+            self.save(update_fields=['verification_status', 'verified_at', 'verification_notes'])
 
-        # Update order payment status
-        self.order.confirm_payment()
+            # Update order payment status
+            self.order.confirm_payment()
 
     def reject(self, notes=''):
         """Reject the payment receipt."""
@@ -1,10 +1,14 @@
 """
 Serializers for payments app.
 """
+import logging
+
 from rest_framework import serializers
 from payments.models import PaymentReceipt, PaymentVerificationLog
 from orders.models import Order
 
+logger = logging.getLogger(__name__)
+
 
 class PaymentReceiptSerializer(serializers.ModelSerializer):
     """Serializer for payment receipts."""
@@ -36,8 +40,9 @@ class PaymentReceiptSerializer(serializers.ModelSerializer):
             'llm_confidence',
             'reviewed_by',
             'created_at',
-            'updated_at',
+            'verified_at',
             'expires_at',
+            'purged_at',
         ]
         read_only_fields = [
             'id',
@@ -48,8 +53,9 @@ class PaymentReceiptSerializer(serializers.ModelSerializer):
             'llm_confidence',
             'reviewed_by',
             'created_at',
-            'updated_at',
+            'verified_at',
             'expires_at',
+            'purged_at',
         ]
 
     def validate_order(self, value):
@@ -69,10 +75,9 @@ class PaymentReceiptSerializer(serializers.ModelSerializer):
         return value
 
 
-class PaymentReceiptUploadSerializer(serializers.Serializer):
-    """Serializer for uploading payment receipt."""
+class ReceiptOrderSerializer(serializers.Serializer):
+    """Validates the order a payment receipt is being uploaded for."""
     order_id = serializers.UUIDField()
-    receipt_image = serializers.ImageField()
 
     def validate_order_id(self, value):
         """Validate order exists and belongs to user."""
@@ -96,24 +101,72 @@ class PaymentReceiptUploadSerializer(serializers.Serializer):
 
         return value
 
-    def create(self, validated_data):
-        """Create payment receipt."""
-        order = Order.objects.get(id=validated_data['order_id'])
 
-        receipt = PaymentReceipt.objects.create(
-            order=order,
-            receipt_image=validated_data['receipt_image'],
-            verification_status=PaymentReceipt.VerificationStatus.PENDING
-        )
+class PaymentReceiptUploadSerializer(ReceiptOrderSerializer):
+    """Serializer for uploading payment receipt."""
+    receipt_image = serializers.ImageField()
 
-        # Update order status
-        if order.status == Order.OrderStatus.PENDING:
-            order.status = Order.OrderStatus.PAYMENT_PENDING
-            order.save()
+    def create(self, validated_data):
+        """
+        Create payment receipt and move a PENDING order to PAYMENT_PENDING.
+
+        The order is locked first, so it cannot expire (expire_stale_orders)
+        or change status while the receipt is attached.
+        """
+        from django.db import transaction
+        from orders.rollups import CANCELLED_STATUSES
+        from orders.transitions import transition_order
+
+        with transaction.atomic():
+            order = Order.objects.select_for_update().get(id=validated_data['order_id'])
+            if order.status in CANCELLED_STATUSES:
+                raise serializers.ValidationError({
+                    'order_id': f"No se puede subir un comprobante para una orden en estado {order.get_status_display()}"
+                })
+
+            receipt = PaymentReceipt.objects.create(
+                order=order,
+                receipt_image=validated_data['receipt_image'],
+                verification_status=PaymentReceipt.VerificationStatus.PENDING
+            )
+
+            # Update order status
+            if order.status == Order.OrderStatus.PENDING:
+                transition_order(
+                    order,
+                    Order.OrderStatus.PAYMENT_PENDING,
+                    self.context['request'].user,
+                    'Comprobante de pago subido por el comprador'
+                )
 
         return receipt
 
 
+class PaymentReceiptConfirmUploadSerializer(PaymentReceiptUploadSerializer):
+    """
+    Serializer for confirming a receipt uploaded directly to storage.
+
+    The uploaded object is checked and downloaded, then saved as the
+    receipt image exactly like a multipart upload.
+    """
+    receipt_image = None
+    path = serializers.CharField()
+
+    def validate(self, attrs):
+        from mercatico.exceptions import StorageUnavailable
+        from products.storage_backends import STORAGE_ERRORS
+        from products.uploads import DirectUploadError, open_direct_upload
+
+        try:
+            attrs['receipt_image'] = open_direct_upload(attrs['path'], 'receipts', attrs['order_id'])
+        except DirectUploadError as e:
+            raise serializers.ValidationError({'path': str(e)})
+        except STORAGE_ERRORS:
+            logger.exception('Error fetching receipt upload %s', attrs['path'])
+            raise StorageUnavailable('No se pudo leer el comprobante, intenta de nuevo')
+        return attrs
+
+
 class PaymentVerificationLogSerializer(serializers.ModelSerializer):
     """Serializer for payment verification logs."""
     performed_by_name = serializers.CharField(
@@ -144,15 +197,22 @@ class ManualReviewSerializer(serializers.Serializer):
 
     def update(self, instance, validated_data):
         """Update receipt verification status."""
-        if validated_data['approved']:
-            instance.verification_status = PaymentReceipt.VerificationStatus.APPROVED
-            instance.order.confirm_payment()
-        else:
-            instance.verification_status = PaymentReceipt.VerificationStatus.REJECTED
-
-        instance.verification_notes = validated_data.get('notes', '')
-        instance.reviewed_by = self.context['request'].user
-        instance.save()
+        from django.db import transaction
+        from orders.transitions import InvalidTransitionError
+
+        with transaction.atomic():
+            if validated_data['approved']:
+                instance.verification_status = PaymentReceipt.VerificationStatus.APPROVED
+                try:
+                    instance.order.confirm_payment(self.context['request'].user)
+                except InvalidTransitionError as e:
+                    raise serializers.ValidationError({'approved': str(e)})
+            else:
+                instance.verification_status = PaymentReceipt.VerificationStatus.REJECTED
+
+            instance.verification_notes = validated_data.get('notes', '')
+            instance.reviewed_by = self.context['request'].user
+            instance.save()
 
         # Create verification log
         PaymentVerificationLog.objects.create(
@@ -1,21 +1,28 @@
 """
 Views for payments app.
 """
+import logging
+
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import OrderingFilter
 
+from orders.idempotency import idempotent
 from payments.models import PaymentReceipt, PaymentVerificationLog
 from payments.serializers import (
     PaymentReceiptSerializer,
     PaymentReceiptUploadSerializer,
+    PaymentReceiptConfirmUploadSerializer,
+    ReceiptOrderSerializer,
     PaymentVerificationLogSerializer,
     ManualReviewSerializer,
 )
 from users.models import User
 
+logger = logging.getLogger(__name__)
+
 
 class IsReceiptOwnerOrSeller(permissions.BasePermission):
     """
@@ -49,7 +56,9 @@ class PaymentReceiptViewSet(viewsets.ModelViewSet):
     destroy: Delete receipt (only if pending)
 
     Custom actions:
-    - upload: Upload payment receipt
+    - upload: Upload payment receipt (accepts an Idempotency-Key header)
+    - upload_url: Get a signed URL to upload the receipt directly to storage
+    - confirm_upload: Create the receipt from a direct upload
     - manual_review: Manually approve/reject receipt (sellers only)
     - verify_llm: Verify receipt using LLM (future implementation)
     """
@@ -61,13 +70,17 @@ class PaymentReceiptViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated, IsReceiptOwnerOrSeller]
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_fields = ['verification_status', 'verified_by_llm']
-    ordering_fields = ['created_at', 'updated_at']
+    ordering_fields = ['created_at', 'verified_at']
     ordering = ['-created_at']
 
     def get_serializer_class(self):
         """Return appropriate serializer class."""
         if self.action == 'upload':
             return PaymentReceiptUploadSerializer
+        elif self.action == 'upload_url':
+            return ReceiptOrderSerializer
+        elif self.action == 'confirm_upload':
+            return PaymentReceiptConfirmUploadSerializer
         elif self.action == 'manual_review':
             return ManualReviewSerializer
         return PaymentReceiptSerializer
@@ -108,6 +121,7 @@ class PaymentReceiptViewSet(viewsets.ModelViewSet):
         super().perform_destroy(instance)
 
     @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    @idempotent('payments.upload')
     def upload(self, request):
         """
         Upload a payment receipt for an order.
@@ -131,6 +145,83 @@ class PaymentReceiptViewSet(viewsets.ModelViewSet):
             status=status.HTTP_201_CREATED
         )
 
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    def upload_url(self, request):
+        """
+        Get a signed URL to upload a receipt directly to storage.
+        The client PUTs the image to ``upload_url`` and then calls
+        confirm_upload with the returned ``path``.
+        """
+        from products.uploads import create_direct_uploads, supports_direct_uploads
+
+        if request.user.user_type != User.UserType.BUYER:
+            return Response(
+                {'detail': 'Solo los compradores pueden subir comprobantes'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        if not supports_direct_uploads():
+            return Response(
+                {'detail': 'El almacenamiento actual no permite subidas directas'},
+                status=status.HTTP_501_NOT_IMPLEMENTED
+            )
+
+        serializer = ReceiptOrderSerializer(
+            data=request.data,
+            context={'request': request}
+        )
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            upload = create_direct_uploads('receipts', serializer.validated_data['order_id'], 1)[0]
+        except Exception:
+            logger.exception('Error creating receipt upload URL for order %s', serializer.validated_data['order_id'])
+            return Response(
+                {'detail': 'No se pudo preparar la subida, intenta de nuevo'},
+                status=status.HTTP_502_BAD_GATEWAY
+            )
+
+        return Response(upload)
+
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    def confirm_upload(self, request):
+        """
+        Create the payment receipt from an image uploaded with upload_url.
+        """
+        from products.models import PendingStorageDeletion
+        from products.uploads import supports_direct_uploads
+
+        if request.user.user_type != User.UserType.BUYER:
+            return Response(
+                {'detail': 'Solo los compradores pueden subir comprobantes'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        if not supports_direct_uploads():
+            return Response(
+                {'detail': 'El almacenamiento actual no permite subidas directas'},
+                status=status.HTTP_501_NOT_IMPLEMENTED
+            )
+
+        serializer = PaymentReceiptConfirmUploadSerializer(
+            data=request.data,
+            context={'request': request}
+        )
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            receipt = serializer.save()
+        finally:
+            serializer.validated_data['receipt_image'].close()
+
+        # The normalized copy is stored under receipts/; drop the raw upload
+        PendingStorageDeletion.enqueue([serializer.validated_data['path']])
+
+        return Response(
+            PaymentReceiptSerializer(receipt).data,
+            status=status.HTTP_201_CREATED
+        )
+
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def manual_review(self, request, pk=None):
         """
@@ -2,7 +2,7 @@
 Admin configuration for Products app.
 """
 from django.contrib import admin
-from products.models import Category, Product, ProductImage
+from products.models import Category, ImageBlob, PendingStorageDeletion, Product, ProductImage, StockReservation
 
 
 @admin.register(Category)
@@ -46,3 +46,33 @@ class ProductImageAdmin(admin.ModelAdmin):
     list_filter = ['created_at']
     search_fields = ['product__name']
     ordering = ['product', 'order']
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    """Admin for StockReservation model."""
+
+    list_display = ['product', 'buyer', 'quantity', 'expires_at', 'created_at']
+    list_filter = ['expires_at']
+    search_fields = ['product__name', 'buyer__email']
+    raw_id_fields = ['product', 'buyer']
+
+
+@admin.register(PendingStorageDeletion)
+class PendingStorageDeletionAdmin(admin.ModelAdmin):
+    """Admin for PendingStorageDeletion model."""
+
+    list_display = ['path', 'attempts', 'created_at']
+    list_filter = ['attempts', 'created_at']
+    search_fields = ['path']
+    readonly_fields = ['path', 'attempts', 'last_error', 'created_at']
+
+
+@admin.register(ImageBlob)
+class ImageBlobAdmin(admin.ModelAdmin):
+    """Admin for ImageBlob model."""
+
+    list_display = ['sha256', 'ref_count', 'created_at']
+    list_filter = ['created_at']
+    search_fields = ['sha256']
+    readonly_fields = ['sha256', 'variants', 'ref_count', 'created_at']
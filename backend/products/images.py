@@ -0,0 +1,228 @@
+"""
+Image processing for uploads.
+
+Uploaded photos are decoded once with Pillow and re-encoded into a fixed set
+of variants so listings never have to download the original file. Every
+other uploaded image (logos, payment receipts) goes through
+``normalize_image``: downscaled to its use case's limit, stripped of EXIF and
+re-encoded.
+"""
+import base64
+import hashlib
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+
+# Longest side (in pixels) of each generated variant
+IMAGE_VARIANTS = {
+    'thumbnail': 320,
+    'medium': 800,
+    'full': 1600,
+}
+
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+
+# JPEG copy of one variant, stored next to the WebP ones under this key for
+# clients that cannot decode WebP
+FALLBACK_KEY = 'fallback'
+FALLBACK_VARIANT = 'medium'
+
+# Low-quality placeholder (LQIP): a tiny image inlined as a data URI next to
+# the variant URLs, under this key, for the app to show (blurred) while the
+# thumbnail loads. It is not a stored file.
+PLACEHOLDER_KEY = 'placeholder'
+PLACEHOLDER_SIZE = 16
+PLACEHOLDER_QUALITY = 40
+
+# Normalization per use case: longest side, output format (None = WebP when
+# available) and quality (None = the format's default above). Receipts stay
+# JPEG with a higher quality so their text remains legible for verification.
+IMAGE_PROFILES = {
+    'product': {'max_side': IMAGE_VARIANTS['full'], 'format': None, 'quality': None},
+    'logo': {'max_side': 512, 'format': None, 'quality': None},
+    'receipt': {'max_side': 2000, 'format': 'JPEG', 'quality': 90},
+}
+
+CONTENT_TYPES = {
+    'WEBP': ('.webp', 'image/webp'),
+    'JPEG': ('.jpg', 'image/jpeg'),
+}
+
+
+class InvalidImageError(ValueError):
+    """Raised when an uploaded file cannot be decoded as an image."""
+
+
+def get_output_format():
+    """
+    Return (pillow_format, extension, content_type) for generated variants.
+
+    WebP is preferred; JPEG is used when Pillow was built without WebP support.
+    """
+    pillow_format = 'WEBP' if features.check('webp') else 'JPEG'
+    return (pillow_format, *CONTENT_TYPES[pillow_format])
+
+
+def hash_file(image_file):
+    """Compute the SHA-256 hex digest of an uploaded file, chunk by chunk."""
+    digest = hashlib.sha256()
+    image_file.seek(0)
+    for chunk in image_file.chunks():
+        digest.update(chunk)
+    image_file.seek(0)
+    return digest.hexdigest()
+
+
+def _open_image(image_file, max_side=None):
+    """
+    Decode an uploaded file, applying its EXIF orientation.
+
+    When ``max_side`` is given, JPEGs are decoded in draft mode: libjpeg
+    scales the image down by 1/2, 1/4 or 1/8 while decoding. The result
+    is never smaller than ``max_side``, and decoding a 12 MP phone photo
+    gets several times cheaper.
+    """
+    try:
+        image_file.seek(0)
+        image = Image.open(image_file)
+        if max_side and max(image.size) > max_side:
+            scale = max_side / max(image.size)
+            image.draft(None, (int(image.width * scale) + 1, int(image.height * scale) + 1))
+        image.load()
+    except (UnidentifiedImageError, OSError) as e:
+        raise InvalidImageError('El archivo no es una imagen válida') from e
+
+    image = ImageOps.exif_transpose(image)
+    return image
+
+
+def _encode(image, pillow_format, quality=None):
+    """
+    Encode a PIL image into bytes using the tuned settings for the format.
+
+    EXIF/XMP metadata is never written (Pillow only writes what is passed
+    in); the ICC profile is kept so colors render the same.
+    """
+    if pillow_format == 'JPEG':
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        options = {'quality': quality or JPEG_QUALITY, 'optimize': True, 'progressive': True}
+    else:
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        options = {'quality': quality or WEBP_QUALITY, 'method': 4}
+
+    icc_profile = image.info.get('icc_profile')
+    if icc_profile:
+        options['icc_profile'] = icc_profile
+
+    buffer = BytesIO()
+    image.save(buffer, format=pillow_format, **options)
+    return buffer.getvalue()
+
+
+def generate_placeholder(image):
+    """
+    Build the LQIP data URI of a decoded image (a few hundred bytes).
+
+    Args:
+        image: PIL image, ideally already reduced (e.g. the thumbnail)
+
+    Returns:
+        str: ``data:image/...;base64,...``
+    """
+    pillow_format, _extension, content_type = get_output_format()
+    tiny = image.copy()
+    tiny.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), Image.BILINEAR)
+    if tiny.mode not in ('RGB', 'L'):
+        tiny = tiny.convert('RGB')
+    tiny.info.pop('icc_profile', None)
+    data = _encode(tiny, pillow_format, PLACEHOLDER_QUALITY)
+    return f'data:{content_type};base64,{base64.b64encode(data).decode()}'
+
+
+def placeholder_from_file(image_file):
+    """Build the LQIP data URI of an image file (see generate_placeholder)."""
+    return generate_placeholder(_open_image(image_file, PLACEHOLDER_SIZE * 8))
+
+
+def normalize_image(image_file, profile='product'):
+    """
+    Downscale, strip metadata and re-encode an uploaded image.
+
+    Args:
+        image_file: Django UploadedFile (or any file-like object)
+        profile (str): key of IMAGE_PROFILES
+
+    Returns:
+        ContentFile: named after the original file with the new extension,
+        with a ``content_type`` attribute for the storage backend.
+
+    Raises:
+        InvalidImageError: if the file is not a readable image
+    """
+    options = IMAGE_PROFILES[profile]
+    max_side = options['max_side']
+    if options['format']:
+        pillow_format = options['format']
+        extension, content_type = CONTENT_TYPES[pillow_format]
+    else:
+        pillow_format, extension, content_type = get_output_format()
+
+    image = _open_image(image_file, max_side)
+    if max(image.size) > max_side:
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+    root = os.path.splitext(os.path.basename(getattr(image_file, 'name', None) or 'image'))[0]
+    normalized = ContentFile(_encode(image, pillow_format, options['quality']), name=f'{root}{extension}')
+    normalized.content_type = content_type
+    return normalized
+
+
+def generate_variants(image_file):
+    """
+    Generate the resized variants for an uploaded image.
+
+    Args:
+        image_file: Django UploadedFile (or any file-like object)
+
+    When the variants are WebP, a JPEG copy of FALLBACK_VARIANT is added
+    under FALLBACK_KEY.
+
+    Returns:
+        tuple: (extension, {variant_name: ContentFile}, placeholder) where
+        each ContentFile is named ``<variant_name><extension>`` and carries
+        a ``content_type`` attribute for the storage backend, and
+        placeholder is the LQIP data URI.
+
+    Raises:
+        InvalidImageError: if the file is not a readable image
+    """
+    pillow_format, extension, content_type = get_output_format()
+    source = _open_image(image_file, max(IMAGE_VARIANTS.values()))
+
+    variants = {}
+    # Largest first, so every smaller variant is resized from an already
+    # reduced image instead of the full original.
+    current = source
+    for name, max_side in sorted(IMAGE_VARIANTS.items(), key=lambda item: -item[1]):
+        if max(current.size) > max_side:
+            current = current.copy()
+            current.thumbnail((max_side, max_side), Image.LANCZOS)
+
+        variant = ContentFile(_encode(current, pillow_format), name=f'{name}{extension}')
+        variant.content_type = content_type
+        variants[name] = variant
+
+        if name == FALLBACK_VARIANT and pillow_format != 'JPEG':
+            fallback_extension, fallback_content_type = CONTENT_TYPES['JPEG']
+            fallback = ContentFile(_encode(current, 'JPEG'), name=f'{FALLBACK_KEY}{fallback_extension}')
+            fallback.content_type = fallback_content_type
+            variants[FALLBACK_KEY] = fallback
+
+    # Built from the smallest variant, which is the last one resized
+    return extension, variants, generate_placeholder(current)
@@ -0,0 +1,120 @@
+"""
+Compute LQIP placeholders for product images stored before they existed.
+"""
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from products.images import PLACEHOLDER_KEY, placeholder_from_file
+from products.models import ImageBlob, Product
+from products.storage_backends import storage_path_from_url
+
+
+class Command(BaseCommand):
+    help = 'Genera los placeholders (LQIP) de las imágenes de productos que no los tienen'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Productos leídos por consulta (default: 100)'
+        )
+
+    def handle(self, *args, **options):
+        self.failed = 0
+        blobs = self.backfill_blobs()
+        products = self.backfill_products(options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {blobs} imágenes almacenadas y {products} productos actualizados"
+        ))
+        if self.failed:
+            self.stderr.write(self.style.WARNING(f"⚠️  {self.failed} imágenes no se pudieron procesar"))
+
+    def compute(self, url):
+        """Download the image behind a stored URL and build its placeholder."""
+        path = storage_path_from_url(url)
+        if not path:
+            return None
+        try:
+            with default_storage.open(path) as image_file:
+                return placeholder_from_file(image_file)
+        except Exception as e:
+            self.failed += 1
+            self.stderr.write(f"  ✗ {path}: {e}")
+            return None
+
+    def backfill_blobs(self):
+        """Add the placeholder to every ImageBlob without one (from its thumbnail)."""
+        updated = 0
+        for blob in ImageBlob.objects.iterator():
+            if PLACEHOLDER_KEY in blob.variants:
+                continue
+            placeholder = self.compute(blob.variants.get('thumbnail') or blob.variants.get('full'))
+            if placeholder:
+                # Variants are only written when the blob is created, no lock needed
+                ImageBlob.objects.filter(pk=blob.pk).update(
+                    variants={**blob.variants, PLACEHOLDER_KEY: placeholder}
+                )
+                updated += 1
+        return updated
+
+    def backfill_products(self, batch_size):
+        """
+        Add placeholders to the image_variants of every product image.
+
+        Blob images copy the blob's placeholder; images uploaded before
+        variants existed are downloaded and processed. Images are processed
+        without holding locks; each product is then locked only to merge the
+        new placeholders into its current image_variants.
+        """
+        blob_placeholders = {}
+        updated = 0
+        products = Product.objects.exclude(images=[]).only('id', 'images', 'image_variants')
+        for product in products.iterator(chunk_size=batch_size):
+            placeholders = {}
+            for url in product.images or []:
+                variants = (product.image_variants or {}).get(url) or {}
+                if PLACEHOLDER_KEY in variants:
+                    continue
+
+                sha256 = ImageBlob.hash_from_url(url)
+                if sha256:
+                    if sha256 not in blob_placeholders:
+                        blob = ImageBlob.objects.filter(pk=sha256).values_list('variants', flat=True).first()
+                        blob_placeholders[sha256] = (blob or {}).get(PLACEHOLDER_KEY)
+                    placeholder = blob_placeholders[sha256]
+                else:
+                    placeholder = self.compute(variants.get('thumbnail') or url)
+
+                if placeholder:
+                    placeholders[url] = placeholder
+
+            if placeholders and self.merge(product.pk, placeholders):
+                updated += 1
+        return updated
+
+    def merge(self, product_id, placeholders):
+        """Write placeholders into the product's current image_variants."""
+        with transaction.atomic():
+            product = (
+                Product.objects.select_for_update()
+                .only('id', 'images', 'image_variants')
+                .filter(pk=product_id)
+                .first()
+            )
+            if product is None:
+                return False
+
+            image_variants = dict(product.image_variants or {})
+            changed = False
+            for url, placeholder in placeholders.items():
+                # The image may have been removed meanwhile
+                if url in (product.images or []):
+                    image_variants[url] = {**(image_variants.get(url) or {}), PLACEHOLDER_KEY: placeholder}
+                    changed = True
+            if changed:
+                product.image_variants = image_variants
+                product.save(update_fields=['image_variants'])
+            return changed
@@ -0,0 +1,34 @@
+"""
+Delete expired stock reservations in batches.
+"""
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from products.models import StockReservation
+
+
+class Command(BaseCommand):
+    help = 'Elimina las reservas de stock expiradas, en lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Reservas eliminadas por consulta (default: 1000)'
+        )
+
+    def handle(self, *args, **options):
+        # Expired holds are already ignored when computing available stock;
+        # deleting them only keeps the table small.
+        now = timezone.now()
+        expired = StockReservation.objects.filter(expires_at__lte=now).order_by('expires_at')
+
+        deleted = 0
+        while True:
+            ids = list(expired.values_list('pk', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            deleted += StockReservation.objects.filter(pk__in=ids).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(f"✓ {deleted} reservas expiradas eliminadas"))
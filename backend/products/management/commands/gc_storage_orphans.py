@@ -0,0 +1,146 @@
+"""
+Delete files in storage that no database row references anymore.
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from orders.models import Order
+from payments.models import PaymentReceipt
+from products.models import ImageBlob, PendingStorageDeletion, Product, ProductImage
+from products.storage_backends import delete_files, iter_files, storage_path_from_url
+from users.models import SellerProfile
+
+
+# Folders written by the app; anything else in the bucket is left alone
+MANAGED_PREFIXES = ('products', 'seller_logos', 'payment_proofs', 'receipts')
+
+# (model, field) pairs whose value is a storage name
+FILE_FIELDS = (
+    (ProductImage, 'image'),
+    (SellerProfile, 'logo'),
+    (Order, 'payment_proof'),
+    (PaymentReceipt, 'receipt_image'),
+)
+
+ITERATOR_CHUNK_SIZE = 2000
+
+
+class Command(BaseCommand):
+    help = 'Elimina del storage los archivos huérfanos (sin referencia en la base de datos)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours',
+            type=float,
+            default=24,
+            help='Solo eliminar archivos modificados hace más de estas horas (default: 24)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Archivos por llamada de eliminación (default: 100)'
+        )
+        parser.add_argument(
+            '--prefix',
+            action='append',
+            dest='prefixes',
+            help=f"Carpeta a revisar, se puede repetir (default: {', '.join(MANAGED_PREFIXES)})"
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Solo reportar los huérfanos, sin eliminar nada'
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        batch_size = options['batch_size']
+        cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+
+        # The index is built before listing: a file uploaded after this point
+        # is newer than the cutoff, so it is never mistaken for an orphan.
+        referenced = self.build_reference_index()
+        self.stdout.write(f"📇 {len(referenced)} archivos referenciados en la base de datos")
+
+        scanned = orphan_bytes = recent = 0
+        orphans = []
+        for prefix in options['prefixes'] or MANAGED_PREFIXES:
+            for name, size, modified in iter_files(prefix):
+                scanned += 1
+                if name in referenced:
+                    continue
+                if modified is None or modified > cutoff:
+                    recent += 1
+                    continue
+
+                orphans.append(name)
+                orphan_bytes += size
+                if options['verbosity'] > 1:
+                    self.stdout.write(f"  {name} ({size} bytes)")
+
+        # Deleting while the listing is paginated would shift its pages, so
+        # orphans are removed once the scan is complete.
+        deleted = 0
+        if not dry_run:
+            for start in range(0, len(orphans), batch_size):
+                deleted += self.delete_batch(orphans[start:start + batch_size])
+
+        self.stdout.write(
+            f"🔍 {scanned} archivos revisados, {len(orphans)} huérfanos "
+            f"({orphan_bytes / (1024 * 1024):.1f} MB), "
+            f"{recent} huérfanos dentro del periodo de gracia"
+        )
+        if dry_run:
+            self.stdout.write(self.style.WARNING('Modo --dry-run: no se eliminó nada'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"✓ {deleted} archivos huérfanos eliminados"))
+
+    def build_reference_index(self):
+        """
+        Collect the storage names of every file referenced by the database.
+
+        Only storage paths (short strings) are kept in the set; rows are
+        streamed with ``iterator()`` so no model instances are built.
+        """
+        referenced = set()
+
+        def add_url(url):
+            path = storage_path_from_url(url)
+            if path:
+                referenced.add(path)
+
+        products = Product.objects.values_list('images', 'image_variants')
+        for images, image_variants in products.iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+            for url in images or []:
+                add_url(url)
+            for variants in (image_variants or {}).values():
+                for url in variants.values():
+                    add_url(url)
+
+        blobs = ImageBlob.objects.values_list('variants', flat=True)
+        for variants in blobs.iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+            for url in variants.values():
+                add_url(url)
+
+        for model, field in FILE_FIELDS:
+            names = model.objects.exclude(**{field: ''}).values_list(field, flat=True)
+            referenced.update(name for name in names.iterator(chunk_size=ITERATOR_CHUNK_SIZE) if name)
+
+        # Already queued for deletion by process_storage_deletions
+        queued = PendingStorageDeletion.objects.values_list('path', flat=True)
+        referenced.update(queued.iterator(chunk_size=ITERATOR_CHUNK_SIZE))
+
+        return referenced
+
+    def delete_batch(self, names):
+        """Delete a batch, queueing it for retry if the call fails."""
+        try:
+            delete_files(names)
+        except Exception as e:
+            self.stderr.write(self.style.ERROR(f"✗ Error eliminando {len(names)} archivos, encolados: {e}"))
+            PendingStorageDeletion.enqueue(names)
+            return 0
+        return len(names)
@@ -0,0 +1,102 @@
+"""
+Delete queued storage files in batches.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from products.models import ImageBlob, PendingStorageDeletion
+from products.storage_backends import delete_files
+
+
+class Command(BaseCommand):
+    help = 'Elimina del storage los archivos encolados, en lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Archivos por llamada de eliminación (default: 100)'
+        )
+        parser.add_argument(
+            '--max-attempts',
+            type=int,
+            default=5,
+            help='Intentos antes de dejar un archivo en la cola para revisión (default: 5)'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Seguir procesando la cola indefinidamente (modo worker)'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=10,
+            help='Segundos de espera cuando la cola está vacía en modo --loop (default: 10)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            deleted = self.drain(options['batch_size'], options['max_attempts'])
+            if deleted:
+                self.stdout.write(self.style.SUCCESS(f"✓ {deleted} archivos eliminados del storage"))
+
+            if not options['loop']:
+                break
+            if not deleted:
+                time.sleep(options['interval'])
+
+    def drain(self, batch_size, max_attempts):
+        """Process batches until the queue is empty or a batch fails."""
+        total = 0
+        while True:
+            deleted = self.process_batch(batch_size, max_attempts)
+            if not deleted:
+                return total
+            total += deleted
+
+    def process_batch(self, batch_size, max_attempts):
+        """
+        Delete one batch of queued files and return how many queue entries
+        were handled.
+
+        Rows are locked with SKIP LOCKED so several workers can drain the
+        queue at the same time without deleting the same files. Files that
+        an image blob uses again (the same image was uploaded after it was
+        released) are dropped from the queue instead of deleted.
+        """
+        with transaction.atomic():
+            batch = list(
+                PendingStorageDeletion.objects
+                .select_for_update(skip_locked=True)
+                .filter(attempts__lt=max_attempts)
+                .order_by('attempts', 'created_at')[:batch_size]
+            )
+            if not batch:
+                return 0
+
+            in_use = ImageBlob.paths_in_use(item.path for item in batch)
+            if in_use:
+                PendingStorageDeletion.objects.filter(pk__in=[item.pk for item in batch if item.path in in_use]).delete()
+                self.stdout.write(f"ℹ️  {len(in_use)} archivos en uso de nuevo, quitados de la cola")
+                batch = [item for item in batch if item.path not in in_use]
+                if not batch:
+                    return len(in_use)
+
+            ids = [item.pk for item in batch]
+            try:
+                delete_files(item.path for item in batch)
+            except Exception as e:
+                PendingStorageDeletion.objects.filter(pk__in=ids).update(
+                    attempts=F('attempts') + 1,
+                    last_error=str(e)[:1000]
+                )
+                self.stderr.write(self.style.ERROR(f"✗ Error eliminando {len(ids)} archivos: {e}"))
+                return 0
+
+            PendingStorageDeletion.objects.filter(pk__in=ids).delete()
+            return len(ids) + len(in_use)
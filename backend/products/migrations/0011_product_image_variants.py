@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-19 16:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0010_remove_product_location"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="image_variants",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                help_text="URLs de variantes (thumbnail, medium, full) indexadas por URL de imagen",
+                verbose_name="variantes de imágenes",
+            ),
+        ),
+    ]
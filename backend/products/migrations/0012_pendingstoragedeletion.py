@@ -0,0 +1,53 @@
+# Generated by Django 5.0.1 on 2026-10-19 16:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0011_product_image_variants"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PendingStorageDeletion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "path",
+                    models.CharField(max_length=500, unique=True, verbose_name="ruta"),
+                ),
+                ("attempts", models.IntegerField(default=0, verbose_name="intentos")),
+                (
+                    "last_error",
+                    models.TextField(blank=True, verbose_name="último error"),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="fecha de creación"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "eliminación pendiente",
+                "verbose_name_plural": "eliminaciones pendientes",
+                "ordering": ["created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["attempts", "created_at"],
+                        name="products_pe_attempt_e2b1b7_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.0.1 on 2026-10-19 16:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0012_pendingstoragedeletion"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImageBlob",
+            fields=[
+                (
+                    "sha256",
+                    models.CharField(
+                        max_length=64,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="hash SHA-256",
+                    ),
+                ),
+                (
+                    "variants",
+                    models.JSONField(
+                        default=dict,
+                        help_text="URLs de variantes (thumbnail, medium, full)",
+                        verbose_name="variantes",
+                    ),
+                ),
+                (
+                    "ref_count",
+                    models.IntegerField(default=0, verbose_name="referencias"),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="fecha de creación"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "imagen almacenada",
+                "verbose_name_plural": "imágenes almacenadas",
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.1 on 2026-10-19 16:16
+
+import mercatico.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0013_imageblob"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="productimage",
+            name="image",
+            field=mercatico.fields.NormalizedImageField(
+                upload_to="products/", verbose_name="imagen"
+            ),
+        ),
+    ]
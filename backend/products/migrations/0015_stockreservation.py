@@ -0,0 +1,85 @@
+# Generated by Django 5.0.1 on 2026-10-19 16:39
+
+import django.core.validators
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0014_alter_productimage_image"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StockReservation",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                (
+                    "quantity",
+                    models.IntegerField(
+                        validators=[django.core.validators.MinValueValidator(1)],
+                        verbose_name="cantidad",
+                    ),
+                ),
+                (
+                    "expires_at",
+                    models.DateTimeField(verbose_name="fecha de expiración"),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="fecha de creación"
+                    ),
+                ),
+                (
+                    "buyer",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stock_reservations",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="reservations",
+                        to="products.product",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "reserva de stock",
+                "verbose_name_plural": "reservas de stock",
+                "ordering": ["expires_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["product", "expires_at"],
+                        name="products_st_product_db2e26_idx",
+                    ),
+                    models.Index(
+                        fields=["expires_at"], name="products_st_expires_817182_idx"
+                    ),
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="stockreservation",
+            constraint=models.UniqueConstraint(
+                fields=("buyer", "product"), name="unique_reservation_per_buyer_product"
+            ),
+        ),
+    ]
@@ -1,9 +1,13 @@
 """
 Product models for MercaTico.
 """
+import re
 import uuid
-from django.db import models
+from collections import Counter
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
+from mercatico.fields import NormalizedImageField
+from products.images import PLACEHOLDER_KEY
 from users.models import User
 
 
@@ -117,6 +121,12 @@ class Product(models.Model):
         blank=True,
         help_text='Array de URLs de imágenes (máximo 5)'
     )
+    image_variants = models.JSONField(
+        'variantes de imágenes',
+        default=dict,
+        blank=True,
+        help_text='URLs de variantes (thumbnail, medium, full) indexadas por URL de imagen'
+    )
 
     # Statistics
     views_count = models.IntegerField('vistas', default=0)
@@ -176,6 +186,42 @@ class Product(models.Model):
             return self.images[0]
         return None
 
+    def get_main_thumbnail(self):
+        """Get the thumbnail URL of the main image, falling back to the image itself."""
+        main_image = self.get_main_image()
+        variants = (self.image_variants or {}).get(main_image) if main_image else None
+        if variants and variants.get('thumbnail'):
+            return variants['thumbnail']
+        return main_image
+
+    def get_main_placeholder(self):
+        """Get the LQIP data URI of the main image, if it has one."""
+        main_image = self.get_main_image()
+        variants = (self.image_variants or {}).get(main_image) if main_image else None
+        return (variants or {}).get(PLACEHOLDER_KEY)
+
+    def get_image_files(self, image_url):
+        """Get every stored URL (the image and its variants) for an image."""
+        variants = (self.image_variants or {}).get(image_url) or {}
+        urls = [image_url]
+        urls.extend(
+            url for name, url in variants.items()
+            if url and url != image_url and name != PLACEHOLDER_KEY
+        )
+        return urls
+
+    def get_available_stock(self):
+        """
+        Stock minus the units held by active reservations.
+
+        Lists use the ``available_stock`` annotation from
+        ``products.reservations.annotate_available_stock`` instead.
+        """
+        if hasattr(self, 'available_stock'):
+            return self.available_stock
+        from products.reservations import reserved_quantities
+        return max(0, self.stock - reserved_quantities([self.pk]).get(self.pk, 0))
+
 
 class ProductImage(models.Model):
     """
@@ -188,7 +234,7 @@ class ProductImage(models.Model):
         on_delete=models.CASCADE,
         related_name='product_images'
     )
-    image = models.ImageField('imagen', upload_to='products/')
+    image = NormalizedImageField('imagen', upload_to='products/')
     order = models.IntegerField('orden', default=0)
     created_at = models.DateTimeField('fecha de creación', auto_now_add=True)
 
@@ -199,3 +245,207 @@ class ProductImage(models.Model):
 
     def __str__(self):
         return f"Imagen {self.order} de {self.product.name}"
+
+
+class StockReservation(models.Model):
+    """
+    Temporary hold of product units for a buyer (cart or checkout).
+
+    Held units are not available to other buyers until the hold expires or
+    is converted into order items at checkout. Expired holds are ignored
+    everywhere; the expire_stock_reservations command only deletes them.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    buyer = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='stock_reservations'
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='reservations'
+    )
+    quantity = models.IntegerField(
+        'cantidad',
+        validators=[MinValueValidator(1)]
+    )
+    expires_at = models.DateTimeField('fecha de expiración')
+    created_at = models.DateTimeField('fecha de creación', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'reserva de stock'
+        verbose_name_plural = 'reservas de stock'
+        ordering = ['expires_at']
+        constraints = [
+            models.UniqueConstraint(fields=['buyer', 'product'], name='unique_reservation_per_buyer_product'),
+        ]
+        indexes = [
+            # Active holds per product (available stock)
+            models.Index(fields=['product', 'expires_at']),
+            # Expiry sweep
+            models.Index(fields=['expires_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity}x {self.product_id} - {self.buyer_id}"
+
+
+class PendingStorageDeletion(models.Model):
+    """
+    Storage files waiting to be deleted.
+
+    Requests only enqueue paths here; the process_storage_deletions command
+    removes them from storage in batches.
+    """
+    path = models.CharField('ruta', max_length=500, unique=True)
+    attempts = models.IntegerField('intentos', default=0)
+    last_error = models.TextField('último error', blank=True)
+    created_at = models.DateTimeField('fecha de creación', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'eliminación pendiente'
+        verbose_name_plural = 'eliminaciones pendientes'
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['attempts', 'created_at']),
+        ]
+
+    def __str__(self):
+        return self.path
+
+    @classmethod
+    def enqueue(cls, paths):
+        """Queue storage paths for deletion (duplicates are ignored)."""
+        paths = {path for path in paths if path}
+        cls.objects.bulk_create(
+            [cls(path=path) for path in paths],
+            ignore_conflicts=True
+        )
+        return len(paths)
+
+    @classmethod
+    def enqueue_urls(cls, urls):
+        """Queue the files behind stored URLs for deletion."""
+        from products.storage_backends import storage_path_from_url
+        return cls.enqueue(storage_path_from_url(url) for url in urls)
+
+
+class ImageBlob(models.Model):
+    """
+    Content-addressed product image, shared by every product that uses it.
+
+    Files are stored under a key derived from the SHA-256 of the original
+    upload, so identical photos are stored once. ``ref_count`` tracks how
+    many product image slots point at the blob; its files are only queued
+    for deletion when the last reference is released. ``variants`` also
+    holds the inline LQIP placeholder, which is not a file.
+    """
+    HASH_URL_PATTERN = re.compile(r'/blobs/[0-9a-f]{2}/([0-9a-f]{64})_')
+
+    sha256 = models.CharField('hash SHA-256', max_length=64, primary_key=True)
+    variants = models.JSONField(
+        'variantes',
+        default=dict,
+        help_text='URLs de variantes (thumbnail, medium, full)'
+    )
+    ref_count = models.IntegerField('referencias', default=0)
+    created_at = models.DateTimeField('fecha de creación', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'imagen almacenada'
+        verbose_name_plural = 'imágenes almacenadas'
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.ref_count} referencias)"
+
+    def files(self):
+        """URLs of the blob's stored files (the placeholder is inline)."""
+        return [url for name, url in self.variants.items() if name != PLACEHOLDER_KEY]
+
+    @staticmethod
+    def storage_prefix(sha256):
+        """Storage path prefix for a blob's variant files."""
+        return f'products/blobs/{sha256[:2]}/{sha256}'
+
+    @classmethod
+    def hash_from_url(cls, url):
+        """Get the blob hash of a stored image URL, or None for legacy URLs."""
+        match = cls.HASH_URL_PATTERN.search(url or '')
+        return match.group(1) if match else None
+
+    @classmethod
+    def paths_in_use(cls, paths):
+        """
+        Get the storage paths, among ``paths``, that are files of an existing blob.
+
+        Blob paths come from the content hash, so a released image that is
+        uploaded again reuses the paths still queued for deletion.
+        """
+        from products.storage_backends import storage_path_from_url
+
+        paths = set(paths)
+        hashes = {cls.hash_from_url(path) for path in paths} - {None}
+        if not hashes:
+            return set()
+
+        in_use = set()
+        for blob in cls.objects.filter(pk__in=hashes):
+            in_use.update(storage_path_from_url(url) for url in blob.files())
+        return in_use & paths
+
+    @classmethod
+    def acquire(cls, counts):
+        """
+        Add references to existing blobs. Must run inside a transaction.
+
+        Args:
+            counts (dict): {sha256: number of new references}
+
+        Returns:
+            dict: {sha256: variants}
+
+        Raises:
+            ImageBlob.DoesNotExist: if a blob was released concurrently
+        """
+        blobs = cls.objects.select_for_update().in_bulk(list(counts))
+        missing = set(counts) - set(blobs)
+        if missing:
+            raise cls.DoesNotExist(f"Blobs no encontrados: {', '.join(sorted(missing))}")
+
+        for sha256, count in counts.items():
+            blob = blobs[sha256]
+            blob.ref_count += count
+            blob.save(update_fields=['ref_count'])
+
+        return {sha256: blob.variants for sha256, blob in blobs.items()}
+
+    @classmethod
+    def release(cls, product, image_urls):
+        """
+        Drop one reference per image URL removed from a product.
+
+        Blobs left without references are deleted and their files queued for
+        deletion; images uploaded before deduplication are queued directly.
+        """
+        counts = Counter()
+        files = []
+        for image_url in image_urls:
+            sha256 = cls.hash_from_url(image_url)
+            if sha256:
+                counts[sha256] += 1
+            else:
+                files.extend(product.get_image_files(image_url))
+
+        with transaction.atomic():
+            unreferenced = []
+            for blob in cls.objects.select_for_update().filter(pk__in=list(counts)):
+                blob.ref_count -= counts[blob.pk]
+                if blob.ref_count <= 0:
+                    unreferenced.append(blob.pk)
+                    files.extend(blob.files())
+                else:
+                    blob.save(update_fields=['ref_count'])
+
+            cls.objects.filter(pk__in=unreferenced).delete()
+            PendingStorageDeletion.enqueue_urls(files)
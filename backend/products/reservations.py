@@ -0,0 +1,111 @@
+"""
+TTL stock reservations.
+
+A buyer holds units of a product (``StockReservation``) for
+STOCK_RESERVATION_MINUTES; while the hold is active the units are not
+available to anyone else. Availability is always computed against
+unexpired holds, so correctness never depends on when expired rows are
+deleted (see the expire_stock_reservations command).
+
+- ``annotate_available_stock``: ``available_stock = stock - active holds``
+  as one correlated subquery (index on product, expires_at), for lists
+- ``reserve`` / ``release``: create, update or drop a buyer's hold
+- ``reserved_quantities``: units held by other buyers, used by checkout,
+  which then converts the buyer's own holds with ``consume_reservations``
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from products.models import Product, StockReservation
+
+
+class ReservationError(Exception):
+    """The requested units cannot be reserved."""
+
+
+def reservation_ttl():
+    return timedelta(minutes=getattr(settings, 'STOCK_RESERVATION_MINUTES', 15))
+
+
+def active_reservations(now=None):
+    return StockReservation.objects.filter(expires_at__gt=now or timezone.now())
+
+
+def reserved_subquery(exclude_buyer=None, product_ref='pk'):
+    """Units held by active reservations of ``OuterRef(product_ref)``."""
+    reservations = active_reservations().filter(product=OuterRef(product_ref))
+    if exclude_buyer is not None:
+        reservations = reservations.exclude(buyer=exclude_buyer)
+    held = reservations.order_by().values('product').annotate(held=Sum('quantity')).values('held')
+    return Coalesce(Subquery(held, output_field=IntegerField()), Value(0))
+
+
+def annotate_available_stock(queryset, exclude_buyer=None):
+    """Annotate products with ``available_stock`` (never negative)."""
+    return queryset.annotate(
+        available_stock=Greatest(F('stock') - reserved_subquery(exclude_buyer), Value(0))
+    )
+
+
+def reserved_quantities(product_ids, exclude_buyer=None):
+    """
+    Units held by active reservations, per product (one query).
+
+    Returns:
+        dict: product_id -> held units (products without holds are omitted)
+    """
+    reservations = active_reservations().filter(product_id__in=product_ids)
+    if exclude_buyer is not None:
+        reservations = reservations.exclude(buyer=exclude_buyer)
+    return dict(
+        reservations.order_by().values('product_id').annotate(held=Sum('quantity')).values_list('product_id', 'held')
+    )
+
+
+def reserve(buyer, product_id, quantity):
+    """
+    Hold ``quantity`` units of a product for the buyer, replacing any
+    previous hold of the same product and restarting its expiry.
+
+    The product row is locked while the other holds are counted, so two
+    buyers can never hold the same last unit.
+
+    Returns:
+        StockReservation
+
+    Raises:
+        Product.DoesNotExist: if the product does not exist
+        ReservationError: if the product is unavailable or there are not
+            enough free units
+    """
+    with transaction.atomic():
+        product = Product.objects.select_for_update().only('id', 'stock', 'is_available').get(pk=product_id)
+        if not product.is_available:
+            raise ReservationError('El producto no está disponible')
+
+        free = product.stock - reserved_quantities([product.pk], exclude_buyer=buyer).get(product.pk, 0)
+        if quantity > free:
+            raise ReservationError(f'Stock insuficiente. Disponible: {max(0, free)}')
+
+        reservation, _created = StockReservation.objects.update_or_create(
+            buyer=buyer,
+            product=product,
+            defaults={'quantity': quantity, 'expires_at': timezone.now() + reservation_ttl()},
+        )
+        return reservation
+
+
+def release(buyer, product_id):
+    """Drop the buyer's hold on a product. Returns True if there was one."""
+    deleted, _ = StockReservation.objects.filter(buyer=buyer, product_id=product_id).delete()
+    return bool(deleted)
+
+
+def consume_reservations(buyer, product_ids):
+    """Delete the buyer's holds on products that were just ordered."""
+    return StockReservation.objects.filter(buyer=buyer, product_id__in=product_ids).delete()[0]
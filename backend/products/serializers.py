@@ -2,7 +2,7 @@
 Serializers for Products app.
 """
 from rest_framework import serializers
-from products.models import Category, Product, ProductImage
+from products.models import Category, Product, ProductImage, StockReservation
 from users.serializers import PublicSellerProfileSerializer
 
 
@@ -62,6 +62,7 @@ class ProductSerializer(serializers.ModelSerializer):
     seller_id = serializers.UUIDField(source='seller.id', read_only=True)
     main_image = serializers.SerializerMethodField()
     is_in_stock = serializers.BooleanField(read_only=True)
+    available_stock = serializers.IntegerField(source='get_available_stock', read_only=True)
 
     class Meta:
         model = Product
@@ -76,6 +77,7 @@ class ProductSerializer(serializers.ModelSerializer):
             'category_name',
             'price',
             'stock',
+            'available_stock',
             'show_stock',
             'accepts_cash',
             'accepts_sinpe',
@@ -83,6 +85,7 @@ class ProductSerializer(serializers.ModelSerializer):
             'offers_delivery',
             'is_available',
             'images',
+            'image_variants',
             'main_image',
             'is_in_stock',
             'views_count',
@@ -90,7 +93,9 @@ class ProductSerializer(serializers.ModelSerializer):
             'created_at',
             'updated_at',
         ]
-        read_only_fields = ['id', 'seller', 'views_count', 'sales_count', 'created_at', 'updated_at']
+        read_only_fields = [
+            'id', 'seller', 'image_variants', 'views_count', 'sales_count', 'created_at', 'updated_at'
+        ]
 
     def to_internal_value(self, data):
         """Convert category name to UUID before validation."""
@@ -118,10 +123,51 @@ class ProductSerializer(serializers.ModelSerializer):
         return obj.get_main_image()
 
     def validate_images(self, value):
-        """Validate that images array has max 5 items."""
+        """
+        Validate that images array has max 5 items.
+
+        On create, stored images must be image blobs (the view takes a
+        reference to each); external URLs are kept as they are. On update,
+        every image must already be attached to the product: new images are
+        added with upload_images or confirm_uploads, which take a reference
+        to the stored files. URLs are returned as stored, since clients send
+        back the absolute form of relative ones.
+        """
+        from collections import Counter
+        from products.models import ImageBlob
+        from products.storage_backends import storage_path_from_url
+
         if len(value) > 5:
             raise serializers.ValidationError("Máximo 5 imágenes permitidas.")
-        return value
+
+        if self.instance is None:
+            for url in value:
+                # Stored files without a blob have no reference count to share
+                if not ImageBlob.hash_from_url(url) and storage_path_from_url(url):
+                    raise serializers.ValidationError(
+                        "Esta imagen no se puede reutilizar; súbela con upload_images."
+                    )
+            return value
+
+        current = list(self.instance.images or [])
+        stored_by_path = {}
+        for url in current:
+            path = storage_path_from_url(url)
+            if path:
+                stored_by_path[path] = url
+
+        images = []
+        for url in value:
+            stored = url if url in current else stored_by_path.get(storage_path_from_url(url))
+            if stored is None:
+                raise serializers.ValidationError(
+                    "Solo se pueden incluir imágenes del producto; las nuevas se suben con upload_images."
+                )
+            images.append(stored)
+
+        if Counter(images) - Counter(current):
+            raise serializers.ValidationError("No se puede repetir una imagen del producto.")
+        return images
 
     def validate(self, data):
         """Validate that product has at least one payment method."""
@@ -167,6 +213,7 @@ class ProductListSerializer(serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
     seller_name = serializers.CharField(source='seller.seller_profile.business_name', read_only=True)
     main_image = serializers.SerializerMethodField()
+    main_image_placeholder = serializers.SerializerMethodField()
     images = serializers.SerializerMethodField()
     seller_rating = serializers.DecimalField(
         source='seller.seller_profile.rating_avg',
@@ -174,6 +221,7 @@ class ProductListSerializer(serializers.ModelSerializer):
         decimal_places=2,
         read_only=True
     )
+    available_stock = serializers.IntegerField(source='get_available_stock', read_only=True)
 
     class Meta:
         model = Product
@@ -182,26 +230,32 @@ class ProductListSerializer(serializers.ModelSerializer):
             'name',
             'price',
             'main_image',
+            'main_image_placeholder',
             'images',
             'category_name',
             'seller_name',
             'seller_rating',
             'is_available',
             'stock',
+            'available_stock',
             'show_stock',
             'offers_pickup',
             'offers_delivery',
         ]
 
     def get_main_image(self, obj):
-        """Get the main image URL."""
-        main_image = obj.get_main_image()
+        """Get the thumbnail URL of the main image (grid tiles never need more)."""
+        main_image = obj.get_main_thumbnail()
         if main_image and not main_image.startswith('http'):
             request = self.context.get('request')
             if request:
                 return request.build_absolute_uri(main_image)
         return main_image
 
+    def get_main_image_placeholder(self, obj):
+        """Get the inline LQIP of the main image, shown while main_image loads."""
+        return obj.get_main_placeholder()
+
     def get_images(self, obj):
         """Get all image URLs, converting relative to absolute."""
         if not obj.images:
@@ -232,3 +286,15 @@ class ProductDetailSerializer(ProductSerializer):
 
     class Meta(ProductSerializer.Meta):
         fields = ProductSerializer.Meta.fields + ['seller_info']
+
+
+class StockReservationSerializer(serializers.ModelSerializer):
+    """Serializer for a buyer's stock reservations."""
+
+    product_name = serializers.CharField(source='product.name', read_only=True)
+    quantity = serializers.IntegerField(min_value=1)
+
+    class Meta:
+        model = StockReservation
+        fields = ['id', 'product', 'product_name', 'quantity', 'expires_at', 'created_at']
+        read_only_fields = ['id', 'product', 'expires_at', 'created_at']
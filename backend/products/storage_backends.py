@@ -1,93 +1,617 @@
 """
 Custom storage backend for Supabase Storage.
 """
-from django.core.files.storage import Storage
-from django.conf import settings
-from supabase import create_client, Client
+import hashlib
+import os
+import random
+import threading
+import time
 import uuid
-from urllib.parse import urljoin
+from tempfile import SpooledTemporaryFile
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+import httpx
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation
+from django.core import signing
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import FileSystemStorage, Storage
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+from storage3 import SyncStorageClient
+from storage3.utils import StorageException, SyncClient
+
+from products.storage_metrics import measure
+
+
+class PooledStorageClient(SyncStorageClient):
+    """
+    Supabase Storage client whose HTTP session keeps connections alive.
+
+    The default client built by ``supabase.create_client`` uses httpx's
+    default limits and is recreated with every storage instance; this one
+    is created once per process and reuses TCP/TLS connections.
+    """
+
+    def __init__(self, url, headers, timeout, limits):
+        self._limits = limits
+        super().__init__(url, headers, timeout)
+
+    def _create_session(self, base_url, headers, timeout, verify=True, proxy=None):
+        return SyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            proxy=proxy,
+            verify=bool(verify),
+            follow_redirects=True,
+            http2=True,
+            limits=self._limits,
+        )
+
+
+def build_storage_client(supabase_url, supabase_key, pool_size=10, timeout=20.0,
+                         connect_timeout=5.0, keepalive_expiry=30.0):
+    """
+    Build a pooled Supabase Storage client.
+
+    Args:
+        supabase_url (str): Project URL (https://<project>.supabase.co)
+        supabase_key (str): Service or anon key
+        pool_size (int): Maximum connections (all of them may be kept alive)
+        timeout (float): Read/write/pool timeout in seconds
+        connect_timeout (float): Connection timeout in seconds
+        keepalive_expiry (float): Seconds an idle connection is kept open
+    """
+    headers = {
+        'apiKey': supabase_key,
+        'Authorization': f'Bearer {supabase_key}',
+    }
+    limits = httpx.Limits(
+        max_connections=pool_size,
+        max_keepalive_connections=pool_size,
+        keepalive_expiry=keepalive_expiry,
+    )
+    return PooledStorageClient(
+        f"{supabase_url.rstrip('/')}/storage/v1",
+        headers,
+        httpx.Timeout(timeout, connect=connect_timeout),
+        limits,
+    )
+
+
+_storage_client = None
+_storage_client_lock = threading.Lock()
+
+
+def get_storage_client():
+    """
+    Get the process-wide Supabase Storage client, creating it on first use.
+
+    Nothing is created at import time, so each gunicorn worker builds its
+    own client (and connection pool) the first time it touches storage.
+    """
+    global _storage_client
+    if _storage_client is None:
+        with _storage_client_lock:
+            if _storage_client is None:
+                _storage_client = build_storage_client(
+                    settings.SUPABASE_URL,
+                    # Usar service key para permisos completos, fallback a key normal
+                    getattr(settings, 'SUPABASE_SERVICE_KEY', None) or settings.SUPABASE_KEY,
+                    pool_size=settings.SUPABASE_STORAGE_POOL_SIZE,
+                    timeout=settings.SUPABASE_STORAGE_TIMEOUT,
+                    connect_timeout=settings.SUPABASE_STORAGE_CONNECT_TIMEOUT,
+                    keepalive_expiry=settings.SUPABASE_STORAGE_KEEPALIVE_EXPIRY,
+                )
+    return _storage_client
+
+
+def _reset_storage_client():
+    """Drop the inherited client in forked children; sockets must not be shared."""
+    global _storage_client, _storage_client_lock
+    _storage_client = None
+    _storage_client_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_storage_client)
+
+
+SUPABASE_OBJECT_PATH = '/storage/v1/object/'
+SUPABASE_PUBLIC_PATH = SUPABASE_OBJECT_PATH + 'public/'
+
+# Kinds of object URLs that point at a stored file
+SUPABASE_OBJECT_ACCESS = ('public', 'sign', 'authenticated')
+
+# Size of each chunk streamed to Supabase Storage on upload
+UPLOAD_CHUNK_SIZE = 256 * 1024
+
+# Entries requested per call when listing a Supabase Storage folder
+LIST_PAGE_SIZE = 1000
+
+# Supabase signed upload URLs are valid for two hours (fixed by the API)
+SIGNED_UPLOAD_URL_EXPIRES_IN = 2 * 60 * 60
+
+# Project URL used by LocalSupabaseStorage when SUPABASE_URL is not set
+# (the address of `supabase start`)
+LOCAL_SUPABASE_URL = 'http://127.0.0.1:54321'
+
+
+def storage_path_from_url(url, bucket=None):
+    """
+    Get the storage path (the name passed to ``Storage.save``) of a stored URL.
+
+    Understands Supabase object URLs (public, signed or authenticated) of
+    ``bucket`` (default: SUPABASE_BUCKET_NAME) and MEDIA_URL-based URLs from
+    FileSystemStorage, absolute or relative. Returns None for anything
+    else, including objects of other buckets.
+
+    >>> storage_path_from_url('https://x.supabase.co/storage/v1/object/public/Productos/products/1/a.webp?')
+    'products/1/a.webp'
+    >>> storage_path_from_url('/media/products/1/a.webp')
+    'products/1/a.webp'
+    >>> storage_path_from_url('http://localhost:8000/media/products/1/a%20b.jpg')
+    'products/1/a b.jpg'
+    >>> storage_path_from_url('https://example.com/a.jpg') is None
+    True
+    """
+    if not url:
+        return None
+
+    path = urlsplit(url).path
+    media_prefix = '/' + settings.MEDIA_URL.strip('/') + '/'
+
+    if SUPABASE_OBJECT_PATH in path:
+        # <public|sign|authenticated>/<bucket>/<path/to/file>
+        access, _, bucket_path = path.split(SUPABASE_OBJECT_PATH, 1)[1].partition('/')
+        url_bucket, _, file_path = bucket_path.partition('/')
+        bucket = bucket or getattr(settings, 'SUPABASE_BUCKET_NAME', 'products')
+        if access not in SUPABASE_OBJECT_ACCESS or unquote(url_bucket) != bucket:
+            return None
+    elif ('/' + path.lstrip('/')).startswith(media_prefix):
+        file_path = ('/' + path.lstrip('/'))[len(media_prefix):]
+    else:
+        return None
+
+    return unquote(file_path) or None
+
+
+def delete_files(names, storage=None):
+    """
+    Delete several files, in one request when the backend supports it.
+
+    Unlike ``Storage.delete`` errors are raised, so callers can retry.
+    """
+    from django.core.files.storage import default_storage
+
+    storage = storage or default_storage
+    names = list(names)
+    if not names:
+        return
+    if hasattr(storage, 'delete_many'):
+        storage.delete_many(names)
+    else:
+        for name in names:
+            storage.delete(name)
+
+
+def iter_files(prefix='', storage=None):
+    """
+    Yield (name, size, modified_time) for every file under ``prefix``.
+
+    Uses the backend's own paginated walker when it has one; otherwise the
+    tree is walked with ``listdir``. The listing is streamed, never built
+    in memory.
+    """
+    from django.core.files.storage import default_storage
+
+    storage = storage or default_storage
+    if hasattr(storage, 'iter_files'):
+        yield from storage.iter_files(prefix)
+        return
+
+    folders = [prefix.strip('/')]
+    while folders:
+        folder = folders.pop()
+        try:
+            dirs, files = storage.listdir(folder)
+        except FileNotFoundError:
+            continue
+        for name in files:
+            path = f"{folder}/{name}" if folder else name
+            yield path, storage.size(path), storage.get_modified_time(path)
+        folders.extend(f"{folder}/{name}" if folder else name for name in dirs)
 
 
 class SupabaseStorage(Storage):
     """
     Custom storage backend para usar Supabase Storage.
 
+    Las URLs públicas se construyen localmente y ``exists``/``size`` usan una
+    caché de metadatos (llenada al guardar, limpiada al eliminar), de modo que
+    los helpers de Django no hacen llamadas de red ocultas.
+
     Configuración en settings.py:
     - SUPABASE_URL
     - SUPABASE_KEY
     - SUPABASE_BUCKET_NAME (default: 'products')
+    - SUPABASE_STORAGE_POOL_SIZE / SUPABASE_STORAGE_TIMEOUT /
+      SUPABASE_STORAGE_CONNECT_TIMEOUT / SUPABASE_STORAGE_KEEPALIVE_EXPIRY
+    - SUPABASE_STORAGE_METADATA_TTL (segundos, default: 300)
     """
 
     def __init__(self):
         self.supabase_url = settings.SUPABASE_URL
-        # Usar service key para permisos completos, fallback a key normal
-        self.supabase_key = getattr(settings, 'SUPABASE_SERVICE_KEY', None) or settings.SUPABASE_KEY
         self.bucket_name = getattr(settings, 'SUPABASE_BUCKET_NAME', 'products')
-        print(f"🔑 Using Supabase key: {'service_role' if settings.SUPABASE_SERVICE_KEY else 'anon'}")
-        self.client: Client = create_client(self.supabase_url, self.supabase_key)
+        self.public_base_url = (
+            f"{self.supabase_url.rstrip('/')}{SUPABASE_PUBLIC_PATH}{quote(self.bucket_name)}/"
+        )
+        self.metadata_ttl = getattr(settings, 'SUPABASE_STORAGE_METADATA_TTL', 300)
+
+    @property
+    def bucket(self):
+        """File API for the configured bucket, backed by the shared client."""
+        return get_storage_client().from_(self.bucket_name)
+
+    def _metadata_key(self, name):
+        digest = hashlib.md5(f'{self.bucket_name}/{name}'.encode()).hexdigest()
+        return f'storage-meta:{digest}'
+
+    def get_metadata(self, name, refresh=False):
+        """
+        Obtener {'exists', 'size'} de un archivo.
+
+        Primero se consulta la caché (salvo con ``refresh``); si no está, se
+        hace una sola búsqueda en la carpeta del archivo y el resultado
+        (incluso si no existe) se guarda por SUPABASE_STORAGE_METADATA_TTL
+        segundos.
+        """
+        key = self._metadata_key(name)
+        metadata = None if refresh else cache.get(key)
+        if metadata is not None:
+            return metadata
+
+        with measure('metadata', name):
+            metadata = self._fetch_metadata(name)
+        cache.set(key, metadata, self.metadata_ttl)
+        return metadata
+
+    def _fetch_metadata(self, name):
+        """Buscar el archivo en su carpeta (una llamada a la API)."""
+        folder, _, filename = name.rpartition('/')
+        entries = self.bucket.list(folder, {'search': filename, 'limit': 100})
+        entry = next((entry for entry in entries if entry.get('name') == filename), None)
+        if entry is None:
+            return {'exists': False, 'size': 0}
+        return {'exists': True, 'size': (entry.get('metadata') or {}).get('size') or 0}
+
+    def get_available_name(self, name, max_length=None):
+        """
+        Obtener un nombre libre sin consultar exists() en la red.
+
+        Las claves derivadas del contenido (``/blobs/``) se usan tal cual:
+        sobrescribir un archivo con el mismo contenido es inofensivo. Cualquier
+        otro nombre (p. ej. el nombre original de un comprobante) recibe un
+        sufijo aleatorio para que dos subidas nunca se pisen.
+        """
+        name = str(name).replace('\\', '/')
+        if '/blobs/' not in name:
+            dir_name, file_name = os.path.split(name)
+            file_root, file_ext = os.path.splitext(file_name)
+            name = os.path.join(dir_name, self.get_alternative_name(file_root, file_ext))
+        if max_length is not None and len(name) > max_length:
+            raise SuspiciousFileOperation(
+                f'Storage can not find an available filename for "{name}". '
+                'Please make sure that the corresponding file field '
+                'allows sufficient "max_length".'
+            )
+        return name
 
     def _save(self, name, content):
         """
         Guardar archivo en Supabase Storage.
+
+        El contenido se envía por partes (chunks) directamente desde el
+        UploadedFile de Django (archivo temporal o memoria), sin leer el
+        archivo completo en memoria.
         """
         # Generar nombre único si es necesario
         if not name:
             name = f"{uuid.uuid4()}"
 
-        # Leer contenido del archivo
-        file_content = content.read()
+        headers = {
+            "content-type": getattr(content, 'content_type', None) or "application/octet-stream",
+            "cache-control": "max-age=3600",
+            # Los nombres son únicos o derivados del contenido, sobrescribir es seguro
+            "x-upsert": "true",
+        }
+        try:
+            size = content.size
+            headers["content-length"] = str(size)
+        except (AttributeError, OSError, TypeError):
+            size = None  # Sin tamaño conocido se usa transfer-encoding: chunked
 
         # Subir a Supabase Storage
-        try:
-            response = self.client.storage.from_(self.bucket_name).upload(
-                path=name,
-                file=file_content,
-                file_options={"content-type": content.content_type if hasattr(content, 'content_type') else "application/octet-stream"}
-            )
-            print(f"✅ Uploaded to Supabase: {name}")
-        except Exception as e:
-            print(f"❌ Error uploading to Supabase: {e}")
-            raise
+        with measure('save', name, size):
+            self._upload(name, content, headers)
+
+        if size is None:
+            cache.delete(self._metadata_key(name))
+        else:
+            cache.set(self._metadata_key(name), {'exists': True, 'size': size}, self.metadata_ttl)
 
         return name
 
+    def _upload(self, name, content, headers):
+        """Enviar el contenido por partes (una llamada a la API)."""
+        response = get_storage_client().session.post(
+            f"object/{self.bucket_name}/{quote(name)}",
+            content=content.chunks(chunk_size=UPLOAD_CHUNK_SIZE),
+            headers=headers,
+        )
+        response.raise_for_status()
+
+    def open(self, name, mode='rb'):
+        with measure('open', name) as sample:
+            file = super().open(name, mode)
+            sample['bytes'] = file.size
+        return file
+
     def _open(self, name, mode='rb'):
         """
-        Abrir archivo desde Supabase Storage.
-        No implementado - usar URL pública directamente.
+        Descargar un archivo de Supabase Storage.
+
+        El contenido se descarga por partes a un archivo temporal (en memoria
+        si es pequeño), nunca completo en memoria.
+        """
+        if mode != 'rb':
+            raise ValueError('SupabaseStorage solo permite abrir archivos en modo "rb"')
+
+        content = SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        with get_storage_client().session.stream(
+            'GET', f"object/{self.bucket_name}/{quote(name)}"
+        ) as response:
+            # Supabase responde 400 con "not_found" para objetos inexistentes
+            if response.status_code in (400, 404):
+                raise FileNotFoundError(name)
+            response.raise_for_status()
+            for chunk in response.iter_bytes(UPLOAD_CHUNK_SIZE):
+                content.write(chunk)
+        content.seek(0)
+        return File(content, name=name)
+
+    def create_upload_url(self, name):
+        """
+        Crear una URL firmada para que el cliente suba ``name`` directamente
+        a Supabase Storage (PUT), sin pasar por Django.
+
+        Returns:
+            dict: path, upload_url, token y expires_in (segundos)
         """
-        raise NotImplementedError("Use url() method to get public URL")
+        with measure('sign_upload', name):
+            return self._sign_upload(name)
+
+    def _sign_upload(self, name):
+        response = get_storage_client().session.post(
+            f"object/upload/sign/{self.bucket_name}/{quote(name)}"
+        )
+        response.raise_for_status()
+        # "/object/upload/sign/<bucket>/<path>?token=..."
+        signed_path = response.json()['url']
+        token = parse_qs(urlsplit(signed_path).query).get('token', [None])[0]
+        if not token:
+            raise ValueError('Supabase no devolvió un token de subida')
+
+        return {
+            'path': name,
+            'upload_url': f"{self.supabase_url.rstrip('/')}/storage/v1{signed_path}",
+            'token': token,
+            'expires_in': SIGNED_UPLOAD_URL_EXPIRES_IN,
+        }
 
     def delete(self, name):
         """
         Eliminar archivo de Supabase Storage.
         """
         try:
-            self.client.storage.from_(self.bucket_name).remove([name])
-        except Exception as e:
-            print(f"Error deleting file from Supabase: {e}")
+            with measure('delete', name):
+                self._remove([name])
+        except Exception:
+            pass  # measure() ya registró el error; delete() nunca falla
+        cache.delete(self._metadata_key(name))
+
+    def delete_many(self, names):
+        """
+        Eliminar varios archivos con una sola llamada a la API (remove([...])).
+        """
+        names = list(names)
+        with measure('delete', names):
+            self._remove(names)
+        cache.delete_many([self._metadata_key(name) for name in names])
+
+    def _remove(self, names):
+        self.bucket.remove(names)
 
     def exists(self, name):
         """
-        Verificar si un archivo existe.
+        Verificar si un archivo existe (usando la caché de metadatos).
         """
         try:
-            files = self.client.storage.from_(self.bucket_name).list(path=name)
-            return len(files) > 0
-        except:
+            with measure('exists', name):
+                return self.get_metadata(name)['exists']
+        except Exception:
             return False
 
     def url(self, name):
         """
         Obtener URL pública del archivo.
+
+        Se construye localmente, sin llamadas a la API.
         """
-        # Obtener URL pública del bucket
-        public_url = self.client.storage.from_(self.bucket_name).get_public_url(name)
-        return public_url
+        with measure('url', name):
+            return f"{self.public_base_url}{quote(name)}"
 
     def size(self, name):
         """
-        Obtener tamaño del archivo.
+        Obtener tamaño del archivo (usando la caché de metadatos).
+        """
+        with measure('size', name):
+            return self.get_metadata(name)['size']
+
+    def iter_files(self, prefix=''):
+        """
+        Recorrer todos los archivos bajo ``prefix``, página por página.
+
+        Yields:
+            tuple: (name, size, modified_time) de cada archivo
+        """
+        folders = [prefix.strip('/')]
+        while folders:
+            folder = folders.pop()
+            offset = 0
+            while True:
+                with measure('list', folder):
+                    entries = self.bucket.list(folder, {
+                        'limit': LIST_PAGE_SIZE,
+                        'offset': offset,
+                        'sortBy': {'column': 'name', 'order': 'asc'},
+                    })
+                for entry in entries:
+                    path = f"{folder}/{entry['name']}" if folder else entry['name']
+                    if entry.get('id') is None:
+                        # Las carpetas no tienen id
+                        folders.append(path)
+                        continue
+                    metadata = entry.get('metadata') or {}
+                    modified = entry.get('updated_at') or entry.get('created_at')
+                    yield path, metadata.get('size') or 0, parse_datetime(modified) if modified else None
+                if len(entries) < LIST_PAGE_SIZE:
+                    break
+                offset += LIST_PAGE_SIZE
+
+
+class InjectedStorageError(Exception):
+    """Failure injected by LocalSupabaseStorage to model an unreliable service."""
+
+
+# What a storage call raises when the service fails or cannot be reached
+STORAGE_ERRORS = (httpx.HTTPError, StorageException, InjectedStorageError, OSError)
+
+
+class LocalSupabaseStorage(SupabaseStorage):
+    """
+    Stand-in de SupabaseStorage que guarda los archivos en disco local.
+
+    Tiene la misma interfaz y el mismo formato de URL que SupabaseStorage,
+    así que benchmarks y desarrollo sin red ejercitan el mismo código
+    (caché de metadatos, nombres, URLs firmadas). Cada operación de storage
+    puede tener latencia, variación (jitter) y una tasa de fallos inyectadas
+    para modelar el servicio real.
+
+    Configuración en settings.py:
+    - LOCAL_STORAGE_ROOT (default: MEDIA_ROOT/supabase)
+    - LOCAL_STORAGE_LATENCY_MS (default: 0)
+    - LOCAL_STORAGE_JITTER_MS (default: 0)
+    - LOCAL_STORAGE_FAILURE_RATE (0 a 1, default: 0)
+    """
+
+    def __init__(self, location=None, latency_ms=None, jitter_ms=None, failure_rate=None, seed=None):
+        super().__init__()
+        if not self.supabase_url:
+            self.supabase_url = LOCAL_SUPABASE_URL
+            self.public_base_url = (
+                f"{self.supabase_url}{SUPABASE_PUBLIC_PATH}{quote(self.bucket_name)}/"
+            )
+
+        location = location or getattr(settings, 'LOCAL_STORAGE_ROOT', None) or os.path.join(
+            settings.MEDIA_ROOT, 'supabase'
+        )
+        self.files = FileSystemStorage(location=os.path.join(location, self.bucket_name))
+
+        if latency_ms is None:
+            latency_ms = getattr(settings, 'LOCAL_STORAGE_LATENCY_MS', 0)
+        if jitter_ms is None:
+            jitter_ms = getattr(settings, 'LOCAL_STORAGE_JITTER_MS', 0)
+        if failure_rate is None:
+            failure_rate = getattr(settings, 'LOCAL_STORAGE_FAILURE_RATE', 0)
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+
+    def _simulate(self, operation):
+        """Esperar la latencia configurada y fallar según la tasa de fallos."""
+        delay = self.latency + self.random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        if self.failure_rate and self.random.random() < self.failure_rate:
+            raise InjectedStorageError(f'Fallo inyectado en {operation}')
+
+    def _fetch_metadata(self, name):
+        self._simulate('info')
+        if not self.files.exists(name):
+            return {'exists': False, 'size': 0}
+        return {'exists': True, 'size': self.files.size(name)}
+
+    def _upload(self, name, content, headers):
+        self._simulate('upload')
+        # Sobrescribe como x-upsert
+        path = self.files.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as destination:
+            for chunk in content.chunks(chunk_size=UPLOAD_CHUNK_SIZE):
+                destination.write(chunk)
+
+    def _open(self, name, mode='rb'):
+        if mode != 'rb':
+            raise ValueError('SupabaseStorage solo permite abrir archivos en modo "rb"')
+        self._simulate('download')
+        return File(open(self.files.path(name), 'rb'), name=name)
+
+    def _remove(self, names):
+        self._simulate('remove')
+        for name in names:
+            self.files.delete(name)
+
+    def iter_files(self, prefix=''):
+        self._simulate('list')
+        yield from iter_files(prefix, self.files)
+
+    def _sign_upload(self, name):
+        """
+        Crear una URL firmada con el mismo formato que Supabase.
+
+        El token es una firma de Django del path, válida por el mismo tiempo
+        que las de Supabase; ``upload_to_signed_url`` hace la parte del cliente.
+        """
+        self._simulate('sign')
+        token = signing.dumps(name, salt='local-storage-upload')
+        return {
+            'path': name,
+            'upload_url': (
+                f"{self.supabase_url}/storage/v1/object/upload/sign/"
+                f"{self.bucket_name}/{quote(name)}?token={token}"
+            ),
+            'token': token,
+            'expires_in': SIGNED_UPLOAD_URL_EXPIRES_IN,
+        }
+
+    def upload_to_signed_url(self, upload_url, content):
+        """
+        Subir ``content`` (bytes o File) a una URL de ``create_upload_url``,
+        como lo haría el cliente. No llena la caché de metadatos.
         """
-        # Supabase no tiene método directo, retornar 0
-        return 0
+        url = urlsplit(upload_url)
+        token = parse_qs(url.query).get('token', [''])[0]
+        try:
+            name = signing.loads(token, salt='local-storage-upload', max_age=SIGNED_UPLOAD_URL_EXPIRES_IN)
+        except signing.BadSignature as e:
+            raise PermissionError('Token de subida no válido') from e
+        if not unquote(url.path).endswith(f'/{self.bucket_name}/{name}'):
+            raise PermissionError('El token no corresponde a este archivo')
+
+        if isinstance(content, bytes):
+            content = ContentFile(content)
+        self._upload(name, content, {})
+        return name
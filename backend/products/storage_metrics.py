@@ -0,0 +1,155 @@
+"""
+Timing, byte and error counters for storage operations.
+
+SupabaseStorage records every operation (save, open, delete, exists, size,
+url, ...) here, labelled by the top-level folder of the file
+(``products``, ``receipts``, ``seller_logos``, ...). Counters live in the
+process memory; ``/health/storage/`` reports those of the process that
+serves the request, so with several workers each request may report a
+different one (see ``pid`` in the snapshot).
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the latency histogram buckets; the last one is +inf
+LATENCY_BUCKETS_MS = (10, 50, 100, 250, 500, 1000, 2500, 5000)
+
+KNOWN_PREFIXES = ('products', 'receipts', 'seller_logos', 'payment_proofs')
+
+
+def prefix_of(names):
+    """
+    Metrics label for one name or a list of names.
+
+    >>> prefix_of('products/blobs/ab/x.webp')
+    'products'
+    >>> prefix_of(['receipts/a.jpg', 'products/b.webp'])
+    'mixed'
+    >>> prefix_of('tmp/x')
+    'other'
+    """
+    if isinstance(names, str):
+        names = [names]
+    prefixes = {
+        prefix if prefix in KNOWN_PREFIXES else 'other'
+        for prefix in (str(name).lstrip('/').split('/', 1)[0] for name in names)
+    }
+    if len(prefixes) == 1:
+        return prefixes.pop()
+    return 'mixed' if prefixes else 'other'
+
+
+class StorageMetrics:
+    """Thread-safe counters per (operation, prefix)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+            self.started_at = time.time()
+
+    def record(self, operation, prefix, duration_ms, size=0, error=False):
+        with self._lock:
+            stats = self._stats.get((operation, prefix))
+            if stats is None:
+                stats = self._stats[(operation, prefix)] = {
+                    'count': 0,
+                    'errors': 0,
+                    'bytes': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'buckets': [0] * (len(LATENCY_BUCKETS_MS) + 1),
+                }
+            stats['count'] += 1
+            stats['errors'] += int(error)
+            stats['bytes'] += size or 0
+            stats['total_ms'] += duration_ms
+            stats['max_ms'] = max(stats['max_ms'], duration_ms)
+            bucket = next(
+                (i for i, bound in enumerate(LATENCY_BUCKETS_MS) if duration_ms <= bound),
+                len(LATENCY_BUCKETS_MS)
+            )
+            stats['buckets'][bucket] += 1
+
+    def snapshot(self):
+        """Counters as JSON-serializable data."""
+        with self._lock:
+            items = sorted(self._stats.items())
+            started_at = self.started_at
+
+        operations = []
+        for (operation, prefix), stats in items:
+            operations.append({
+                'operation': operation,
+                'prefix': prefix,
+                'count': stats['count'],
+                'errors': stats['errors'],
+                'bytes': stats['bytes'],
+                'avg_ms': round(stats['total_ms'] / stats['count'], 2),
+                'max_ms': round(stats['max_ms'], 2),
+                'total_ms': round(stats['total_ms'], 2),
+                'latency_buckets_ms': {
+                    str(bound): count
+                    for bound, count in zip(LATENCY_BUCKETS_MS + ('+inf',), stats['buckets'])
+                },
+            })
+        return {
+            'pid': os.getpid(),
+            'since': started_at,
+            'operations': operations,
+        }
+
+
+metrics = StorageMetrics()
+
+
+@contextmanager
+def measure(operation, names, size=0):
+    """
+    Time a storage operation and record it in ``metrics``.
+
+    Yields a dict; set ``sample['bytes']`` when the size is only known
+    after the operation (downloads). Missing files (FileNotFoundError) are
+    not counted as errors.
+    """
+    sample = {'bytes': size}
+    prefix = prefix_of(names)
+    start = time.perf_counter()
+    error = None
+    try:
+        yield sample
+    except FileNotFoundError:
+        raise
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1000
+        metrics.record(operation, prefix, duration_ms, sample['bytes'], error is not None)
+
+        fields = {
+            'storage_operation': operation,
+            'storage_prefix': prefix,
+            'storage_duration_ms': round(duration_ms, 2),
+            'storage_bytes': sample['bytes'] or 0,
+        }
+        target = names if isinstance(names, str) else f'{len(names)} files'
+        if error is not None:
+            logger.warning('Storage %s failed for %s after %.0fms: %s',
+                           operation, target, duration_ms, error, extra=fields)
+        elif duration_ms >= getattr(settings, 'STORAGE_SLOW_OPERATION_MS', 1000):
+            logger.warning('Slow storage %s for %s: %.0fms', operation, target, duration_ms, extra=fields)
+        elif operation in ('save', 'delete'):
+            logger.info('Storage %s %s (%.0fms)', operation, target, duration_ms, extra=fields)
+        else:
+            logger.debug('Storage %s %s (%.0fms)', operation, target, duration_ms, extra=fields)
@@ -0,0 +1,380 @@
+"""
+Tests for Products app.
+"""
+import io
+import shutil
+import tempfile
+
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from products.models import Category, ImageBlob, PendingStorageDeletion, Product
+from products.storage_backends import storage_path_from_url
+from products.uploads import store_product_images
+from users.models import User
+
+
+SUPABASE = 'https://abc.supabase.co/storage/v1/object'
+
+
+@override_settings(MEDIA_URL='media/', SUPABASE_BUCKET_NAME='Productos')
+class StoragePathFromUrlTests(SimpleTestCase):
+    """storage_path_from_url maps stored URLs back to storage paths."""
+
+    def test_public_url(self):
+        self.assertEqual(
+            storage_path_from_url(f'{SUPABASE}/public/Productos/products/1/a.webp'),
+            'products/1/a.webp'
+        )
+
+    def test_public_url_with_empty_query(self):
+        self.assertEqual(
+            storage_path_from_url(f'{SUPABASE}/public/Productos/products/1/a.webp?'),
+            'products/1/a.webp'
+        )
+
+    def test_public_url_is_unquoted(self):
+        self.assertEqual(
+            storage_path_from_url(f'{SUPABASE}/public/Productos/receipts/2/mi%20recibo.jpg'),
+            'receipts/2/mi recibo.jpg'
+        )
+
+    def test_signed_url(self):
+        self.assertEqual(
+            storage_path_from_url(f'{SUPABASE}/sign/Productos/receipts/2/r.webp?token=eyJhbGciOi.x.y'),
+            'receipts/2/r.webp'
+        )
+
+    def test_authenticated_url(self):
+        self.assertEqual(
+            storage_path_from_url(f'{SUPABASE}/authenticated/Productos/seller_logos/3/logo.png'),
+            'seller_logos/3/logo.png'
+        )
+
+    def test_url_of_another_bucket(self):
+        self.assertIsNone(storage_path_from_url(f'{SUPABASE}/public/Otro/products/1/a.webp'))
+        self.assertIsNone(storage_path_from_url(f'{SUPABASE}/sign/Otro/products/1/a.webp?token=t'))
+
+    def test_explicit_bucket(self):
+        self.assertEqual(
+            storage_path_from_url(f'{SUPABASE}/public/Otro/products/1/a.webp', bucket='Otro'),
+            'products/1/a.webp'
+        )
+
+    def test_upload_url_is_not_a_stored_file(self):
+        self.assertIsNone(storage_path_from_url(f'{SUPABASE}/upload/sign/Productos/products/1/a.webp?token=t'))
+
+    def test_media_urls(self):
+        self.assertEqual(storage_path_from_url('/media/products/1/a.webp'), 'products/1/a.webp')
+        self.assertEqual(storage_path_from_url('media/products/1/a.webp'), 'products/1/a.webp')
+        self.assertEqual(
+            storage_path_from_url('http://localhost:8000/media/products/1/a%20b.jpg'),
+            'products/1/a b.jpg'
+        )
+
+    def test_empty_url(self):
+        self.assertIsNone(storage_path_from_url(''))
+        self.assertIsNone(storage_path_from_url(None))
+
+    def test_invalid_urls(self):
+        self.assertIsNone(storage_path_from_url('https://example.com/a.jpg'))
+        self.assertIsNone(storage_path_from_url('not a url'))
+        self.assertIsNone(storage_path_from_url(f'{SUPABASE}/public/Productos/'))
+        self.assertIsNone(storage_path_from_url(f'{SUPABASE}/public/Productos'))
+        self.assertIsNone(storage_path_from_url('/media/'))
+
+
+def make_image(color='red', name='foto.png'):
+    """A small PNG upload."""
+    buffer = io.BytesIO()
+    Image.new('RGB', (32, 32), color).save(buffer, format='PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+class ImageStorageTestCase(TestCase):
+    """Stores files with LocalSupabaseStorage, which overwrites like Supabase."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        storage_settings = override_settings(
+            STORAGES={'default': {'BACKEND': 'products.storage_backends.LocalSupabaseStorage'}},
+            LOCAL_STORAGE_ROOT=self.root,
+            SUPABASE_BUCKET_NAME='Productos',
+            LOCAL_STORAGE_LATENCY_MS=0,
+            LOCAL_STORAGE_JITTER_MS=0,
+            LOCAL_STORAGE_FAILURE_RATE=0,
+        )
+        storage_settings.enable()
+        self.addCleanup(storage_settings.disable)
+
+        self.seller = User.objects.create_user(
+            'vendedor@example.com', 'pw12345678',
+            first_name='Ana', last_name='Mora', phone='88888888', user_type='SELLER'
+        )
+        self.category = Category.objects.create(name='Comida', category_type='FOOD')
+        self.product = self.make_product()
+
+    def make_product(self, **kwargs):
+        return Product.objects.create(
+            seller=self.seller, category=self.category, name='Queso', price='100.00', stock=10, **kwargs
+        )
+
+    def add_images(self, product, *files):
+        """Attach images to a product like upload_images does."""
+        def attach(stored):
+            product.images = (product.images or []) + [variants['full'] for variants in stored]
+            product.image_variants = {
+                **(product.image_variants or {}),
+                **{variants['full']: variants for variants in stored},
+            }
+            product.save()
+
+        store_product_images(list(files), attach)
+        return product.images
+
+    def stored_paths(self, url):
+        return [storage_path_from_url(file_url) for file_url in ImageBlob.objects.get(
+            pk=ImageBlob.hash_from_url(url)
+        ).files()]
+
+    def assertFilesExist(self, paths):
+        for path in paths:
+            self.assertTrue(default_storage.files.exists(path), path)
+
+
+class ImageVariantsTests(ImageStorageTestCase):
+    """Product images are stored as WebP variants plus a JPEG fallback."""
+
+    def test_jpeg_fallback_is_stored(self):
+        [url] = self.add_images(self.product, make_image())
+
+        variants = self.product.image_variants[url]
+        self.assertEqual(set(variants), {'thumbnail', 'medium', 'full', 'fallback', 'placeholder'})
+        self.assertTrue(variants['full'].endswith('_full.webp'))
+        self.assertTrue(variants['fallback'].endswith('_fallback.jpg'))
+        self.assertFilesExist(self.stored_paths(url))
+        with default_storage.open(storage_path_from_url(variants['fallback'])) as fallback:
+            self.assertEqual(Image.open(fallback).format, 'JPEG')
+
+
+class ImageReuploadTests(ImageStorageTestCase):
+    """An image released and uploaded again keeps its files."""
+
+    def test_release_reupload_drain(self):
+        [url] = self.add_images(self.product, make_image())
+        paths = self.stored_paths(url)
+
+        ImageBlob.release(self.product, [url])
+        self.assertFalse(ImageBlob.objects.exists())
+        self.assertEqual(set(PendingStorageDeletion.objects.values_list('path', flat=True)), set(paths))
+
+        other = self.make_product()
+        [reuploaded] = self.add_images(other, make_image())
+        self.assertEqual(storage_path_from_url(reuploaded), storage_path_from_url(url))
+        self.assertFalse(PendingStorageDeletion.objects.exists())
+
+        call_command('process_storage_deletions', stdout=io.StringIO())
+        self.assertFilesExist(paths)
+        self.assertEqual(ImageBlob.objects.get().ref_count, 1)
+
+    def test_drain_skips_files_of_existing_blobs(self):
+        [url] = self.add_images(self.product, make_image())
+        paths = self.stored_paths(url)
+        PendingStorageDeletion.enqueue(paths + ['products/1/viejo.jpg'])
+        default_storage.save('products/1/viejo.jpg', io.BytesIO(b'x'))
+
+        call_command('process_storage_deletions', stdout=io.StringIO())
+
+        self.assertFilesExist(paths)
+        self.assertFalse(default_storage.files.exists('products/1/viejo.jpg'))
+        self.assertFalse(PendingStorageDeletion.objects.exists())
+
+
+class ProductImagesUpdateTests(ImageStorageTestCase):
+    """Updating ``images`` releases exactly the references that are removed."""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.seller)
+
+    def update_images(self, product, images):
+        return self.client.patch(
+            f'/api/products/{product.id}/',
+            {'images': images, 'accepts_cash': True},
+            format='json'
+        )
+
+    def test_removing_one_copy_releases_one_reference(self):
+        urls = self.add_images(self.product, make_image(), make_image())
+        self.assertEqual(urls[0], urls[1])
+        self.assertEqual(ImageBlob.objects.get().ref_count, 2)
+
+        response = self.update_images(self.product, [urls[0]])
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(ImageBlob.objects.get().ref_count, 1)
+        self.assertFalse(PendingStorageDeletion.objects.exists())
+
+        response = self.update_images(self.product, [])
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertFalse(ImageBlob.objects.exists())
+        self.assertTrue(PendingStorageDeletion.objects.exists())
+
+    def test_absolute_form_of_stored_url_is_accepted(self):
+        self.product.images = ['/media/products/1/a.jpg']
+        self.product.save()
+        response = self.client.get(f'/api/products/{self.product.id}/')
+        self.assertEqual(response.data['images'], ['http://testserver/media/products/1/a.jpg'])
+
+        response = self.update_images(self.product, response.data['images'])
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.images, ['/media/products/1/a.jpg'])
+        self.assertFalse(PendingStorageDeletion.objects.exists())
+
+    def test_url_of_another_product_is_rejected(self):
+        other = self.make_product()
+        [url] = self.add_images(other, make_image('blue'))
+
+        response = self.update_images(self.product, [url])
+        self.assertEqual(response.status_code, 400)
+
+        response = self.update_images(self.product, [])
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(ImageBlob.objects.get().ref_count, 1)
+        self.assertFalse(PendingStorageDeletion.objects.exists())
+
+    def test_repeating_an_attached_url_is_rejected(self):
+        [url] = self.add_images(self.product, make_image())
+
+        response = self.update_images(self.product, [url, url])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(ImageBlob.objects.get().ref_count, 1)
+
+    def create_product(self, images):
+        return self.client.post('/api/products/', {
+            'name': 'Copia', 'category': str(self.category.id), 'price': '10.00', 'stock': 1,
+            'accepts_cash': True, 'images': images,
+        }, format='json')
+
+    def test_create_with_a_stored_image_takes_a_reference(self):
+        [url] = self.add_images(self.product, make_image())
+
+        response = self.create_product([url])
+
+        self.assertEqual(response.status_code, 201, response.data)
+        created = Product.objects.get(pk=response.data['id'])
+        self.assertEqual(created.images, [url])
+        self.assertEqual(created.image_variants[url], ImageBlob.objects.get().variants)
+        self.assertEqual(ImageBlob.objects.get().ref_count, 2)
+
+        self.client.delete(f'/api/products/{created.id}/')
+        self.assertEqual(ImageBlob.objects.get().ref_count, 1)
+        self.assertFalse(PendingStorageDeletion.objects.exists())
+
+    def test_create_with_external_url(self):
+        response = self.create_product(['https://example.com/foto.jpg'])
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(Product.objects.get(pk=response.data['id']).images, ['https://example.com/foto.jpg'])
+
+    def test_create_with_a_stored_file_without_blob_is_rejected(self):
+        response = self.create_product(['/media/products/1/a.jpg'])
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_create_with_a_released_image_is_rejected(self):
+        [url] = self.add_images(self.product, make_image())
+        ImageBlob.release(self.product, [url])
+
+        response = self.create_product([url])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Product.objects.count(), 1)
+
+
+@override_settings(STORAGE_METRICS_TOKEN='secreto')
+class StorageMetricsViewTests(TestCase):
+    """/health/storage/ is only readable by staff or with the metrics token."""
+
+    def test_anonymous_is_rejected(self):
+        self.assertEqual(self.client.get('/health/storage/').status_code, 403)
+
+    def test_wrong_token_is_rejected(self):
+        response = self.client.get('/health/storage/', HTTP_AUTHORIZATION='Bearer otro')
+        self.assertEqual(response.status_code, 403)
+
+    def test_non_ascii_token_is_rejected(self):
+        response = self.client.get('/health/storage/', HTTP_AUTHORIZATION='Bearer contraseña')
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(STORAGE_METRICS_TOKEN='')
+    def test_empty_token_is_never_accepted(self):
+        response = self.client.get('/health/storage/', HTTP_AUTHORIZATION='Bearer ')
+        self.assertEqual(response.status_code, 403)
+
+    def test_token(self):
+        response = self.client.get('/health/storage/', HTTP_AUTHORIZATION='Bearer secreto')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('pid', response.json())
+
+    def test_staff_user(self):
+        user = User.objects.create_user(
+            'admin@example.com', 'pw12345678', first_name='A', last_name='D', phone='70000000', is_staff=True
+        )
+        self.client.force_login(user)
+        self.assertEqual(self.client.get('/health/storage/').status_code, 200)
+
+
+class MyProductsSummaryTests(TestCase):
+    """my_products/summary runs the same queries whatever the number of products."""
+
+    # Totals (one aggregate), low-stock list, page count and page
+    EXPECTED_QUERIES = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(
+            'vendedor@example.com', 'pw12345678',
+            first_name='Ana', last_name='Mora', phone='88888888', user_type='SELLER'
+        )
+        cls.category = Category.objects.create(name='Comida', category_type='FOOD')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.seller)
+
+    def add_products(self, count):
+        Product.objects.bulk_create([
+            Product(seller=self.seller, category=self.category, name=f'P{i}', price='10.00', stock=i % 7)
+            for i in range(count)
+        ])
+
+    def get_summary(self):
+        with self.assertNumQueries(self.EXPECTED_QUERIES):
+            response = self.client.get('/api/products/my_products/summary/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_few_products(self):
+        self.add_products(3)
+        data = self.get_summary()
+        self.assertEqual(data['total_products'], 3)
+        self.assertEqual(data['products']['count'], 3)
+
+    def test_many_products(self):
+        self.add_products(60)
+        data = self.get_summary()
+        self.assertEqual(data['total_products'], 60)
+        self.assertEqual(data['out_of_stock'], 9)
+        self.assertEqual(len(data['low_stock']), 20)
+        self.assertEqual(len(data['products']['results']), 20)
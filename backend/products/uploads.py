@@ -0,0 +1,232 @@
+"""
+Concurrent file uploads to the configured storage backend.
+"""
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from products.storage_backends import delete_files, storage_path_from_url
+
+logger = logging.getLogger(__name__)
+
+
+def _save_file(storage, name, content):
+    """Save a single file and return its (path, url)."""
+    path = storage.save(name, content)
+    return path, storage.url(path)
+
+
+def save_files(files, storage=None, max_workers=None):
+    """
+    Save several files concurrently with all-or-nothing semantics.
+
+    Each upload is a separate network round trip with remote backends, so
+    they run in a bounded thread pool and the total time is close to the
+    slowest single upload. If any upload fails, pending uploads are cancelled,
+    the files that were already stored are deleted and the first error is
+    re-raised.
+
+    Args:
+        files (list): (name, content) pairs
+        storage: storage backend (default: default_storage)
+        max_workers (int): pool size (default: settings.STORAGE_UPLOAD_MAX_WORKERS)
+
+    Returns:
+        list: (path, url) pairs, in the same order as ``files``
+    """
+    if not files:
+        return []
+
+    storage = storage or default_storage
+    if max_workers is None:
+        max_workers = settings.STORAGE_UPLOAD_MAX_WORKERS
+    max_workers = max(1, min(max_workers, len(files)))
+
+    results = [None] * len(files)
+    errors = []
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(_save_file, storage, name, content): index
+            for index, (name, content) in enumerate(files)
+        }
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                if not errors:
+                    # Stop uploads that have not started yet
+                    for pending in futures:
+                        pending.cancel()
+                errors.append(e)
+
+    if errors:
+        saved_paths = [result[0] for result in results if result is not None]
+        try:
+            delete_files(saved_paths, storage)
+        except Exception as e:
+            logger.warning('Error deleting %d partial uploads, queueing them: %s', len(saved_paths), e)
+            from products.models import PendingStorageDeletion
+            PendingStorageDeletion.enqueue(saved_paths)
+        raise errors[0]
+
+    return results
+
+
+def store_product_images(files, attach):
+    """
+    Store uploaded product images, deduplicated by content.
+
+    Each file is hashed; images already stored (by any product) are reused
+    without processing or uploading anything. New images are converted to
+    their variants (plus an inline LQIP placeholder) and uploaded
+    concurrently, outside of any transaction.
+    References are then added to the ImageBlob rows and ``attach`` is called
+    in one transaction, so the product only points to images it holds a
+    reference to. If that transaction fails, the new uploads are queued for
+    deletion.
+
+    Must not be called inside an atomic block: the deletion queue rows
+    written on failure would be rolled back with it.
+
+    Args:
+        files (list): uploaded image files
+        attach (callable): receives one {variant_name: url} dict per file,
+            in order, and saves them to the product
+
+    Raises:
+        InvalidImageError: if a new file is not a readable image
+        ImageBlob.DoesNotExist: if a reused image was deleted concurrently
+    """
+    from collections import Counter
+    from django.db import transaction
+    from products.images import PLACEHOLDER_KEY, generate_variants, hash_file
+    from products.models import ImageBlob, PendingStorageDeletion
+
+    hashes = [hash_file(image_file) for image_file in files]
+    known = set(ImageBlob.objects.filter(pk__in=set(hashes)).values_list('pk', flat=True))
+
+    # Only the first copy of each unknown image is processed and uploaded
+    new_files = {}
+    for sha256, image_file in zip(hashes, files):
+        if sha256 not in known and sha256 not in new_files:
+            new_files[sha256] = image_file
+
+    processed = {sha256: generate_variants(image_file) for sha256, image_file in new_files.items()}
+
+    uploads = []
+    for sha256, (_ext, variants, _placeholder) in processed.items():
+        prefix = ImageBlob.storage_prefix(sha256)
+        for variant_file in variants.values():
+            uploads.append((f'{prefix}_{variant_file.name}', variant_file))
+
+    # A released blob's files may still be queued for deletion under these
+    # same names; take them off the queue before overwriting them, so the
+    # worker cannot delete the new copies (it holds the rows locked while
+    # it deletes, so this waits for a batch in progress)
+    if uploads:
+        PendingStorageDeletion.objects.filter(path__in=[name for name, _content in uploads]).delete()
+
+    saved_urls = iter(url for _path, url in save_files(uploads))
+    uploaded = {
+        sha256: {variant_name: next(saved_urls) for variant_name in variants}
+        for sha256, (_ext, variants, _placeholder) in processed.items()
+    }
+
+    try:
+        with transaction.atomic():
+            ImageBlob.objects.bulk_create(
+                [
+                    ImageBlob(sha256=sha256, variants={**variants, PLACEHOLDER_KEY: processed[sha256][2]})
+                    for sha256, variants in uploaded.items()
+                ],
+                ignore_conflicts=True
+            )
+            blob_variants = ImageBlob.acquire(Counter(hashes))
+
+            # Another request stored the same image first; drop our copies if they
+            # ended up under different names (compared by path, URLs may differ in form)
+            duplicates = [
+                url
+                for sha256, variants in uploaded.items()
+                for variant_name, url in variants.items()
+                if storage_path_from_url(blob_variants[sha256].get(variant_name)) != storage_path_from_url(url)
+            ]
+            if duplicates:
+                PendingStorageDeletion.enqueue_urls(duplicates)
+
+            attach([blob_variants[sha256] for sha256 in hashes])
+    except Exception:
+        PendingStorageDeletion.enqueue_urls(
+            url for variants in uploaded.values() for url in variants.values()
+        )
+        raise
+
+
+# Folder (under each use case's prefix) where clients upload directly to
+# storage; files are moved out of it once confirmed, and unconfirmed ones
+# are removed by gc_storage_orphans after its grace period.
+DIRECT_UPLOAD_FOLDER = 'incoming'
+
+# Largest file accepted through a direct upload
+DIRECT_UPLOAD_MAX_SIZE = 5 * 1024 * 1024
+
+
+class DirectUploadError(ValueError):
+    """Raised when a direct upload cannot be confirmed."""
+
+
+def direct_upload_prefix(prefix, owner_id):
+    """Folder that holds the direct uploads of one product/order."""
+    return f'{prefix}/{DIRECT_UPLOAD_FOLDER}/{owner_id}/'
+
+
+def supports_direct_uploads(storage=None):
+    """Whether the storage backend can issue signed upload URLs."""
+    return hasattr(storage or default_storage, 'create_upload_url')
+
+
+def create_direct_uploads(prefix, owner_id, count, storage=None):
+    """
+    Issue ``count`` signed upload URLs under the owner's incoming folder.
+
+    Returns:
+        list: dicts with path, upload_url, token and expires_in
+    """
+    storage = storage or default_storage
+    folder = direct_upload_prefix(prefix, owner_id)
+    return [storage.create_upload_url(f'{folder}{uuid.uuid4().hex}') for _ in range(count)]
+
+
+def open_direct_upload(path, prefix, owner_id, max_size=DIRECT_UPLOAD_MAX_SIZE, storage=None):
+    """
+    Check a direct upload and open it for processing.
+
+    The path must be in the owner's incoming folder and the object must exist
+    with at most ``max_size`` bytes; its metadata is read from storage, not
+    from the cache.
+
+    Returns:
+        File: the downloaded object
+
+    Raises:
+        DirectUploadError: if the path or the object is not acceptable
+    """
+    storage = storage or default_storage
+    folder = direct_upload_prefix(prefix, owner_id)
+    name = path[len(folder):] if path.startswith(folder) else ''
+    if not name or '/' in name or name in ('.', '..'):
+        raise DirectUploadError('Ruta de archivo no válida')
+
+    metadata = storage.get_metadata(path, refresh=True)
+    if not metadata['exists']:
+        raise DirectUploadError('El archivo no se ha subido')
+    if metadata['size'] > max_size:
+        raise DirectUploadError(f'El archivo no puede superar {max_size // (1024 * 1024)}MB')
+
+    return storage.open(path)
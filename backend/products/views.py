@@ -1,19 +1,29 @@
 """
 Views for Products app.
 """
+import logging
+from collections import Counter
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
 from rest_framework import viewsets, permissions, filters, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 from django_filters.rest_framework import DjangoFilterBackend
-from products.models import Category, Product
+from products.models import Category, ImageBlob, Product
 from products.serializers import (
     CategorySerializer,
     ProductSerializer,
     ProductListSerializer,
-    ProductDetailSerializer
+    ProductDetailSerializer,
+    StockReservationSerializer,
 )
 
+logger = logging.getLogger(__name__)
+
 
 class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
     """
@@ -45,6 +55,8 @@ class ProductViewSet(viewsets.ModelViewSet):
     search_fields = ['name', 'description', 'seller__seller_profile__business_name']
     ordering_fields = ['price', 'created_at', 'sales_count', 'views_count']
     ordering = ['-created_at']
+    # Longest low-stock list returned by my_products/summary
+    summary_low_stock_limit = 20
 
     def get_permissions(self):
         """Set permissions based on action."""
@@ -88,11 +100,43 @@ class ProductViewSet(viewsets.ModelViewSet):
         if self.action in ['list', 'retrieve']:
             queryset = queryset.filter(is_available=True, stock__gt=0)
 
+        # Stock minus active reservations, as a subquery (no extra queries)
+        if self.action in ['list', 'retrieve', 'my_products', 'featured']:
+            from products.reservations import annotate_available_stock
+            queryset = annotate_available_stock(queryset)
+
         return queryset
 
     def perform_create(self, serializer):
-        """Set seller to current user."""
-        serializer.save(seller=self.request.user)
+        """
+        Set seller to current user and take a reference to each stored
+        image the product starts with.
+        """
+        images = serializer.validated_data.get('images') or []
+        counts = Counter(filter(None, (ImageBlob.hash_from_url(url) for url in images)))
+        if not counts:
+            serializer.save(seller=self.request.user)
+            return
+
+        with transaction.atomic():
+            try:
+                blob_variants = ImageBlob.acquire(counts)
+            except ImageBlob.DoesNotExist:
+                from rest_framework import exceptions
+                raise exceptions.ValidationError({'images': ['Una de las imágenes ya no existe; súbela de nuevo.']})
+
+            # Point at the blob's own URLs, whatever form the client sent
+            stored = []
+            for url in images:
+                sha256 = ImageBlob.hash_from_url(url)
+                stored.append(blob_variants[sha256]['full'] if sha256 else url)
+            serializer.save(
+                seller=self.request.user,
+                images=stored,
+                image_variants={
+                    blob_variants[sha256]['full']: blob_variants[sha256] for sha256 in counts
+                },
+            )
 
     def perform_update(self, serializer):
         """Only allow sellers to update their own products."""
@@ -101,43 +145,30 @@ class ProductViewSet(viewsets.ModelViewSet):
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied("No puedes editar productos de otros vendedores")
 
-        # Detectar imágenes eliminadas y borrarlas de Supabase Storage
-        old_images = set(product.images or [])
-        new_images = set(serializer.validated_data.get('images', []))
-        deleted_images = old_images - new_images
-
-        if deleted_images:
-            from django.core.files.storage import default_storage
-            print(f"🗑️  Deleting {len(deleted_images)} images from storage")
-
-            for image_url in deleted_images:
-                try:
-                    # Extraer el path del archivo de la URL
-                    # URLs de Supabase tienen formato: https://.../storage/v1/object/public/Products/path/to/file.jpg
-                    if 'supabase.co/storage/v1/object/public/' in image_url:
-                        # Extraer path después del nombre del bucket
-                        path_parts = image_url.split('/object/public/')
-                        if len(path_parts) > 1:
-                            # Remover el bucket name y quedarnos con el path del archivo
-                            full_path = path_parts[1]
-                            # Remover el nombre del bucket (primer segmento)
-                            file_path = '/'.join(full_path.split('/')[1:])
-                            # Remover query params si los hay
-                            file_path = file_path.split('?')[0]
-
-                            print(f"🗑️  Deleting from storage: {file_path}")
-                            default_storage.delete(file_path)
-                            print(f"✅ Deleted: {file_path}")
-                    elif image_url.startswith('/media/'):
-                        # URL local del filesystem
-                        file_path = image_url.replace('/media/', '')
-                        print(f"🗑️  Deleting from storage: {file_path}")
-                        default_storage.delete(file_path)
-                        print(f"✅ Deleted: {file_path}")
-                except Exception as e:
-                    print(f"⚠️  Error deleting image {image_url}: {e}")
-
-        serializer.save()
+        # Sin 'images' en la petición (PATCH parcial) no se elimina ninguna imagen
+        if 'images' not in serializer.validated_data:
+            serializer.save()
+            return
+
+        # Detectar imágenes eliminadas y encolarlas para borrarlas del storage.
+        # Se cuentan las copias: cada una tiene su propia referencia al blob
+        new_images = serializer.validated_data['images']
+        deleted_images = list((Counter(product.images or []) - Counter(new_images)).elements())
+
+        if not deleted_images:
+            serializer.save()
+            return
+
+        image_variants = {
+            url: variants
+            for url, variants in (product.image_variants or {}).items()
+            if url in new_images
+        }
+
+        with transaction.atomic():
+            serializer.save(image_variants=image_variants)
+            ImageBlob.release(product, deleted_images)
+        print(f"🗑️  {len(deleted_images)} images removed from product {product.id}")
 
     def perform_destroy(self, instance):
         """
@@ -160,33 +191,10 @@ class ProductViewSet(viewsets.ModelViewSet):
             print(f"ℹ️  Product {instance.id} marked as unavailable (has {instance.order_items.count()} order items)")
         else:
             # No orders, safe to delete completely
-            # First delete images from storage
-            if instance.images:
-                from django.core.files.storage import default_storage
-                print(f"🗑️  Deleting {len(instance.images)} images from storage (product deletion)")
-
-                for image_url in instance.images:
-                    try:
-                        # Extraer el path del archivo de la URL
-                        if 'supabase.co/storage/v1/object/public/' in image_url:
-                            path_parts = image_url.split('/object/public/')
-                            if len(path_parts) > 1:
-                                full_path = path_parts[1]
-                                file_path = '/'.join(full_path.split('/')[1:])
-                                file_path = file_path.split('?')[0]
-
-                                print(f"🗑️  Deleting from storage: {file_path}")
-                                default_storage.delete(file_path)
-                                print(f"✅ Deleted: {file_path}")
-                        elif image_url.startswith('/media/'):
-                            file_path = image_url.replace('/media/', '')
-                            print(f"🗑️  Deleting from storage: {file_path}")
-                            default_storage.delete(file_path)
-                            print(f"✅ Deleted: {file_path}")
-                    except Exception as e:
-                        print(f"⚠️  Error deleting image {image_url}: {e}")
-
-            instance.delete()
+            # Unreferenced image files are removed from storage in the background
+            with transaction.atomic():
+                ImageBlob.release(instance, instance.images or [])
+                instance.delete()
             print(f"✅ Product {instance.id} deleted completely")
 
     def retrieve(self, request, *args, **kwargs):
@@ -226,6 +234,72 @@ class ProductViewSet(viewsets.ModelViewSet):
         serializer = ProductListSerializer(queryset, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'], url_path='my_products/summary')
+    def my_products_summary(self, request):
+        """
+        Get inventory totals for the current seller's products.
+
+        Query params:
+        - low_stock_threshold: stock level considered low (default: 5)
+        - page: page of the per-product views and sales listing
+        """
+        if request.user.user_type != 'SELLER':
+            return Response(
+                {'error': 'Solo vendedores pueden acceder a esta funcionalidad'},
+                status=403
+            )
+
+        try:
+            low_stock_threshold = int(request.query_params.get('low_stock_threshold', 5))
+        except ValueError:
+            return Response(
+                {'error': 'low_stock_threshold debe ser un número entero'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # All queries filter on seller, served by the (seller, -created_at)
+        # index; the per-product page also uses it for its ordering.
+        products = Product.objects.filter(seller=request.user)
+
+        totals = products.aggregate(
+            total_products=Count('id'),
+            active_products=Count('id', filter=Q(is_available=True)),
+            inactive_products=Count('id', filter=Q(is_available=False)),
+            out_of_stock=Count('id', filter=Q(stock=0)),
+            low_stock_count=Count('id', filter=Q(stock__gt=0, stock__lte=low_stock_threshold)),
+            total_units=Coalesce(Sum('stock'), 0),
+            inventory_value=Coalesce(
+                Sum(F('price') * F('stock'), output_field=DecimalField(max_digits=14, decimal_places=2)),
+                Value(Decimal('0.00')),
+                output_field=DecimalField(max_digits=14, decimal_places=2)
+            ),
+            total_views=Coalesce(Sum('views_count'), 0),
+            total_sales=Coalesce(Sum('sales_count'), 0),
+        )
+        # Keep money as a string, like the DecimalField serializers do
+        totals['inventory_value'] = str(Decimal(totals['inventory_value']).quantize(Decimal('0.01')))
+
+        # The lowest stock first; low_stock_count has the full number
+        low_stock = list(
+            products.filter(stock__gt=0, stock__lte=low_stock_threshold)
+            .order_by('stock', '-created_at')
+            .values('id', 'name', 'stock')[:self.summary_low_stock_limit]
+        )
+
+        # Views and sales per product, paginated like my_products
+        page = self.paginate_queryset(
+            products.order_by('-created_at').values(
+                'id', 'name', 'stock', 'is_available', 'views_count', 'sales_count'
+            )
+        )
+
+        return Response({
+            **totals,
+            'low_stock_threshold': low_stock_threshold,
+            'low_stock': low_stock,
+            'products': self.get_paginated_response(page).data,
+        })
+
     @action(detail=False, methods=['get'])
     def featured(self, request):
         """Get featured products (top sellers)."""
@@ -268,15 +342,10 @@ class ProductViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Save images and collect URLs
-        import os
-        from django.core.files.storage import default_storage
-        from django.conf import settings
-
-        new_image_urls = []
+        # Validate all files before storing anything
+        allowed_types = ['image/jpeg', 'image/jpg', 'image/png', 'image/webp']
         for image_file in files:
             # Validate file type
-            allowed_types = ['image/jpeg', 'image/jpg', 'image/png', 'image/webp']
             if image_file.content_type not in allowed_types:
                 return Response(
                     {'error': f'Tipo de archivo no permitido: {image_file.content_type}'},
@@ -290,33 +359,166 @@ class ProductViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            # Generate unique filename
-            import uuid
-            ext = os.path.splitext(image_file.name)[1]
-            filename = f'products/{product.id}/{uuid.uuid4()}{ext}'
+        return self._attach_images(product, files)
+
+    def _attach_images(self, product, files):
+        """
+        Store images and append them to the product, returning the response.
+
+        Images are stored by content hash: known images are reused without
+        uploading, new ones get their variants (thumbnail, medium, full)
+        uploaded concurrently, and nothing is attached if any upload fails.
+        """
+        from products.images import InvalidImageError
+        from products.uploads import store_product_images
+
+        current_images = product.images if product.images else []
+        new_image_urls = []
 
-            # Save file
-            path = default_storage.save(filename, image_file)
+        def attach(stored):
+            image_variants = dict(product.image_variants or {})
+            for variant_urls in stored:
+                new_image_urls.append(variant_urls['full'])
+                image_variants[variant_urls['full']] = variant_urls
 
-            # Generate URL - diferente para filesystem vs Supabase
-            if hasattr(default_storage, 'url'):
-                # Supabase Storage o custom backend con método url()
-                url = default_storage.url(path)
-                print(f"📸 Supabase URL generated: {url}")
-            else:
-                # FileSystemStorage - usar URL relativa
-                url = request.build_absolute_uri(settings.MEDIA_URL + path)
-                print(f"📸 FileSystem URL generated: {url}")
+            # Update product images
+            product.images = current_images + new_image_urls
+            product.image_variants = image_variants
+            product.save()
 
-            new_image_urls.append(url)
+        try:
+            store_product_images(files, attach)
+        except InvalidImageError as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except ImageBlob.DoesNotExist:
+            return Response(
+                {'error': 'La imagen se estaba eliminando, intenta de nuevo'},
+                status=status.HTTP_409_CONFLICT
+            )
+        except Exception:
+            logger.exception('Error uploading images for product %s', product.id)
+            return Response(
+                {'error': 'No se pudieron subir las imágenes, intenta de nuevo'},
+                status=status.HTTP_502_BAD_GATEWAY
+            )
 
-        # Update product images
-        product.images = current_images + new_image_urls
-        product.save()
+        print(f"📸 {len(new_image_urls)} images added to product {product.id}")
 
         serializer = ProductSerializer(product)
         return Response(serializer.data)
 
+    @action(detail=True, methods=['post'])
+    def upload_urls(self, request, pk=None):
+        """
+        Issue signed URLs so the client uploads images directly to storage.
+
+        Body: {"count": n}. Each returned upload is PUT by the client to its
+        ``upload_url`` and then attached with ``confirm_uploads``.
+        """
+        from products.uploads import create_direct_uploads, supports_direct_uploads
+
+        product = self.get_object()
+
+        # Check ownership
+        if product.seller != request.user:
+            return Response(
+                {'error': 'No puedes subir imágenes a productos de otros vendedores'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        if not supports_direct_uploads():
+            return Response(
+                {'error': 'El almacenamiento actual no permite subidas directas'},
+                status=status.HTTP_501_NOT_IMPLEMENTED
+            )
+
+        try:
+            count = int(request.data.get('count', 1))
+        except (TypeError, ValueError):
+            count = 0
+        current_images = product.images if product.images else []
+        if count < 1 or len(current_images) + count > 5:
+            return Response(
+                {'error': 'Un producto puede tener máximo 5 imágenes'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            uploads = create_direct_uploads('products', product.id, count)
+        except Exception:
+            logger.exception('Error creating upload URLs for product %s', product.id)
+            return Response(
+                {'error': 'No se pudieron preparar las subidas, intenta de nuevo'},
+                status=status.HTTP_502_BAD_GATEWAY
+            )
+
+        return Response({'uploads': uploads})
+
+    @action(detail=True, methods=['post'])
+    def confirm_uploads(self, request, pk=None):
+        """
+        Attach images uploaded directly to storage with ``upload_urls``.
+
+        Body: {"paths": [...]}. Each file is checked and processed like
+        ``upload_images`` (content hash, variants); the raw upload is queued
+        for deletion afterwards.
+        """
+        from products.models import PendingStorageDeletion
+        from products.uploads import DirectUploadError, open_direct_upload
+
+        product = self.get_object()
+
+        # Check ownership
+        if product.seller != request.user:
+            return Response(
+                {'error': 'No puedes subir imágenes a productos de otros vendedores'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        paths = request.data.get('paths')
+        paths = [str(path) for path in paths] if isinstance(paths, list) else []
+        if not paths or len(set(paths)) != len(paths):
+            return Response(
+                {'error': 'No se proporcionaron imágenes'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        current_images = product.images if product.images else []
+        if len(current_images) + len(paths) > 5:
+            return Response(
+                {'error': 'Un producto puede tener máximo 5 imágenes'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        files = []
+        try:
+            for path in paths:
+                files.append(open_direct_upload(path, 'products', product.id))
+        except DirectUploadError as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except Exception:
+            logger.exception('Error fetching direct uploads for product %s', product.id)
+            return Response(
+                {'error': 'No se pudieron leer las imágenes, intenta de nuevo'},
+                status=status.HTTP_502_BAD_GATEWAY
+            )
+
+        try:
+            response = self._attach_images(product, files)
+        finally:
+            for image_file in files:
+                image_file.close()
+
+        if response.status_code == status.HTTP_200_OK:
+            PendingStorageDeletion.enqueue(paths)
+        return response
+
     @action(detail=True, methods=['delete'])
     def delete_image(self, request, pk=None):
         """Delete a specific image from a product."""
@@ -342,31 +544,56 @@ class ProductViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        # Delete file from storage first
-        try:
-            from django.core.files.storage import default_storage
-
-            # Extract path from URL
-            if 'supabase.co/storage/v1/object/public/' in image_url:
-                path_parts = image_url.split('/object/public/')
-                if len(path_parts) > 1:
-                    full_path = path_parts[1]
-                    file_path = '/'.join(full_path.split('/')[1:])
-                    file_path = file_path.split('?')[0]
-                    print(f"🗑️  Deleting from storage: {file_path}")
-                    default_storage.delete(file_path)
-                    print(f"✅ Deleted: {file_path}")
-            elif image_url.startswith('/media/'):
-                file_path = image_url.replace('/media/', '')
-                print(f"🗑️  Deleting from storage: {file_path}")
-                default_storage.delete(file_path)
-                print(f"✅ Deleted: {file_path}")
-        except Exception as e:
-            print(f"⚠️  Error deleting file from storage: {e}")
-
-        # Remove image URL from list
-        product.images.remove(image_url)
-        product.save()
+        # Remove image URL (and its variants) from product; the files are
+        # queued for deletion once no other product uses them
+        with transaction.atomic():
+            ImageBlob.release(product, [image_url])
+            product.images.remove(image_url)
+            if product.image_variants:
+                product.image_variants.pop(image_url, None)
+            product.save()
 
         serializer = ProductSerializer(product)
         return Response(serializer.data)
+
+    @action(detail=True, methods=['post', 'delete'])
+    def reserve(self, request, pk=None):
+        """
+        Hold units of a product for the current buyer.
+
+        POST {"quantity": n} creates or replaces the hold, which expires
+        after STOCK_RESERVATION_MINUTES (each POST restarts it); the units
+        are converted into the order at checkout. DELETE releases it.
+        """
+        from products.reservations import ReservationError, release, reserve
+
+        if request.user.user_type != 'BUYER':
+            return Response(
+                {'error': 'Solo los compradores pueden reservar productos'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        if request.method == 'DELETE':
+            if not release(request.user, pk):
+                return Response({'error': 'No tienes una reserva de este producto'}, status=status.HTTP_404_NOT_FOUND)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        serializer = StockReservationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            reservation = reserve(request.user, pk, serializer.validated_data['quantity'])
+        except (Product.DoesNotExist, ValidationError):
+            return Response({'error': 'Producto no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+        except ReservationError as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+
+        return Response(StockReservationSerializer(reservation).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['get'])
+    def reservations(self, request):
+        """Get the current buyer's active reservations."""
+        from products.reservations import active_reservations
+
+        queryset = active_reservations().filter(buyer=request.user).select_related('product')
+        serializer = StockReservationSerializer(queryset, many=True)
+        return Response(serializer.data)
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.1 on 2026-10-19 16:16
+
+import mercatico.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0005_sellerprofile_accepts_sinpe"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="sellerprofile",
+            name="logo",
+            field=mercatico.fields.NormalizedImageField(
+                blank=True,
+                null=True,
+                profile="logo",
+                upload_to="seller_logos/",
+                verbose_name="logo/foto",
+            ),
+        ),
+    ]
@@ -6,6 +6,7 @@ from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, Permis
 from django.db import models
 from django.core.validators import RegexValidator
 from django.utils import timezone
+from mercatico.fields import NormalizedImageField
 
 
 class UserManager(BaseUserManager):
@@ -175,9 +176,10 @@ class SellerProfile(models.Model):
     )
 
     # Business logo/photo
-    logo = models.ImageField(
+    logo = NormalizedImageField(
         'logo/foto',
         upload_to='seller_logos/',
+        profile='logo',
         null=True,
         blank=True
     )